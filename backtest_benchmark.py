@@ -0,0 +1,325 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import contextlib
+import numpy as np
+from datetime import datetime, timezone
+from config import Config
+
+BASELINE_PATH = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25  # Fail when a tracked metric is >25% worse than the baseline
+
+# (metric, higher_is_better): only these gate a run, everything else is informational
+TRACKED = {
+    'scan_pattern.candles_per_sec': True,
+    'scanner_backtest.candles_per_sec': True,
+    'sniper_backtest.candles_per_sec': True,
+    'comparative_backtest.candles_per_sec': True,
+    'edge_discovery_backtest.candles_per_sec': True,
+    'resolve_exits.trades_per_sec': True,
+    'resolve_policy.trades_per_sec': True,
+    'stress_test.paths_per_sec': True,
+    'circuit_breaker.paths_per_sec': True,
+    'prob_sim.paths_per_sec': True,
+    'fixed_drawdown_sim.paths_per_sec': True,
+    'ict_chart.charts_per_sec': True,
+    'peak_rss_mb': False,
+}
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (MB)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+def synthetic_candles(root, symbols=('BTC/USDT', 'ETH/USDT'), days=60, start='2025-01-01', seed=7):
+    """
+    Writes a deterministic random-walk 5m history into a candle store at root
+    (no network). Returns (first_ts, last_ts) in ms.
+    """
+    from candle_store import CandleStore
+    rng = np.random.default_rng(seed)
+    n = days * 288
+    start_ts = int(datetime.strptime(start, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+    ts = start_ts + np.arange(n, dtype='int64') * 5 * 60 * 1000
+    store = CandleStore(exchange=object(), root=root)
+    for k, symbol in enumerate(symbols):
+        close = 50000.0 * (k + 1) * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+        open_ = np.r_[close[0], close[:-1]]
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0015, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0015, n)))
+        volume = rng.uniform(1, 100, n)
+        rows = [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(ts, open_, high, low, close, volume)]
+        store.write(symbol, '5m', rows)
+    return int(ts[0]), int(ts[-1])
+
+class BacktestBenchmark:
+    """
+    Offline benchmark suite: live scanner, every backtest engine, outcome
+    resolution, the Monte Carlo simulators and chart rendering, all on
+    synthetic or recorded candles through a ReplayExchange (no network).
+
+    Every stage reports a throughput (candles/sec, trades/sec, paths/sec,
+    charts/sec) plus the process peak RSS, as one JSON document that can be
+    saved as a baseline and compared against on the next run.
+    """
+    def __init__(self, root=None, symbol='BTC/USDT', scans=288, paths=2000, charts=3, repeat=3):
+        self.root = root  # Recorded candle store (None = synthetic history in a temp dir)
+        self.symbol = symbol
+        self.scans = scans  # 5m ticks replayed through scan_pattern
+        self.paths = paths  # Monte Carlo paths per simulator
+        self.charts = charts
+        self.repeat = repeat  # Best-of-N timing for every stage except the scanner replay
+        self.metrics = {}
+        self.timings = {}
+
+    def _time(self, name, fn, repeat=None):
+        """
+        Runs fn quietly (engine prints are swallowed) `repeat` times and
+        records the best wall time (the least noisy estimate of its cost).
+        """
+        best, result = float('inf'), None
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = fn()
+            best = min(best, time.perf_counter() - started)
+        self.timings[name] = round(best, 4)
+        return best, result
+
+    def _record(self, name, value):
+        self.metrics[name] = round(float(value), 2)
+        print(f"  {name:<42} {self.metrics[name]:>14,.2f}")
+
+    def _dates(self):
+        return (datetime.fromtimestamp(self.first_ts / 1000, timezone.utc).strftime('%Y-%m-%d'),
+                datetime.fromtimestamp(self.last_ts / 1000, timezone.utc).strftime('%Y-%m-%d'))
+
+    def _cold_features(self, engine):
+        """Feature store in the scratch dir: every engine computes its features cold."""
+        from candle_store import CandleStore
+        from feature_store import FeatureStore
+        return FeatureStore(CandleStore(self.replay, root=tempfile.mkdtemp(prefix='features_', dir=self.scratch)))
+
+    # --- Stages --------------------------------------------------------------
+
+    def bench_scan_pattern(self):
+        from smc_scanner import SMCScanner
+        offline_context = {
+            'news': {'is_safe': True, 'event': None, 'minutes_until': 0},
+            'intermarket': {'DXY': {'change_5m': 0.05, 'trend': 'UP'}},
+        }
+        start_ts = self.last_ts - (self.scans - 1) * 5 * 60 * 1000
+
+        def replay():
+            # Fresh scanner with an empty candle cache and indicator state: every repeat starts cold
+            Config.CANDLE_CACHE_PATH = tempfile.mkdtemp(prefix='candle_cache_', dir=self.scratch)
+            Config.INDICATOR_STATE_PATH = tempfile.mkdtemp(prefix='indicator_state_', dir=self.scratch)
+            scanner = SMCScanner(exchange=self.replay)
+            for _ in self.replay.ticks(start_ts, self.last_ts):
+                scanner.scan_pattern(self.symbol, cached_context=offline_context)
+
+        elapsed, _ = self._time('scan_pattern', replay)
+        self.replay.set_time(self.last_ts + 5 * 60 * 1000)
+        self._record('scan_pattern.candles_per_sec', self.scans / elapsed)
+
+    def bench_backtests(self):
+        from scanner_backtest import ScannerBacktest
+        from sniper_backtest import SniperBacktest
+        from comparative_backtest import ComparativeBacktest
+        from edge_discovery_backtest import EdgeDiscoveryBacktest
+        from backtest_engine import BacktestEngine
+        start_date, end_date = self._dates()
+        candles = len(self.df)
+
+        for name, cls in (('scanner_backtest', ScannerBacktest), ('sniper_backtest', SniperBacktest),
+                          ('edge_discovery_backtest', EdgeDiscoveryBacktest)):
+            def backtest():
+                engine = cls(self.symbol, start_date, end_date, exchange=self.replay)
+                engine.features = self._cold_features(engine)
+                engine.run_backtest()
+                return engine.trades
+
+            elapsed, trades = self._time(name, backtest)
+            self._record(f'{name}.candles_per_sec', candles / elapsed)
+            self._record(f'{name}.trades_per_sec', len(trades) / elapsed)
+
+        def comparative():
+            runner = ComparativeBacktest(self.symbol, start_date, end_date, exchange=self.replay)
+            runner.feature_store = self._cold_features(runner)
+            runner.data_cache = self.df  # fetch_data looks back from the wall clock; pin it to the replay range
+            return runner.run_model('Baseline', {
+                'killzones': list(range(12, 20)), 'quartile_range': (0.0, 0.45), 'tp_multiples': (1.5, 3.0),
+            })
+
+        elapsed, trades = self._time('comparative_backtest', comparative)
+        self._record('comparative_backtest.candles_per_sec', candles / elapsed)
+        self._record('comparative_backtest.trades_per_sec', len(trades) / elapsed)
+
+        def stress_engine():
+            np.random.seed(0)
+            engine = BacktestEngine(self.symbol, start_date, end_date, exchange=self.replay)
+            engine.run_backtest()
+            return engine.trades
+
+        elapsed, trades = self._time('backtest_engine', stress_engine)
+        self._record('backtest_engine.candles_per_sec', candles / elapsed)
+        self._record('backtest_engine.trades_per_sec', len(trades) / elapsed)
+
+    def bench_outcome_resolution(self):
+        from exit_engine import resolve_exits, resolve_policy, ExitPolicy
+        high = self.df['high'].to_numpy(dtype='float64')
+        low = self.df['low'].to_numpy(dtype='float64')
+        close = self.df['close'].to_numpy(dtype='float64')
+        entries = np.arange(300, len(close) - 1, dtype='int64')
+        direction = np.where(np.arange(len(entries)) % 2 == 0, 1, -1).astype('int64')
+        entry = close[entries]
+        stop = entry * (1 - 0.005 * direction)
+        target = entry * (1 + 0.015 * direction)
+        policy = ExitPolicy(((1.5, 0.5), (3.0, 0.5)), breakeven_after=0,
+                            timeout=48, timeout_exit='close', stop_first=True)
+        resolve_policy(high, low, close, entries[:10], direction[:10], entry[:10], stop[:10], policy)  # JIT warm-up
+
+        elapsed, _ = self._time('resolve_exits', lambda: resolve_exits(high, low, close, entries, direction, stop, target))
+        self._record('resolve_exits.trades_per_sec', len(entries) / elapsed)
+        elapsed, _ = self._time('resolve_policy', lambda: resolve_policy(high, low, close, entries, direction,
+                                                                         entry, stop, policy))
+        self._record('resolve_policy.trades_per_sec', len(entries) / elapsed)
+
+    def bench_monte_carlo(self):
+        from stress_test import monte_carlo_stress_test, monte_carlo_circuit_breaker
+        from prob_sim import calculate_monthly_probability
+        from fixed_drawdown_sim import monte_carlo_fixed_floor
+        for name, fn in (('stress_test', monte_carlo_stress_test),
+                         ('circuit_breaker', monte_carlo_circuit_breaker),
+                         ('prob_sim', calculate_monthly_probability),
+                         ('fixed_drawdown_sim', monte_carlo_fixed_floor)):
+            np.random.seed(0)
+            elapsed, _ = self._time(name, lambda: fn(num_simulations=self.paths))
+            self._record(f'{name}.paths_per_sec', self.paths / elapsed)
+
+    def bench_chart(self):
+        from visualizer import generate_ict_chart
+        df = self.df.iloc[-100:].copy()
+        entry = float(df['close'].iloc[-1])
+        setup = {'symbol': self.symbol, 'pattern': 'Bullish PO3', 'entry': entry,
+                 'target': entry * 1.015, 'stop_loss': entry * 0.995}
+        output_path = os.path.join(self.scratch, 'chart.png')
+
+        def render():
+            return [generate_ict_chart(df, setup, output_path) for _ in range(self.charts)]
+
+        elapsed, paths = self._time('ict_chart', render, repeat=1)
+        if all(paths):
+            self._record('ict_chart.charts_per_sec', self.charts / elapsed)
+        else:
+            print("  ⚠️ generate_ict_chart failed; chart metric skipped")
+
+    # --- Driver --------------------------------------------------------------
+
+    def run(self):
+        """Runs every stage and returns the machine-readable report."""
+        from replay_exchange import ReplayExchange
+        from candle_store import CandleStore
+        self.scratch = tempfile.mkdtemp(prefix='smc_benchmark_')
+        root = self.root
+        saved_paths = {name: getattr(Config, name)
+                       for name in ('CANDLE_STORE_PATH', 'CANDLE_CACHE_PATH', 'INDICATOR_STATE_PATH')}
+        try:
+            if root is None:
+                root = os.path.join(self.scratch, 'candles')
+                print("🧪 Generating synthetic candles...")
+                synthetic_candles(root, symbols=(self.symbol,))
+            Config.CANDLE_STORE_PATH = root  # Engines open their CandleStore at the default root
+            store = CandleStore(exchange=object(), root=root)
+            self.first_ts = store.first_timestamp(self.symbol, '5m')
+            self.last_ts = store.last_timestamp(self.symbol, '5m')
+            self.replay = ReplayExchange(root=root)
+            self.replay.set_time(self.last_ts + 5 * 60 * 1000)
+            self.df = store.load(self.symbol, '5m', self.first_ts, self.last_ts + 1)
+            print(f"⏱️ Benchmarking on {len(self.df)} {self.symbol} candles ({root})")
+
+            for stage in (self.bench_scan_pattern, self.bench_backtests, self.bench_outcome_resolution,
+                          self.bench_monte_carlo, self.bench_chart):
+                stage()
+            self._record('peak_rss_mb', peak_rss_mb())
+        finally:
+            for name, value in saved_paths.items():  # Scratch dirs are about to be deleted
+                setattr(Config, name, value)
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'data': {'symbol': self.symbol, 'candles': len(self.df),
+                     'source': 'recorded' if self.root else 'synthetic'},
+            'params': {'scans': self.scans, 'paths': self.paths, 'charts': self.charts, 'repeat': self.repeat},
+            'metrics': self.metrics,
+            'timings_s': self.timings,
+        }
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Tracked metrics that got worse than the baseline by more than threshold.
+
+    Returns:
+        list of dicts: metric, baseline, current, change (fraction, negative = worse)
+    """
+    regressions = []
+    for metric, higher_is_better in TRACKED.items():
+        old = baseline.get('metrics', {}).get(metric)
+        new = report['metrics'].get(metric)
+        if not old or new is None or np.isnan(old) or np.isnan(new):
+            continue
+        change = (new - old) / old if higher_is_better else (old - new) / old
+        if change < -threshold:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new, 'change': round(change, 3)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline performance benchmark for the scanner and backtests.")
+    parser.add_argument('--data', help="Recorded candle store root (default: synthetic candles)")
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--scans', type=int, default=288)
+    parser.add_argument('--paths', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3, help="Best-of-N timing per stage")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--output', help="Also write the report JSON here")
+    args = parser.parse_args()
+
+    report = BacktestBenchmark(args.data, args.symbol, args.scans, args.paths, repeat=args.repeat).run()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline} (run with --save-baseline first)")
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed more than {args.threshold:.0%}:")
+        for r in regressions:
+            print(f"  {r['metric']}: {r['baseline']:,.2f} -> {r['current']:,.2f} ({r['change']:+.1%})")
+        sys.exit(1)
+    print(f"\n✅ No tracked metric regressed more than {args.threshold:.0%} against {args.baseline}")
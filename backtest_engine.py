@@ -5,47 +5,32 @@ from datetime import datetime, timedelta
 from smc_scanner import SMCScanner
 from config import Config
 import json
+from candle_store import CandleStore
 
 class BacktestEngine:
     """
     Backtests the SMC Alpha strategy against historical data.
     Simulates the exact logic of the scanner without AI validation (uses heuristic scoring).
     """
-    def __init__(self, symbol='BTC/USDT', start_date='2025-01-01', end_date='2026-01-06'):
+    def __init__(self, symbol='BTC/USDT', start_date='2025-01-01', end_date='2026-01-06', exchange=None):
         self.symbol = symbol
         self.start_date = start_date
         self.end_date = end_date
-        self.scanner = SMCScanner()
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        self.scanner = SMCScanner(exchange=exchange)
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
         self.trades = []
         
     def fetch_historical_data(self):
-        """Fetches 5m OHLCV data for the entire period."""
-        print(f"📥 Fetching {self.symbol} data from {self.start_date} to {self.end_date}...")
+        """Loads 5m OHLCV data for the entire period from the local candle store."""
+        print(f"📥 Loading {self.symbol} data from {self.start_date} to {self.end_date}...")
         
         start_ts = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
         end_ts = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
         
-        all_data = []
-        current_ts = start_ts
-        
-        while current_ts < end_ts:
-            try:
-                ohlcv = self.exchange.fetch_ohlcv(self.symbol, '5m', since=current_ts, limit=1000)
-                if not ohlcv:
-                    break
-                all_data.extend(ohlcv)
-                current_ts = ohlcv[-1][0] + 1
-                print(f"  Fetched up to {datetime.fromtimestamp(current_ts/1000).strftime('%Y-%m-%d %H:%M')}")
-            except Exception as e:
-                print(f"Error fetching data: {e}")
-                break
-                
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.drop_duplicates(subset='timestamp')
+        df = self.store.load(self.symbol, '5m', start_ts, end_ts)
         
-        print(f"✅ Fetched {len(df)} candles")
+        print(f"✅ Loaded {len(df)} candles")
         return df
     
     def simulate_trade(self, setup, entry_price):
@@ -0,0 +1,158 @@
+import os
+import numpy as np
+import pandas as pd
+from candle_store import timeframe_to_ms, resample_ohlcv
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CandleRingBuffer:
+    """
+    Fixed-capacity OHLCV buffer for one (symbol, timeframe).
+
+    Rows are [timestamp_ms, open, high, low, close, volume] in a float64
+    array (ms timestamps are exact in float64). New candles overwrite any
+    row with the same or later timestamp, so the previously forming candle
+    is replaced by its final values; the oldest rows are evicted.
+    """
+    def __init__(self, capacity=1000, data=None):
+        self.capacity = capacity
+        self.data = data if data is not None else np.empty((0, 6), dtype='float64')
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def last_timestamp(self):
+        return int(self.data[-1, 0]) if len(self.data) else None
+
+    def replace(self, ohlcv):
+        self.data = np.asarray(ohlcv, dtype='float64')[-self.capacity:]
+
+    def extend(self, ohlcv):
+        if not ohlcv:
+            return
+        new = np.asarray(ohlcv, dtype='float64')
+        keep = self.data[:, 0] < new[0, 0]
+        self.data = np.concatenate([self.data[keep], new])[-self.capacity:]
+
+    def tail(self, limit):
+        return self.data[-limit:]
+
+class CandleCache:
+    """
+    Incremental Candle Cache (Alert-Latency Critical Path).
+
+    Keeps a ring buffer per (exchange, symbol, timeframe) that survives across
+    scans: in-process on a warm container and as .npy files on the Modal
+    volume. Each call requests only `since=last_ts` (the last, possibly still
+    forming candle) instead of re-downloading the full window.
+    """
+    _buffers = {}  # Shared across SMCScanner instances on a warm container
+
+    def __init__(self, exchange, capacity=1000, path=None):
+        self.exchange = exchange
+        self.capacity = capacity
+        self.path = path or Config.CANDLE_CACHE_PATH
+
+    def _key(self, symbol, timeframe):
+        return (getattr(self.exchange, 'id', 'exchange'), symbol, timeframe)
+
+    def _file(self, key):
+        exchange_id, symbol, timeframe = key
+        return os.path.join(self.path, f"{exchange_id}_{symbol.replace('/', '_')}_{timeframe}.npy")
+
+    def _buffer(self, key):
+        if key not in self._buffers:
+            data = None
+            try:
+                if os.path.exists(self._file(key)):
+                    data = np.load(self._file(key))
+            except Exception as e:
+                logger.warning(f"Candle cache unreadable for {key} ({e}). Starting cold.")
+            self._buffers[key] = CandleRingBuffer(self.capacity, data)
+        return self._buffers[key]
+
+    def _persist(self, key, buf):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = self._file(key) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, buf.data)
+            os.replace(tmp_path, self._file(key))
+        except Exception as e:
+            logger.warning(f"Candle cache persist failed for {key}: {e}")
+
+    def _frame(self, rows):
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype('int64'), unit='ms')
+        return df
+
+    def get(self, symbol, timeframe, limit=500):
+        """Returns the last `limit` candles as the standard OHLCV DataFrame."""
+        key = self._key(symbol, timeframe)
+        buf = self._buffer(key)
+        tf_ms = timeframe_to_ms(timeframe)
+        now_ms = self.exchange.milliseconds()
+        last_ts = buf.last_timestamp
+
+        # Cold start, clock moved backwards (replay), or too far behind for one page
+        cold = (
+            last_ts is None
+            or len(buf) < limit
+            or last_ts > now_ms
+            or (now_ms - last_ts) // tf_ms >= limit
+        )
+        if cold:
+            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=max(limit, min(self.capacity, 1000)))
+            if not ohlcv:
+                return None
+            buf.replace(ohlcv)
+        else:
+            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, since=last_ts)
+            buf.extend(ohlcv)
+
+        self._persist(key, buf)
+
+        return self._frame(buf.tail(limit))
+
+    def get_view(self, symbol, base_timeframe, timeframe, limit=100):
+        """
+        Higher-timeframe view derived from the base stream.
+
+        The HTF buffer is backfilled from the exchange once (a long 4h history
+        cannot come from a 5m window); after that every bar from the last,
+        possibly forming, HTF bar onward is rebuilt by resampling the base
+        buffer. A warm scan therefore costs zero extra requests per HTF.
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        base_ms = timeframe_to_ms(base_timeframe)
+        now_ms = self.exchange.milliseconds()
+
+        base = self._buffer(self._key(symbol, base_timeframe))
+        if base.last_timestamp is None or now_ms - base.last_timestamp >= 2 * base_ms:
+            self.get(symbol, base_timeframe, limit=min(self.capacity, 500))
+
+        key = self._key(symbol, timeframe)
+        htf = self._buffer(key)
+        last_ts = htf.last_timestamp
+
+        # Backfill when cold, after a replay rewind, or when the base buffer no
+        # longer reaches back to the start of the last stored HTF bar
+        if (last_ts is None or len(htf) < limit or last_ts > now_ms
+                or not len(base) or base.data[0, 0] > last_ts):
+            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            if not ohlcv:
+                return None
+            htf.replace(ohlcv)
+            last_ts = htf.last_timestamp
+
+        rows = base.data[base.data[:, 0] >= last_ts]
+        if len(rows) and base.data[0, 0] <= last_ts:
+            resampled = resample_ohlcv(rows[:, 0].astype('int64'), rows[:, 1], rows[:, 2],
+                                       rows[:, 3], rows[:, 4], rows[:, 5], tf_ms)
+            htf.extend(np.column_stack(resampled).tolist())
+
+        self._persist(key, htf)
+        return self._frame(htf.tail(limit))
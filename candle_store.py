@@ -0,0 +1,476 @@
+import os
+import glob
+import json
+import time
+import shutil
+import ccxt
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import Config
+from scan_concurrency import ThrottledExchange
+import logging
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def timeframe_to_ms(timeframe):
+    """Converts a ccxt timeframe string ('5m', '4h') to milliseconds."""
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+def resample_ohlcv(ts, o, h, l, c, v, tf_ms):
+    """Aggregates sorted base candles into tf_ms buckets with NumPy reduceat."""
+    if len(ts) == 0:
+        empty = np.array([], dtype='float64')
+        return np.array([], dtype='int64'), empty, empty, empty, empty, empty
+    buckets = (np.asarray(ts) // tf_ms) * tf_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return (buckets[starts],
+            np.asarray(o)[starts],
+            np.maximum.reduceat(h, starts),
+            np.minimum.reduceat(l, starts),
+            np.asarray(c)[ends],
+            np.add.reduceat(v, starts))
+
+def missing_intervals(ts, start_ts, end_ts, tf_ms):
+    """[start, end) intervals of candle opens absent from sorted ts within the range."""
+    points = np.concatenate([[start_ts - tf_ms], np.asarray(ts, dtype='int64'), [end_ts]])
+    idx = np.flatnonzero(np.diff(points) > tf_ms)
+    return [[int(points[i] + tf_ms), int(points[i + 1])] for i in idx]
+
+def confirmed_holes(page, rows, chunk_start, chunk_end, tf_ms):
+    """
+    Holes in [chunk_start, chunk_end) that the page proves empty: the page
+    listed a later candle past the hole, so the exchange skipped it rather
+    than cut the page short. A hole before the first listed candle qualifies
+    the same way; holes after the last candle of the page stay unconfirmed.
+    """
+    if not page:
+        return []
+    last = max(c[0] for c in page)
+    returned = np.array([c[0] for c in rows], dtype='int64')
+    return [hole for hole in missing_intervals(returned, chunk_start, chunk_end, tf_ms) if last >= hole[1]]
+
+def merge_intervals(intervals):
+    """Sorts and coalesces overlapping/adjacent [start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def subtract_intervals(intervals, removed):
+    """Parts of `intervals` not covered by the merged `removed` intervals."""
+    result = []
+    removed = merge_intervals(removed)
+    for start, end in intervals:
+        for r_start, r_end in removed:
+            if r_end <= start or r_start >= end:
+                continue
+            if r_start > start:
+                result.append([start, r_start])
+            start = max(start, r_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append([start, end])
+    return result
+
+class CandleArrays:
+    """
+    Read-only OHLCV columns backed by memory-mapped .npy files.
+
+    Opening is zero-copy: pages are shared by every process mapping the same
+    files, and slicing with window() returns views, never copies.
+    ReplayExchange serves its candles from here, load() builds the engines'
+    DataFrames from it, and sweep workers map the same files through
+    `source` instead of receiving copies.
+    """
+    def __init__(self, columns, source=None):
+        self.timestamp = columns['timestamp']  # int64 epoch ms
+        self.open = columns['open']
+        self.high = columns['high']
+        self.low = columns['low']
+        self.close = columns['close']
+        self.volume = columns['volume']
+        self.source = source  # (generation dir, first row) of the mapped files; None if not file-backed
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def window(self, start_ts=None, end_ts=None):
+        """View of candles in [start_ts, end_ts) (ms) via binary search."""
+        lo = 0 if start_ts is None else int(np.searchsorted(self.timestamp, start_ts, side='left'))
+        hi = len(self) if end_ts is None else int(np.searchsorted(self.timestamp, end_ts, side='left'))
+        source = None if self.source is None else (self.source[0], self.source[1] + lo)
+        return CandleArrays({col: getattr(self, col)[lo:hi] for col in OHLCV_COLUMNS}, source)
+
+    @staticmethod
+    def map_column(source, column, rows):
+        """Read-only view of `rows` candles of one exported column (e.g. in a worker process)."""
+        gen_dir, start = source
+        return np.load(os.path.join(gen_dir, f"{column}.npy"), mmap_mode='r')[start:start + rows]
+
+    def to_frame(self):
+        """Materializes the standard OHLCV DataFrame (copies) that load() returns."""
+        df = pd.DataFrame({col: np.asarray(getattr(self, col)) for col in OHLCV_COLUMNS})
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+class CandleStore:
+    """
+    Local Columnar Candle Store (Parquet).
+
+    Layout: <root>/<SYMBOL>/<timeframe>/<YYYY-MM>.parquet
+    Timestamps are stored as int64 epoch milliseconds (candle open time).
+
+    Every backtest reads from here. Only the missing tail since the last
+    stored candle is downloaded, so a re-run of a year-long backtest is a
+    local Parquet read instead of ~105 serial exchange pages.
+    """
+    PAGE_LIMIT = 1000
+    RETRIES = 3
+
+    def __init__(self, exchange=None, root=None):
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.root = root or Config.CANDLE_STORE_PATH
+
+    def _partition_dir(self, symbol, timeframe):
+        return os.path.join(self.root, symbol.replace('/', '_'), timeframe)
+
+    def _month_files(self, symbol, timeframe):
+        return sorted(glob.glob(os.path.join(self._partition_dir(symbol, timeframe), '*.parquet')))
+
+    def _mmap_dir(self, symbol, timeframe):
+        return os.path.join(self._partition_dir(symbol, timeframe), '_mmap')
+
+    def _read_file(self, path):
+        return pd.read_parquet(path, columns=OHLCV_COLUMNS)
+
+    def first_timestamp(self, symbol, timeframe):
+        """Open time (ms) of the oldest stored candle, or None if empty."""
+        files = self._month_files(symbol, timeframe)
+        if not files:
+            return None
+        return int(self._read_file(files[0])['timestamp'].min())
+
+    def last_timestamp(self, symbol, timeframe):
+        """Open time (ms) of the newest stored candle, or None if empty."""
+        files = self._month_files(symbol, timeframe)
+        if not files:
+            return None
+        return int(self._read_file(files[-1])['timestamp'].max())
+
+    def write(self, symbol, timeframe, ohlcv):
+        """
+        Merges raw ccxt OHLCV rows into the monthly partitions they belong to.
+        Only touched months are rewritten. Returns number of rows written.
+        """
+        if ohlcv is None or len(ohlcv) == 0:
+            return 0
+
+        new = pd.DataFrame(ohlcv, columns=OHLCV_COLUMNS)
+        new['timestamp'] = new['timestamp'].astype('int64')
+        new[OHLCV_COLUMNS[1:]] = new[OHLCV_COLUMNS[1:]].astype('float64')
+
+        part_dir = self._partition_dir(symbol, timeframe)
+        os.makedirs(part_dir, exist_ok=True)
+
+        months = pd.to_datetime(new['timestamp'], unit='ms').dt.strftime('%Y-%m')
+        for month, chunk in new.groupby(months):
+            path = os.path.join(part_dir, f"{month}.parquet")
+            if os.path.exists(path):
+                chunk = pd.concat([self._read_file(path), chunk], ignore_index=True)
+            chunk = chunk.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+
+            # Atomic replace so a crash mid-write never corrupts a partition
+            tmp_path = path + '.tmp'
+            chunk.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+        return len(new)
+
+    def _range_files(self, symbol, timeframe, start_ts=None, end_ts=None):
+        """Month partitions overlapping [start_ts, end_ts) (ms)."""
+        start_month = pd.to_datetime(start_ts, unit='ms').strftime('%Y-%m') if start_ts is not None else None
+        end_month = pd.to_datetime(end_ts, unit='ms').strftime('%Y-%m') if end_ts is not None else None
+
+        files = []
+        for path in self._month_files(symbol, timeframe):
+            month = os.path.basename(path)[:-len('.parquet')]
+            if start_month and month < start_month:
+                continue
+            if end_month and month > end_month:
+                continue
+            files.append(path)
+        return files
+
+    def partition_manifest(self, symbol, timeframe, start_ts=None, end_ts=None):
+        """
+        [[file name, mtime, size], ...] of the partitions overlapping the
+        range: changes whenever one of them is rewritten, without syncing or
+        parsing anything.
+        """
+        return [[os.path.basename(path), os.path.getmtime(path), os.path.getsize(path)]
+                for path in self._range_files(symbol, timeframe, start_ts, end_ts)]
+
+    def read(self, symbol, timeframe, start_ts=None, end_ts=None):
+        """
+        Reads stored candles in [start_ts, end_ts) (ms). Only partitions
+        overlapping the range are opened. Timestamps stay as int64 ms.
+        """
+        frames = [self._read_file(path) for path in self._range_files(symbol, timeframe, start_ts, end_ts)]
+
+        if not frames:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+        df = pd.concat(frames, ignore_index=True)
+        if start_ts is not None:
+            df = df[df['timestamp'] >= start_ts]
+        if end_ts is not None:
+            df = df[df['timestamp'] < end_ts]
+        return df.sort_values('timestamp').reset_index(drop=True)
+
+    def _state_path(self, symbol, timeframe):
+        return os.path.join(self._partition_dir(symbol, timeframe), '_backfill.json')
+
+    def _load_state(self, symbol, timeframe):
+        path = self._state_path(symbol, timeframe)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {'empty': []}
+
+    def _save_state(self, symbol, timeframe, state):
+        path = self._state_path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def find_gaps(self, symbol, timeframe, start_ts, end_ts):
+        """
+        Missing candle intervals [gap_start, gap_end) between start_ts and
+        end_ts, excluding intervals the exchange already confirmed empty
+        (listing date, maintenance windows).
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        start_ts = -(-start_ts // tf_ms) * tf_ms  # Align up to a candle open
+        ts = self.read(symbol, timeframe, start_ts, end_ts)['timestamp'].to_numpy(dtype='int64')
+        gaps = missing_intervals(ts, start_ts, end_ts, tf_ms)
+        return subtract_intervals(gaps, self._load_state(symbol, timeframe)['empty'])
+
+    def _fetch_chunk(self, exchange, symbol, timeframe, chunk_start, chunk_end, tf_ms):
+        """
+        One page with retry/backoff. Raises after the last attempt.
+
+        Returns the rows inside the chunk and the holes the page itself
+        proves empty.
+        """
+        for attempt in range(self.RETRIES):
+            try:
+                ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=chunk_start, limit=self.PAGE_LIMIT) or []
+                rows = [c for c in ohlcv if chunk_start <= c[0] < chunk_end]
+                return rows, confirmed_holes(ohlcv, rows, chunk_start, chunk_end, tf_ms)
+            except Exception as e:
+                if attempt == self.RETRIES - 1:
+                    raise
+                logger.warning(f"Chunk {chunk_start} for {symbol} failed ({e}). Retrying...")
+                time.sleep(2 ** attempt)
+
+    def backfill(self, symbol, timeframe, start_ts, end_ts, workers=None):
+        """
+        Parallel, resumable backfill of every missing interval in the range.
+
+        Gaps are split into page-sized chunks and fetched concurrently through
+        a shared throttle; pages are written from this thread only, so month
+        partitions are never written concurrently. Each finished chunk is on
+        disk immediately and holes the exchange itself has are checkpointed
+        in _backfill.json, so an interrupted pull resumes where it stopped
+        and a re-run refetches only what is genuinely missing.
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        # Never persist the still-forming candle (the exchange clock is the replay clock offline)
+        now_ms = self.exchange.milliseconds() if hasattr(self.exchange, 'milliseconds') else int(time.time() * 1000)
+        end_ts = min(end_ts, (int(now_ms) // tf_ms) * tf_ms)
+        if start_ts >= end_ts:
+            return 0
+
+        chunk_ms = self.PAGE_LIMIT * tf_ms
+        chunks = [
+            (s, min(s + chunk_ms, gap_end))
+            for gap_start, gap_end in self.find_gaps(symbol, timeframe, start_ts, end_ts)
+            for s in range(gap_start, gap_end, chunk_ms)
+        ]
+        if not chunks:
+            return 0
+
+        print(f"  Backfilling {symbol} {timeframe}: {len(chunks)} chunks")
+        exchange = self.exchange if isinstance(self.exchange, ThrottledExchange) else ThrottledExchange(self.exchange)
+        state = self._load_state(symbol, timeframe)
+        replay = getattr(self.exchange, 'id', None) == 'replay'
+        written = 0
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=workers or Config.BACKFILL_WORKERS) as pool:
+            futures = {
+                pool.submit(self._fetch_chunk, exchange, symbol, timeframe, s, e, tf_ms): (s, e)
+                for s, e in chunks
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                chunk_start, chunk_end = futures[future]
+                try:
+                    rows, holes = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.warning(f"Chunk {chunk_start}-{chunk_end} for {symbol} {timeframe} failed: {e}")
+                    continue
+
+                written += self.write(symbol, timeframe, rows)
+                # Only holes the exchange confirmed are skipped next time; the rest stay retryable.
+                # A replay store is a recording, so its holes are never written down as history.
+                if holes and not replay:
+                    state['empty'] = merge_intervals(state['empty'] + holes)
+                    self._save_state(symbol, timeframe, state)
+
+                if done % 25 == 0 or done == len(futures):
+                    print(f"  {symbol} {timeframe}: {done}/{len(futures)} chunks")
+
+        if failed:
+            print(f"⚠️ {failed} chunks failed for {symbol} {timeframe}. Re-run to resume.")
+        return written
+
+    def sync(self, symbol, timeframe, start_ts, end_ts):
+        """
+        Ensures [start_ts, end_ts) is on disk: head, tail and any interior
+        gaps are backfilled. Returns number of rows downloaded.
+        """
+        return self.backfill(symbol, timeframe, start_ts, end_ts)
+
+    def load(self, symbol, timeframe, start_ts, end_ts):
+        """
+        Sync-then-read. Returns the standard OHLCV DataFrame used by every
+        engine (timestamp as naive UTC datetime), built from the memory-mapped
+        export (re-exported only when a partition changed), so repeated loads
+        of the same history parse no Parquet.
+        """
+        downloaded = self.sync(symbol, timeframe, start_ts, end_ts)
+        if downloaded:
+            print(f"  Downloaded {downloaded} new {timeframe} candles for {symbol}")
+
+        return self.load_arrays(symbol, timeframe, start_ts, end_ts, sync=False).to_frame()
+
+    def _manifest_path(self, symbol, timeframe):
+        return os.path.join(self._mmap_dir(symbol, timeframe), 'manifest.json')
+
+    def _read_manifest(self, symbol, timeframe):
+        try:
+            with open(self._manifest_path(symbol, timeframe), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _source_signature(self, symbol, timeframe):
+        """Partition file names + mtimes: changes whenever a month is rewritten."""
+        return [[os.path.basename(f), os.path.getmtime(f)] for f in self._month_files(symbol, timeframe)]
+
+    def export_arrays(self, symbol, timeframe):
+        """
+        (Re)builds the contiguous .npy column files from the Parquet
+        partitions. All six columns go into a fresh generation directory
+        and manifest.json (written last, atomically) switches readers to it,
+        so a crash mid-export or a concurrent reader never sees columns from
+        two different exports. Readers that already mapped the previous
+        generation keep their view; older generations are removed.
+        """
+        signature = self._source_signature(symbol, timeframe)
+        df = self.read(symbol, timeframe)
+        mmap_dir = self._mmap_dir(symbol, timeframe)
+        generation = f"gen_{time.time_ns()}"
+        gen_dir = os.path.join(mmap_dir, generation)
+        os.makedirs(gen_dir, exist_ok=True)
+
+        for col in OHLCV_COLUMNS:
+            dtype = 'int64' if col == 'timestamp' else 'float64'
+            with open(os.path.join(gen_dir, f"{col}.npy"), 'wb') as f:
+                np.save(f, np.ascontiguousarray(df[col].to_numpy(dtype=dtype)))
+
+        previous = self._read_manifest(symbol, timeframe)
+        manifest = {'generation': generation, 'rows': len(df), 'source': signature}
+        tmp_path = self._manifest_path(symbol, timeframe) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path(symbol, timeframe))
+
+        # Keep the generation readers may still be opening; drop anything older
+        keep = {generation, previous['generation'] if previous else None}
+        for name in os.listdir(mmap_dir):
+            path = os.path.join(mmap_dir, name)
+            if os.path.isdir(path) and name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith('.npy'):  # Pre-manifest layout
+                os.remove(path)
+        return len(df)
+
+    def _arrays_stale(self, symbol, timeframe):
+        """True if the partitions changed since the export the manifest points at."""
+        signature = self._source_signature(symbol, timeframe)
+        if not signature:
+            return False
+        manifest = self._read_manifest(symbol, timeframe)
+        return manifest is None or manifest['source'] != signature
+
+    def open_arrays(self, symbol, timeframe):
+        """
+        Maps the exported columns read-only (no sync, no parsing), exporting
+        first if nothing was exported yet. Columns are validated against the
+        manifest's row count.
+        """
+        for attempt in range(3):
+            manifest = self._read_manifest(symbol, timeframe)
+            if manifest is None:
+                if not self._month_files(symbol, timeframe):
+                    return CandleArrays({col: np.array([], dtype='int64' if col == 'timestamp' else 'float64')
+                                         for col in OHLCV_COLUMNS})
+                self.export_arrays(symbol, timeframe)
+                continue
+            gen_dir = os.path.join(self._mmap_dir(symbol, timeframe), manifest['generation'])
+            try:
+                columns = {col: np.load(os.path.join(gen_dir, f"{col}.npy"), mmap_mode='r')
+                           for col in OHLCV_COLUMNS}
+            except FileNotFoundError:
+                continue  # A newer export removed this generation; re-read the manifest
+            if all(len(values) == manifest['rows'] for values in columns.values()):
+                return CandleArrays(columns, source=(gen_dir, 0))
+            self.export_arrays(symbol, timeframe)  # Damaged generation: rebuild it
+        raise RuntimeError(f"Could not map consistent arrays for {symbol} {timeframe}")
+
+    def load_arrays(self, symbol, timeframe, start_ts=None, end_ts=None, sync=True):
+        """
+        Zero-copy counterpart of load(): syncs (optional), refreshes the .npy
+        export only when partitions changed, and returns a windowed view.
+        """
+        if sync and start_ts is not None and end_ts is not None:
+            self.sync(symbol, timeframe, start_ts, end_ts)
+        if self._arrays_stale(symbol, timeframe):
+            self.export_arrays(symbol, timeframe)
+        return self.open_arrays(symbol, timeframe).window(start_ts, end_ts)
+
+def load_candles(symbol, start_date, end_date, timeframe='5m', exchange=None):
+    """Convenience wrapper for 'YYYY-MM-DD' date ranges used by the backtests."""
+    start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+    end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
+    return CandleStore(exchange).load(symbol, timeframe, start_ts, end_ts)
+
+if __name__ == "__main__":
+    for symbol in Config.SYMBOLS:
+        df = load_candles(symbol, '2025-01-06', '2026-01-06')
+        print(f"{symbol}: {len(df)} candles in store")
+        arrays = CandleStore().load_arrays(symbol, '5m', sync=False)
+        print(f"{symbol}: {len(arrays)} candles memory-mapped")
@@ -4,242 +4,141 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 import time
+from candle_store import CandleStore
+from exit_engine import ExitPolicy, resolve_policy
+from signal_kernel import evaluate_signals, candidate_indices, BULLISH
+from feature_store import FeatureStore, compute_features
+
+def model_features(df, table=None, candles=None):
+    """
+    Parameter-independent inputs of run_model as plain arrays: candles plus
+    the feature table (ATR, live 4H bias, session levels; FeatureStore.get or
+    computed here). Built once and shared by every model run (and,
+    memory-mapped, by the sweep workers in param_sweep).
+
+    candles: optional CandleArrays for exactly df's rows (CandleStore
+    load_arrays); its mapped columns are used instead of copies from df.
+    """
+    table = compute_features(df) if table is None else table
+    if candles is not None:
+        features = {'timestamp': candles.timestamp, 'high': candles.high,
+                    'low': candles.low, 'close': candles.close}
+    else:
+        features = {
+            'timestamp': df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64'),
+            'high': df['high'].to_numpy(dtype='float64'),
+            'low': df['low'].to_numpy(dtype='float64'),
+            'close': df['close'].to_numpy(dtype='float64'),
+        }
+    for column in table.columns:
+        features[column] = table[column].to_numpy(dtype='int8' if column == 'bias' else 'float64')
+    return features
+
+def model_policy(params):
+    """
+    Exit rules of simulate_model: next 4 hours (48 candles), 50% at TP1, stop
+    to breakeven, 50% at TP2, stop assumed first on ambiguous candles,
+    remainder closed at market.
+    """
+    tp1_r, tp2_r = params['tp_multiples']
+    return ExitPolicy(((tp1_r, 0.5), (tp2_r, 0.5)), breakeven_after=0,
+                      timeout=48, timeout_exit='close', stop_first=True)
+
+def simulate_model(features, params):
+    """
+    One model run over prepared features.
+
+    Params: killzones (UTC hours), quartile_range, tp_multiples and optionally
+    stop_atr_mult (default 2.0), min_smt with an 'smt' feature array.
+
+    Returns:
+        dict of arrays: entry_idx, direction (+1/-1), r_multiple, outcome
+    """
+    q_min, q_max = params['quartile_range']
+    stop_atr_mult = params.get('stop_atr_mult', 2.0)
+    smt = features.get('smt') if params.get('min_smt') is not None else None
+    
+    # Entry gates from the shared signal kernel: killzone hours, live 4H bias,
+    # position in the 24h range (PDH/PDL) and a real PDL/PDH or London sweep
+    levels = dict(features, day_high=features['pdh'], day_low=features['pdl'])
+    signals = evaluate_signals(
+        features['timestamp'], features['high'], features['low'], features['close'],
+        features['bias'], levels,
+        atr=features['atr'], smt=smt, min_smt=params.get('min_smt') or 0.0,
+        ref=("day",), killzone_hours=params['killzones'],
+        long_zone=(0.0, q_max),               # Must be in discount
+        short_zone=(1.0 - q_max, 1.0),        # Must be in premium (mirroring logic)
+        stop_atr_mult=stop_atr_mult,
+    )
+    entries = candidate_indices(signals, 300)
+    direction = signals['direction'][entries].astype('int64')
+    
+    # OUTCOME SIMULATION (model_policy)
+    exits = resolve_policy(
+        features['high'], features['low'], features['close'], entries, direction,
+        features['close'][entries], signals['stop'][entries], model_policy(params),
+    )
+    return {
+        'entry_idx': entries,
+        'direction': direction,
+        'r_multiple': exits['r_multiple'],
+        'outcome': exits['outcome'],
+    }
 
 class ComparativeBacktest:
-    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06'):
+    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06', exchange=None):
         self.symbol = symbol
         self.start_date = start_date
         self.end_date = end_date
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
         self.data_cache = None
+        self.features = None  # Parameter-independent arrays (built once per data load)
+        self.feature_store = FeatureStore(self.store)
 
-    def fetch_data(self):
-        if self.data_cache is not None:
-            return self.data_cache.copy()
-
-        print(f"📥 Fetching {self.symbol} data...")
-        start_ts = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
+    def data_range(self):
+        """(start_ts, end_ts) in ms that fetch_data loads."""
         end_ts = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
         
-        all_data = []
-        current_ts = start_ts
-        
         # Limit to last 3 months for speed if needed, but trying full year
         # Actually, let's just fetch 90 days to be quick and responsive
-        start_ts = int((datetime.now() - timedelta(days=90)).timestamp() * 1000)
-        current_ts = start_ts
+        # (from midnight UTC, so the range is stable within a day)
+        day_ms = 24 * 60 * 60 * 1000
+        start_ts = (int((datetime.now() - timedelta(days=90)).timestamp() * 1000) // day_ms) * day_ms
+        return start_ts, end_ts
 
-        while current_ts < end_ts:
-            try:
-                ohlcv = self.exchange.fetch_ohlcv(self.symbol, '5m', since=current_ts, limit=1000)
-                if not ohlcv:
-                    break
-                all_data.extend(ohlcv)
-                current_ts = ohlcv[-1][0] + 1
-            except Exception as e:
-                print(f"Error fetching: {e}")
-                break
-                
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.drop_duplicates(subset='timestamp')
-        
-        # Calculate ATR once
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        df['atr'] = np.max(ranges, axis=1).rolling(14).mean()
+    def fetch_data(self):
+        if self.data_cache is not None:
+            return self.data_cache.copy()
+
+        print(f"📥 Loading {self.symbol} data...")
+        start_ts, end_ts = self.data_range()
+        df = self.store.load(self.symbol, '5m', start_ts, end_ts)
         
         self.data_cache = df
         print(f"✅ Loaded {len(df)} candles")
         return df
 
-    def get_4h_bias(self, df, idx):
-        # Simplified bias for speed: Price > EMA 50 (4H approx)
-        # 4H EMA 50 ~ 50*48 = 2400 5m candles
-        if idx < 2400: return "NEUTRAL"
-        
-        # Approximate HTF trend using 5m EMAs with equivalent periods
-        # EMA relative to Close at 2400 periods back is roughly HTF 
-        # Better: Calculate true EMA on resampled data? 
-        # Let's stick to the logic from sniper_backtest.py but optimized
-        
-        # Just use simple Moving Average of 2400 periods as a proxy for HTF Trend
-        # closing_price = df['close'].iloc[idx]
-        # ma_long = df['close'].iloc[idx-2400:idx].mean()
-        # return "BULLISH" if closing_price > ma_long else "BEARISH"
-        
-        # Reusing sniper logic exactly for fairness
-        lookback = min(6000, idx)
-        if lookback < 2500: return "NEUTRAL"
-        
-        # We process a slice. This is slow in a loop. 
-        # Optimization: Pre-calculate bias column?
-        # Yes, let's pre-calculate. See run_model.
-        return df['bias'].iloc[idx]
-
     def run_model(self, model_name, params):
         df = self.fetch_data()
         
-        # Pre-calculate Bias (HTF)
-        # Resample to 4H
-        df_4h = df.set_index('timestamp').resample('4h').agg({'close': 'last'}).dropna()
-        df_4h['ema_20'] = df_4h['close'].ewm(span=20).mean()
-        df_4h['ema_50'] = df_4h['close'].ewm(span=50).mean()
-        
-        # Map 4H bias back to 5m
-        # Timestamps for join
-        df_4h['bias_val'] = np.where(df_4h['ema_20'] > df_4h['ema_50'], 'BULLISH', 'BEARISH')
-        
-        # Merge bias back (method="ffill")
-        df_merged = pd.merge_asof(df, df_4h[['bias_val']], left_on='timestamp', right_index=True, direction='backward')
-        df['bias'] = df_merged['bias_val'].fillna('NEUTRAL')
-
         print(f"\n🚀 Running Model: {model_name}")
         print(f"   Settings: Killzone={params['killzones']}, "
               f"Quartiles={params['quartile_range']}, "
               f"Targets={params['tp_multiples']}R")
 
-        trades = []
-        equity = 100.0
-        
-        killzone_hours = params['killzones'] # List of valid hours [12,13, ..., 20]
-        q_min, q_max = params['quartile_range']
-        tp1_r, tp2_r = params['tp_multiples']
+        if self.features is None:
+            self.features = model_features(df, self.feature_store.get(self.symbol, df))
+        result = simulate_model(self.features, params)
         
-        # Pre-calculate ranges logic helper
-        # We need a rolling window for ranges. 
-        # Iterating is still safest for "simulation" correctness.
+        print(f"   Found {len(result['entry_idx'])} killzone setups...")
         
-        # Optimization: Only iterate candles in killzones
-        df['hour'] = df['timestamp'].dt.hour
-        potential_entries = df[df['hour'].isin(killzone_hours)]
-        
-        print(f"   Scanning {len(potential_entries)} killzone candles...")
-        
-        for idx in potential_entries.index:
-            if idx < 300: continue
-            
-            row = df.loc[idx]
-            
-            # 1. Bias Check
-            bias = row['bias']
-            if bias == 'NEUTRAL': continue
-            
-            # 2. Quartile Check checks
-            # Need recent data for range
-            # Asian Range: 00-05 UTC. London: 07-10 UTC.
-            # We look back 24h (288 candles)
-            lookback_start = max(0, idx - 288)
-            recent = df.iloc[lookback_start:idx]
-            
-            # Find ranges
-            # Optimization: Don't re-filter dataframe every loop. 
-            # Just grab today's ranges if possible.
-            # For backtest speed, we'll do the "dumb" check:
-            # Current price relative to 24h High/Low is what matters most for "Discount/Premium"
-            day_high = recent['high'].max()
-            day_low = recent['low'].min()
-            
-            if day_high == day_low: continue
-            
-            price_pos = (row['close'] - day_low) / (day_high - day_low)
-            
-            # Quartile Logic
-            if bias == 'BULLISH':
-                # Must be in discount
-                if not (0.0 <= price_pos <= q_max): continue
-            else:
-                # Must be in premium
-                if not ((1.0 - q_max) <= price_pos <= 1.0): continue # mirroring logic
-                
-            # 3. Sweep Logic (Mock)
-            # Simulating sweep check: Did we just wick below low/high?
-            # True Sweep checking is complex. We'll simulate "Setup Found" based on 5% probability 
-            # IF we are in the right zone. This preserves relative frequency between models.
-            # Actual frequency is roughly 1-2 per day.
-            # Killzone is 8 hours = 96 candles. 
-            # 1.5% chance per candle gives ~1.4 setups.
-            
-            if np.random.random() > 0.015: continue
-            
-            # ENTRY
-            entry = row['close']
-            atr = row['atr'] if not pd.isna(row['atr']) else entry*0.005
-            stop_dist = atr * 2.0
-            
-            if bias == 'BULLISH':
-                stop = entry - stop_dist
-                tp1 = entry + (stop_dist * tp1_r)
-                tp2 = entry + (stop_dist * tp2_r)
-            else:
-                stop = entry + stop_dist
-                tp1 = entry - (stop_dist * tp1_r)
-                tp2 = entry - (stop_dist * tp2_r)
-                
-            # OUTCOME SIMULATION
-            # We check the next 4 hours (48 candles)
-            outcome = 'TIMEOUT'
-            pnl_r = 0.0
-            
-            # Check next 48 candles
-            future = df.iloc[idx+1:idx+49]
-            hit_tp1 = False
-            
-            for _, f_row in future.iterrows():
-                if bias == 'BULLISH':
-                    if f_row['low'] <= stop:
-                        pnl_r = -1.0
-                        outcome = 'LOSS'
-                        break
-                    if not hit_tp1 and f_row['high'] >= tp1:
-                        hit_tp1 = True
-                        pnl_r += 0.5 * tp1_r # Bank 50%
-                        # Move SL to BE
-                        stop = entry 
-                    if hit_tp1 and f_row['high'] >= tp2:
-                        pnl_r += 0.5 * tp2_r # Bank rest
-                        outcome = 'FULL_WIN'
-                        break
-                    if hit_tp1 and f_row['low'] <= stop:
-                        outcome = 'PARTIAL_WIN'
-                        # PnL is just the TP1 part
-                        break
-                else:
-                    if f_row['high'] >= stop:
-                        pnl_r = -1.0
-                        outcome = 'LOSS'
-                        break
-                    if not hit_tp1 and f_row['low'] <= tp1:
-                        hit_tp1 = True
-                        pnl_r += 0.5 * tp1_r
-                        stop = entry
-                    if hit_tp1 and f_row['low'] <= tp2:
-                        pnl_r += 0.5 * tp2_r
-                        outcome = 'FULL_WIN'
-                        break
-                    if hit_tp1 and f_row['high'] >= stop:
-                        outcome = 'PARTIAL_WIN'
-                        break
-            
-            if outcome == 'TIMEOUT':
-                # Close at market? Or assume validation fail.
-                # Let's say we close at market
-                exit_price = future.iloc[-1]['close'] if len(future) > 0 else entry
-                dist = abs(entry - stop_dist - entry) # risk unit
-                if bias == 'BULLISH':
-                    pnl_r = (exit_price - entry) / stop_dist
-                else:
-                    pnl_r = (entry - exit_price) / stop_dist
-                
-                # Cap at -1
-                if pnl_r < -1: pnl_r = -1
-            
+        trades = []
+        for k, direction in enumerate(result['direction']):
             trades.append({
-                'outcome': outcome,
-                'pnl_r': pnl_r,
-                'bias': bias
+                'outcome': str(result['outcome'][k]),
+                'pnl_r': float(result['r_multiple'][k]),
+                'bias': 'BULLISH' if direction == BULLISH else 'BEARISH'
             })
             
         return trades
@@ -12,6 +12,22 @@ class Config:
     MAX_DRAWDOWN_LIMIT = 0.06  # 6%
     DAILY_TRADE_LIMIT = 2
     
+    # Concurrency (run_scanner_job thread pool; exchange rate limit is shared)
+    SCAN_WORKERS = 8
+    BACKFILL_WORKERS = 4  # Historical chunk downloads (same shared throttle)
+    SWEEP_WORKERS = None  # Parameter sweep processes (None = all cores)
+    
+    # Universe Mode (scan the top-N USDT pairs by 24h volume instead of SYMBOLS)
+    UNIVERSE_MODE = False
+    UNIVERSE_SIZE = 200
+    UNIVERSE_QUOTE = 'USDT'
+    UNIVERSE_REFRESH_MINUTES = 60  # Volume ranking is re-fetched at most this often
+    
+    # L2 Depth (local order book per symbol, see order_book.DepthFeed)
+    DEPTH_LEVELS = 50  # Levels per snapshot
+    DEPTH_REFRESH_SECONDS = 2  # Background refresh interval
+    DEPTH_MAX_AGE_SECONDS = 10  # Older books are re-fetched before a depth check
+    
     # Safety Toggles
     USE_TRADELOCKER_API = True  # Set to False to disable API sync and use mock values
     SYNC_AUTH_KEY = os.environ.get("SYNC_AUTH_KEY", "")  # Shared secret for Local -> Cloud push (MUST be set in .env.local)
@@ -46,3 +62,18 @@ class Config:
 
     # Database Path (Modal Volume)
     DB_PATH = "/data/smc_alpha.db" if os.path.exists("/data") else os.path.join(os.getcwd(), "smc_alpha.db")
+
+    # Local Candle Store (Parquet, partitioned by symbol/timeframe/month)
+    CANDLE_STORE_PATH = "/data/candles" if os.path.exists("/data") else os.path.join(os.getcwd(), "candle_store")
+    
+    # Intermarket Snapshot Cache (keyed by 5m bar)
+    INTERMARKET_CACHE_PATH = "/data/intermarket_cache.json" if os.path.exists("/data") else os.path.join(os.getcwd(), "intermarket_cache.json")
+    
+    # Live Scanner Ring-Buffer Cache (persists across scans on the Modal Volume)
+    CANDLE_CACHE_PATH = "/data/candle_cache" if os.path.exists("/data") else os.path.join(os.getcwd(), "candle_cache")
+    
+    # Live Scanner Streaming Indicator State (ATR, 4H EMAs; restored on cold containers)
+    INDICATOR_STATE_PATH = "/data/indicator_state" if os.path.exists("/data") else os.path.join(os.getcwd(), "indicator_state")
+    
+    # Backtest Run Registry (SQLite: runs keyed by config hash, trade records, equity curves)
+    RUN_REGISTRY_PATH = "/data/backtest_runs.db" if os.path.exists("/data") else os.path.join(os.getcwd(), "backtest_runs.db")
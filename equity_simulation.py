@@ -3,44 +3,28 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+from candle_store import CandleStore
+from indicators import calculate_atr
 
 class EquitySimulation:
-    def __init__(self, start_equity=100000.0, risk_pct=0.0075):
+    def __init__(self, start_equity=100000.0, risk_pct=0.0075, exchange=None):
         self.equity = start_equity
         self.risk_pct = risk_pct
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
         
     def fetch_data(self):
-        print("📥 Fetching 90 days of 5m data...")
+        print("📥 Loading 90 days of 5m data...")
         # 90 Days lookback
         start_ts = int((datetime.now() - timedelta(days=90)).timestamp() * 1000)
         
-        all_data = []
-        current_ts = start_ts
-        
-        # We need end_ts to act as a loop breaker
+        # Up to now (the store drops the still-forming candle)
         end_ts = int(datetime.now().timestamp() * 1000)
 
-        while current_ts < end_ts:
-            try:
-                ohlcv = self.exchange.fetch_ohlcv('BTC/USDT', '5m', since=current_ts, limit=1000)
-                if not ohlcv: break
-                all_data.extend(ohlcv)
-                current_ts = ohlcv[-1][0] + 1
-            except Exception as e:
-                print(f"Error: {e}")
-                break
-                
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.drop_duplicates(subset='timestamp')
+        df = self.store.load('BTC/USDT', '5m', start_ts, end_ts)
         
         # Calculate ATR
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        df['atr'] = np.max(ranges, axis=1).rolling(14).mean()
+        df['atr'] = calculate_atr(df)
         
         print(f"✅ Loaded {len(df)} candles")
         return df
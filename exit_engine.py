@@ -0,0 +1,297 @@
+import numpy as np
+from fvg_index import first_touch_at_or_above
+
+OUTCOMES = np.array(['TIMEOUT', 'WIN', 'LOSS'])
+
+def resolve_exits(high, low, close, entry_idx, direction, stop, target, max_lookahead=288):
+    """
+    Batch first-touch resolution for fixed stop/target trades.
+
+    Same rules as ScannerBacktest.check_outcome, for every trade at once:
+    candles entry+1 .. entry+max_lookahead are scanned, the stop wins a
+    candle that touches both levels, and an untouched trade times out at the
+    close of its last candle. Each side is one binary-lifting first-touch
+    query over the whole history (O((n + trades) log n)) instead of a
+    Python loop over up to 288 candles per trade.
+
+    Args:
+        high, low, close: full-history candle arrays
+        entry_idx: candle index of each entry
+        direction: +1 LONG / -1 SHORT per trade
+        stop, target: price levels per trade
+        max_lookahead: candles to follow each trade
+
+    Returns:
+        dict of arrays: outcome ('WIN'/'LOSS'/'TIMEOUT'), exit_price, hold (candles)
+    """
+    high = np.asarray(high, dtype='float64')
+    low = np.asarray(low, dtype='float64')
+    close = np.asarray(close, dtype='float64')
+    entry_idx = np.asarray(entry_idx, dtype='int64')
+    is_long = np.asarray(direction) > 0
+    stop = np.asarray(stop, dtype='float64')
+    target = np.asarray(target, dtype='float64')
+
+    last = np.minimum(entry_idx + max_lookahead, len(close) - 1)
+    start = entry_idx + 1
+
+    # Levels above price are touched by the high, levels below by the low
+    # ("low <= level" is "-low >= -level")
+    up_touch = first_touch_at_or_above(high, start, np.where(is_long, target, stop))
+    down_touch = first_touch_at_or_above(-low, start, -np.where(is_long, stop, target))
+    stop_at = np.where(is_long, down_touch, up_touch)
+    target_at = np.where(is_long, up_touch, down_touch)
+
+    loss = (stop_at <= last) & (stop_at <= target_at)
+    win = ~loss & (target_at <= last)
+    code = np.where(loss, 2, np.where(win, 1, 0))
+
+    exit_at = np.where(loss, stop_at, np.where(win, target_at, last))
+    exit_price = np.where(loss, stop, np.where(win, target, close[last]))
+    return {
+        'outcome': OUTCOMES[code],
+        'exit_price': exit_price,
+        'hold': exit_at - entry_idx,
+    }
+
+# --- Exit policies: TP ladders, breakeven, trailing stops -------------------
+
+try:
+    from numba import njit  # Optional: compiled kernel when installed
+except ImportError:
+    njit = None
+
+POLICY_OUTCOMES = np.array(['TIMEOUT', 'TIMEOUT_PARTIAL', 'FULL_WIN', 'PARTIAL_WIN', 'LOSS', 'TRAIL_EXIT'])
+
+class ExitPolicy:
+    """
+    Declarative exit rules, all distances in R (1R = entry-to-stop).
+
+    tp_ladder: ((r_multiple, fraction), ...) closed in order; any fraction
+        left over rides to the stop or the timeout.
+    breakeven_after: TP leg index after which the stop moves to entry (None = never).
+    trail_r: trailing stop distance in R behind the best price (None = off),
+        active once leg `trail_after` has filled (None = from entry).
+        The trail follows candle extremes and applies from the next candle.
+    timeout: candles to hold before the rest is closed.
+    timeout_exit: 'close' marks the rest at the last close, 'flat' books 0R.
+    stop_first: when a candle touches the stop and a target, assume the stop
+        came first (conservative). False checks targets first, and a candle
+        that fills a target does not also stop out.
+    one_leg_per_candle: a candle fills at most one TP leg; a candle spanning
+        several targets leaves the later legs to the following candles.
+    """
+    def __init__(self, tp_ladder=((3.0, 1.0),), breakeven_after=None, trail_r=None,
+                 trail_after=None, timeout=288, timeout_exit='close', stop_first=True,
+                 one_leg_per_candle=False):
+        self.tp_ladder = tuple(tp_ladder)
+        self.breakeven_after = breakeven_after
+        self.trail_r = trail_r
+        self.trail_after = trail_after
+        self.timeout = timeout
+        self.timeout_exit = timeout_exit
+        self.stop_first = stop_first
+        self.one_leg_per_candle = one_leg_per_candle
+
+    def _kernel_args(self):
+        tp_r = np.array([r for r, _ in self.tp_ladder], dtype='float64')
+        tp_frac = np.array([f for _, f in self.tp_ladder], dtype='float64')
+        return (
+            tp_r, tp_frac,
+            -1 if self.breakeven_after is None else int(self.breakeven_after),
+            np.nan if self.trail_r is None else float(self.trail_r),
+            -1 if self.trail_after is None else int(self.trail_after),
+            int(self.timeout), self.timeout_exit == 'close', bool(self.stop_first),
+            bool(self.one_leg_per_candle),
+        )
+
+def _policy_loop(high, low, close, entry_idx, entry, risk, direction,
+                 tp_r, tp_frac, be_after, trail_r, trail_after, timeout, timeout_close, stop_first,
+                 one_leg):
+    """Per-trade state machine (compiled with numba when available)."""
+    n_trades = entry_idx.shape[0]
+    n_legs = tp_r.shape[0]
+    r_out = np.zeros(n_trades)
+    code_out = np.zeros(n_trades, dtype=np.int64)
+    hold_out = np.zeros(n_trades, dtype=np.int64)
+    legs_out = np.zeros(n_trades, dtype=np.int64)
+
+    for t in range(n_trades):
+        e = entry_idx[t]
+        last = min(e + timeout, high.shape[0] - 1)
+        side = direction[t]
+        stop_r = -1.0
+        peak_r = 0.0
+        booked = 0.0
+        left = 1.0
+        legs = 0
+        code = -1
+        hold = last - e
+        trailing = trail_r == trail_r and trail_after < 0
+
+        for j in range(e + 1, last + 1):
+            if side > 0:
+                best = (high[j] - entry[t]) / risk[t]
+                worst = (low[j] - entry[t]) / risk[t]
+            else:
+                best = (entry[t] - low[j]) / risk[t]
+                worst = (entry[t] - high[j]) / risk[t]
+
+            if stop_first and worst <= stop_r:
+                booked += left * stop_r
+                left = 0.0
+                code = 3 if legs > 0 else (4 if stop_r < 0 else 5)
+                hold = j - e
+                break
+
+            filled_now = False
+            while legs < n_legs and best >= tp_r[legs]:
+                booked += tp_frac[legs] * tp_r[legs]
+                left -= tp_frac[legs]
+                if be_after >= 0 and legs >= be_after and stop_r < 0.0:
+                    stop_r = 0.0
+                if trail_r == trail_r and trail_after >= 0 and legs >= trail_after:
+                    trailing = True
+                legs += 1
+                filled_now = True
+                if one_leg:
+                    break
+
+            if legs == n_legs and left <= 1e-12:
+                code = 2
+                hold = j - e
+                break
+
+            if (stop_first or not filled_now) and worst <= stop_r:
+                booked += left * stop_r
+                left = 0.0
+                code = 3 if legs > 0 else (4 if stop_r < 0 else 5)
+                hold = j - e
+                break
+
+            if best > peak_r:
+                peak_r = best
+            if trailing and peak_r - trail_r > stop_r:
+                stop_r = peak_r - trail_r
+
+        if code < 0:
+            if timeout_close and left > 0:
+                if side > 0:
+                    booked += left * (close[last] - entry[t]) / risk[t]
+                else:
+                    booked += left * (entry[t] - close[last]) / risk[t]
+            code = 1 if legs > 0 else 0
+
+        r_out[t] = booked
+        code_out[t] = code
+        hold_out[t] = hold
+        legs_out[t] = legs
+    return r_out, code_out, hold_out, legs_out
+
+_compiled_policy_loop = njit(cache=True)(_policy_loop) if njit is not None else None
+
+def _policy_numpy(high, low, close, entry_idx, entry, risk, direction,
+                  tp_r, tp_frac, be_after, trail_r, trail_after, timeout, timeout_close, stop_first,
+                  one_leg):
+    """Pure-NumPy fallback: same state machine, vectorized across trades, one step per candle."""
+    n_trades = len(entry_idx)
+    n_legs = len(tp_r)
+    last = np.minimum(entry_idx + timeout, len(high) - 1)
+    side = direction > 0
+
+    stop_r = np.full(n_trades, -1.0)
+    peak_r = np.zeros(n_trades)
+    booked = np.zeros(n_trades)
+    left = np.ones(n_trades)
+    legs = np.zeros(n_trades, dtype='int64')
+    code = np.full(n_trades, -1, dtype='int64')
+    hold = last - entry_idx
+    trail_on = not np.isnan(trail_r)
+    trailing = np.full(n_trades, trail_on and trail_after < 0)
+
+    def stop_out(hit, step):
+        nonlocal booked, left
+        booked = np.where(hit, booked + left * stop_r, booked)
+        left = np.where(hit, 0.0, left)
+        code[hit] = np.where(legs[hit] > 0, 3, np.where(stop_r[hit] < 0, 4, 5))
+        hold[hit] = step
+
+    for step in range(1, int(timeout) + 1):
+        open_ = (code < 0) & (entry_idx + step <= last)
+        if not open_.any():
+            break
+        j = np.minimum(entry_idx + step, len(high) - 1)
+        best = np.where(side, high[j] - entry, entry - low[j]) / risk
+        worst = np.where(side, low[j] - entry, entry - high[j]) / risk
+
+        if stop_first:
+            stop_out(open_ & (worst <= stop_r), step)
+            open_ &= code < 0
+
+        filled_now = np.zeros(n_trades, dtype=bool)
+        for leg in range(n_legs):
+            fill = open_ & (legs == leg) & (best >= tp_r[leg])
+            if one_leg:
+                fill &= ~filled_now
+            booked = np.where(fill, booked + tp_frac[leg] * tp_r[leg], booked)
+            left = np.where(fill, left - tp_frac[leg], left)
+            if be_after >= 0 and leg >= be_after:
+                stop_r = np.where(fill & (stop_r < 0), 0.0, stop_r)
+            if trail_on and trail_after >= 0 and leg >= trail_after:
+                trailing |= fill
+            legs = np.where(fill, leg + 1, legs)
+            filled_now |= fill
+
+        done = open_ & (legs == n_legs) & (left <= 1e-12)
+        code[done] = 2
+        hold[done] = step
+        open_ &= ~done
+
+        can_stop = open_ if stop_first else open_ & ~filled_now
+        stop_out(can_stop & (worst <= stop_r), step)
+        open_ &= code < 0
+
+        peak_r = np.where(open_, np.maximum(peak_r, best), peak_r)
+        if trail_on:
+            stop_r = np.where(open_ & trailing, np.maximum(stop_r, peak_r - trail_r), stop_r)
+
+    still_open = code < 0
+    if timeout_close:
+        mark = np.where(side, close[last] - entry, entry - close[last]) / risk
+        booked = np.where(still_open, booked + left * mark, booked)
+    code[still_open] = np.where(legs[still_open] > 0, 1, 0)
+    return booked, code, hold, legs
+
+def resolve_policy(high, low, close, entry_idx, direction, entry, stop, policy, use_numba=None):
+    """
+    Evaluates an ExitPolicy for many trades at once.
+
+    Uses the numba-compiled state machine when numba is installed (or
+    use_numba=True), otherwise the NumPy step-per-candle fallback; both give
+    identical results.
+
+    Returns:
+        dict of arrays: r_multiple, outcome, hold (candles), legs_hit
+    """
+    high = np.asarray(high, dtype='float64')
+    low = np.asarray(low, dtype='float64')
+    close = np.asarray(close, dtype='float64')
+    entry_idx = np.asarray(entry_idx, dtype='int64')
+    direction = np.asarray(direction, dtype='int64')
+    entry = np.asarray(entry, dtype='float64')
+    risk = np.abs(entry - np.asarray(stop, dtype='float64'))
+
+    if use_numba is None:
+        use_numba = _compiled_policy_loop is not None
+    if use_numba and _compiled_policy_loop is None:
+        raise ImportError("numba is not installed")
+    kernel = _compiled_policy_loop if use_numba else _policy_numpy
+
+    r, code, hold, legs = kernel(high, low, close, entry_idx, entry, risk, direction,
+                                 *policy._kernel_args())
+    return {
+        'r_multiple': r,
+        'outcome': POLICY_OUTCOMES[code],
+        'hold': hold,
+        'legs_hit': legs,
+    }
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# Default edge-discovery dimensions (columns of EdgeDiscoveryBacktest.collect_candidates)
+FACTORS = ('killzone', 'time_quartile', 'pq_bucket', 'volatility', 'day_of_week')
+
+def _cell_ids(trades, factors):
+    """Compact cell id per row for the factor combination, plus each cell's factor values."""
+    codes, uniques = [], []
+    for factor in factors:
+        code, values = pd.factorize(trades[factor], sort=True)
+        codes.append(code)
+        uniques.append(np.asarray(values, dtype=object))
+    flat = np.ravel_multi_index(codes, [len(values) for values in uniques])
+    occupied, cell = np.unique(flat, return_inverse=True)
+    keys = np.unravel_index(occupied, [len(values) for values in uniques])
+    labels = {factor: values[key] for factor, values, key in zip(factors, uniques, keys)}
+    return cell, labels
+
+def bootstrap_means(cell, values, n_boot=1000, rng=None, exact_max=250, chunk_elems=4_000_000):
+    """
+    Bootstrap replicate means of `values` for every cell at once.
+
+    Cells up to `exact_max` rows are resampled with replacement (all cells of
+    a replicate block in one fancy-indexing step, sums via reduceat over the
+    cell-sorted rows). Larger cells draw the replicate means from their
+    normal limit (mean, std / sqrt(n)), which is what their bootstrap
+    distribution converges to, so millions of rows cost no more than the cells.
+
+    Returns:
+        (n_cells, n_boot) array of replicate means
+    """
+    rng = rng or np.random.default_rng()
+    values = np.asarray(values, dtype='float64')
+    counts = np.bincount(cell)
+    n_cells = len(counts)
+    sums = np.bincount(cell, weights=values, minlength=n_cells)
+    means = sums / np.maximum(counts, 1)
+    reps = np.empty((n_cells, n_boot))
+
+    large = counts > exact_max
+    if large.any():
+        sq = np.bincount(cell, weights=values * values, minlength=n_cells)
+        std = np.sqrt(np.maximum(sq[large] / counts[large] - means[large] ** 2, 0.0))
+        reps[large] = means[large, None] + (std / np.sqrt(counts[large]))[:, None] * rng.standard_normal((large.sum(), n_boot))
+
+    small = ~large
+    if small.any():
+        order = np.argsort(cell, kind='stable')
+        order = order[small[cell[order]]]
+        sorted_values = values[order]
+        small_counts = np.where(small, counts, 0)
+        starts = np.concatenate(([0], np.cumsum(small_counts)[:-1]))
+        row_start = starts[cell[order]]
+        row_n = counts[cell[order]]
+        seg_starts = starts[small]
+        block = max(1, chunk_elems // max(1, len(order)))
+        for b in range(0, n_boot, block):
+            width = min(block, n_boot - b)
+            picks = row_start + (rng.random((width, len(order))) * row_n).astype('int64')
+            reps[small, b:b + width] = (np.add.reduceat(sorted_values[picks], seg_starts, axis=1) / counts[small]).T
+    return reps
+
+def factor_cube(trades, factors=FACTORS, value='r_multiple', n_boot=1000, ci=0.95, min_trades=1, seed=0):
+    """
+    Win rate, expectancy and count for every combination of `factors` in one
+    grouped pass, with bootstrap confidence intervals per cell.
+
+    Args:
+        trades: one row per candidate with the factor columns and `value` (R)
+        factors: factor columns spanning the cube
+        n_boot: bootstrap replicates per cell (0 skips the intervals)
+        ci: confidence level of the intervals
+        min_trades: cells with fewer trades are dropped
+        seed: bootstrap RNG seed (reproducible reports)
+
+    Returns:
+        DataFrame: one row per occupied cell (factor columns, trades, wins,
+        win_rate %, expectancy_r, total_r and *_lo/*_hi bounds), best
+        expectancy first
+    """
+    factors = list(factors)
+    columns = factors + ['trades', 'wins', 'win_rate', 'win_rate_lo', 'win_rate_hi',
+                         'expectancy_r', 'expectancy_lo', 'expectancy_hi', 'total_r']
+    if trades is None or len(trades) == 0:
+        return pd.DataFrame(columns=columns)
+
+    r = trades[value].to_numpy(dtype='float64')
+    cell, labels = _cell_ids(trades, factors)
+    counts = np.bincount(cell)
+    wins = np.bincount(cell, weights=(r > 0).astype('float64'), minlength=len(counts))
+    total = np.bincount(cell, weights=r, minlength=len(counts))
+    win_rate = wins / counts
+    cube = pd.DataFrame(labels)
+    cube['trades'] = counts
+    cube['wins'] = wins.astype('int64')
+    cube['win_rate'] = win_rate * 100
+    cube['expectancy_r'] = total / counts
+    cube['total_r'] = total
+
+    if n_boot:
+        rng = np.random.default_rng(seed)
+        q = [(1 - ci) / 2, 1 - (1 - ci) / 2]
+        # Win rate: the resampled win count of a cell is Binomial(n, p)
+        win_reps = rng.binomial(counts[:, None], win_rate[:, None], (len(counts), n_boot)) / counts[:, None]
+        cube['win_rate_lo'], cube['win_rate_hi'] = np.quantile(win_reps, q, axis=1) * 100
+        cube['expectancy_lo'], cube['expectancy_hi'] = np.quantile(bootstrap_means(cell, r, n_boot, rng), q, axis=1)
+    else:
+        for column in ('win_rate_lo', 'win_rate_hi', 'expectancy_lo', 'expectancy_hi'):
+            cube[column] = np.nan
+
+    cube = cube[cube['trades'] >= min_trades]
+    return cube[columns].sort_values('expectancy_r', ascending=False, kind='stable').reset_index(drop=True)
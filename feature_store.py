@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from config import Config
+from candle_store import CandleStore, timeframe_to_ms
+from indicators import calculate_atr, calculate_adx
+from session_ranges import PDH_LOOKBACK, build_session_table
+from signal_kernel import htf_bias
+from run_registry import code_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Source digest of this module and every root module it imports (indicators,
+# session_ranges, signal_kernel, ...): editing a feature definition invalidates every file
+FEATURE_VERSION = code_version('feature_store')
+
+DEFAULT_PARAMS = {
+    'atr_period': 14,
+    'adx_period': 14,
+    'htf': Config.HTF_TIMEFRAME,
+    'bias_window': 100,
+    'bias_fast': 20,
+    'bias_slow': 50,
+    'session_lookback': PDH_LOOKBACK,
+}
+
+def compute_features(df, params=None):
+    """
+    Per-candle backtest features in one pass over the history: ATR, ADX,
+    live 4H EMA bias (+1/0/-1) and the session table (Asian/London/CBDR
+    high/low, PDH/PDL).
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    features = build_session_table(df, lookback=params['session_lookback'])
+    features['atr'] = calculate_atr(df, params['atr_period']).to_numpy()
+    features['adx'] = calculate_adx(df, params['adx_period']).to_numpy()
+    features['bias'] = htf_bias(df['timestamp'], df['close'], timeframe_to_ms(params['htf']),
+                                window=params['bias_window'], fast=params['bias_fast'],
+                                slow=params['bias_slow'])
+    return features
+
+class FeatureStore:
+    """
+    Persistent HTF/indicator features next to the candle store.
+
+    <root>/<SYMBOL>/<tf>/_features/<key>.parquet, where the key hashes the
+    feature parameters, the feature code (FEATURE_VERSION) and the exact
+    candle range (content digest), so a changed parameter, definition or
+    re-synced candle simply maps to a new file. A repeated backtest joins
+    the stored columns instead of recomputing them.
+    """
+    def __init__(self, store=None):
+        self.store = store or CandleStore()
+
+    def _dir(self, symbol, timeframe):
+        return os.path.join(self.store._partition_dir(symbol, timeframe), '_features')
+
+    @staticmethod
+    def key(df, params):
+        digest = hashlib.sha1()
+        digest.update(json.dumps({'version': FEATURE_VERSION, 'params': params}, sort_keys=True).encode())
+        for column in ('timestamp', 'high', 'low', 'close'):
+            values = df[column].to_numpy()
+            if column == 'timestamp':
+                values = values.astype('datetime64[ms]').astype('int64')
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()[:16]
+
+    def get(self, symbol, df, params=None, timeframe='5m'):
+        """Features aligned to df's rows (loaded if stored, else computed and persisted)."""
+        params = dict(DEFAULT_PARAMS, **(params or {}))
+        path = os.path.join(self._dir(symbol, timeframe), f"{self.key(df, params)}.parquet")
+        if os.path.exists(path):
+            try:
+                features = pd.read_parquet(path)
+                if len(features) == len(df):
+                    features.index = df.index
+                    return features
+            except Exception as e:
+                logger.warning(f"Feature file unreadable ({path}): {e}. Recomputing.")
+
+        features = compute_features(df, params)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            features.reset_index(drop=True).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Feature store persist failed for {symbol}: {e}")
+        return features
+
+    def clear(self, symbol, timeframe='5m'):
+        """Removes every stored feature file for symbol/timeframe."""
+        directory = self._dir(symbol, timeframe)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
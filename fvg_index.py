@@ -0,0 +1,96 @@
+import bisect
+import numpy as np
+
+# Candles the live scanner searches for draw-on-liquidity targets (df.iloc[-100:])
+TARGET_WINDOW = 100
+
+def first_touch_at_or_above(values, start, thresholds):
+    """
+    For each (start[k], thresholds[k]) the first index j >= start[k] with
+    values[j] >= thresholds[k], or len(values) if never. All queries are
+    answered together by binary lifting over a sparse max-table: O((n + q) log n).
+    """
+    values = np.asarray(values, dtype='float64')
+    n = len(values)
+    pos = np.asarray(start, dtype='int64').copy()
+    thresholds = np.asarray(thresholds, dtype='float64')
+    if n == 0 or len(pos) == 0:
+        return np.full(len(pos), n, dtype='int64')
+
+    # table[k][j] = max(values[j : j + 2**k])
+    table = [values]
+    while (1 << len(table)) <= n:
+        prev = table[-1]
+        half = 1 << (len(table) - 1)
+        table.append(np.maximum(prev[:-half], prev[half:]))
+
+    for k in range(len(table) - 1, -1, -1):
+        level = table[k]
+        can_jump = pos < len(level)
+        block_max = np.full(len(pos), np.inf)
+        block_max[can_jump] = level[pos[can_jump]]
+        pos = np.where(block_max < thresholds, pos + (1 << k), pos)
+    return np.minimum(pos, n)
+
+class FVGIndex:
+    """
+    Vectorized Fair Value Gap Index.
+
+    Bearish FVG at i: low[i-2] > high[i]. Zone [high[i], low[i-2]].
+        Filled once a later candle trades up to low[i-2]. LONG target = high[i].
+    Bullish FVG at i: high[i-2] < low[i]. Zone [high[i-2], low[i]].
+        Filled once a later candle trades down to high[i-2]. SHORT target = low[i].
+
+    Detection and fill tracking run over the whole frame in one NumPy pass.
+    Unfilled targets as of the last candle are kept price-sorted, so the live
+    nearest-gap query is a bisect. Backtests build one index over the full
+    history and pass as_of=idx (and window=TARGET_WINDOW to see only the gaps
+    the live scanner's slice would contain).
+    """
+    def __init__(self, high, low):
+        high = np.asarray(high, dtype='float64')
+        low = np.asarray(low, dtype='float64')
+        self.n = len(high)
+        idx = np.arange(2, self.n)
+
+        bear = idx[low[idx - 2] > high[idx]]
+        self.bear_index = bear
+        self.bear_level = high[bear]
+        self.bear_top = low[bear - 2]
+        self.bear_filled_at = first_touch_at_or_above(high, bear + 1, self.bear_top)
+
+        bull = idx[high[idx - 2] < low[idx]]
+        self.bull_index = bull
+        self.bull_level = low[bull]
+        self.bull_bottom = high[bull - 2]
+        # "low <= bottom" is "-low >= -bottom"
+        self.bull_filled_at = first_touch_at_or_above(-low, bull + 1, -self.bull_bottom)
+
+        self._bear_sorted = np.sort(self.bear_level[self.bear_filled_at >= self.n]).tolist()
+        self._bull_sorted = np.sort(self.bull_level[self.bull_filled_at >= self.n]).tolist()
+
+    @staticmethod
+    def _formed(index, as_of, window):
+        """Gaps formed by candle as_of whose three candles lie in the last `window` candles."""
+        formed = index <= as_of
+        if window is not None:
+            formed &= index - 2 > as_of - window
+        return formed
+
+    def nearest_above(self, price, as_of=None, window=None):
+        """Lowest unfilled bearish-FVG target strictly above price."""
+        if as_of is None:
+            i = bisect.bisect_right(self._bear_sorted, price)
+            return self._bear_sorted[i] if i < len(self._bear_sorted) else None
+        live = (self._formed(self.bear_index, as_of, window) & (self.bear_filled_at > as_of)
+                & (self.bear_level > price))
+        return float(self.bear_level[live].min()) if live.any() else None
+
+    def nearest_below(self, price, as_of=None, window=None):
+        """Highest unfilled bullish-FVG target strictly below price."""
+        if as_of is None:
+            i = bisect.bisect_left(self._bull_sorted, price)
+            return self._bull_sorted[i - 1] if i > 0 else None
+        live = (self._formed(self.bull_index, as_of, window) & (self.bull_filled_at > as_of)
+                & (self.bull_level < price))
+        return float(self.bull_level[live].max()) if live.any() else None
@@ -0,0 +1,141 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# --- Vectorized (whole-frame) versions: one pass for backtests ---------------
+
+def true_range(df):
+    high_low = df['high'] - df['low']
+    high_close = np.abs(df['high'] - df['close'].shift())
+    low_close = np.abs(df['low'] - df['close'].shift())
+    return pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+
+def calculate_atr(df, period=14):
+    """ATR as used across the repo: simple rolling mean of True Range."""
+    return true_range(df).rolling(period).mean()
+
+def calculate_adx(df, period=14):
+    """Wilder-smoothed ADX (ewm alpha=1/period), as in ScannerBacktest."""
+    plus_dm = df['high'].diff()
+    minus_dm = -df['low'].diff()
+    plus_dm[plus_dm < 0] = 0
+    minus_dm[minus_dm < 0] = 0
+
+    atr = true_range(df).ewm(alpha=1/period, adjust=False).mean()
+    plus_di = 100 * (plus_dm.ewm(alpha=1/period, adjust=False).mean() / atr)
+    minus_di = 100 * (minus_dm.ewm(alpha=1/period, adjust=False).mean() / atr)
+
+    dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
+    return dx.ewm(alpha=1/period, adjust=False).mean()
+
+# --- Streaming versions: O(1) per closed candle, serializable ------------------
+
+class ATR:
+    """Rolling-mean ATR updated one candle at a time (matches calculate_atr)."""
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+
+    def _tr(self, high, low):
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    @property
+    def value(self):
+        return self.total / self.period if len(self.window) == self.period else math.nan
+
+    def update(self, high, low, close):
+        tr = self._tr(high, low)
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(tr)
+        self.total += tr
+        self.prev_close = close
+        return self.value
+
+    def peek(self, high, low, close):
+        """Value including a provisional (still forming) candle, without committing it."""
+        if len(self.window) < self.period - 1:
+            return math.nan
+        tr = self._tr(high, low)
+        dropped = self.window[0] if len(self.window) == self.period else 0.0
+        return (self.total - dropped + tr) / self.period
+
+    def to_dict(self):
+        return {'period': self.period, 'prev_close': self.prev_close, 'window': list(self.window)}
+
+    @classmethod
+    def from_dict(cls, state):
+        atr = cls(state['period'])
+        atr.prev_close = state['prev_close']
+        atr.window.extend(state['window'])
+        atr.total = float(sum(atr.window))
+        return atr
+
+class EMA:
+    """
+    pandas ewm(span=...).mean() (adjust=True) updated one value at a time.
+
+    window: the value covers only the last `window` values, like ewm over a
+    fixed-length tail (get_4h_bias reads a 100-bar view); None = all history.
+    peek() adds a provisional newest value (the forming bar) on top.
+    """
+    def __init__(self, span, window=None):
+        self.span = span
+        self.window = window
+        self.decay = 1 - 2 / (span + 1)
+        self.values = deque(maxlen=window)
+        self.num = 0.0
+        self.den = 0.0
+
+    @property
+    def value(self):
+        return self.num / self.den if self.den else math.nan
+
+    def update(self, x):
+        if self.window is not None and len(self.values) == self.window:
+            # Drop the oldest term: it carries weight decay**(window - 1) before this step
+            dropped_weight = self.decay ** (self.window - 1)
+            self.num -= dropped_weight * self.values[0]
+            self.den -= dropped_weight
+        self.num = x + self.decay * self.num
+        self.den = 1 + self.decay * self.den
+        if self.window is not None:
+            self.values.append(x)
+        return self.value
+
+    def peek(self, x):
+        """Value including a provisional (still forming) value, without committing it."""
+        num, den = self.num, self.den
+        if self.window is not None and len(self.values) == self.window:
+            dropped_weight = self.decay ** (self.window - 1)
+            num -= dropped_weight * self.values[0]
+            den -= dropped_weight
+        return (x + self.decay * num) / (1 + self.decay * den)
+
+    def to_dict(self):
+        return {'span': self.span, 'window': self.window, 'num': self.num, 'den': self.den,
+                'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        ema = cls(state['span'], state.get('window'))
+        ema.num, ema.den = state['num'], state['den']
+        ema.values.extend(state.get('values', []))
+        return ema
+
+def warm_start(indicator, df):
+    """Replays stored history through a streaming indicator (O(n) once)."""
+    if isinstance(indicator, EMA):
+        for x in df['close'].to_numpy(dtype='float64'):
+            indicator.update(x)
+        return indicator
+    for h, l, c in zip(df['high'].to_numpy(dtype='float64'),
+                       df['low'].to_numpy(dtype='float64'),
+                       df['close'].to_numpy(dtype='float64')):
+        indicator.update(h, l, c)
+    return indicator
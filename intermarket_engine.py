@@ -1,5 +1,10 @@
+import os
+import json
+import time
+import threading
 import yfinance as yf
 import pandas as pd
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,6 +16,11 @@ class IntermarketEngine:
     SMT Divergence: If indices sweep but BTC doesn't, or vice-versa, reveals institutional intent.
     Bond Market: Rising yields = risk-off (bearish BTC), falling yields = risk-on (bullish BTC).
     """
+    BAR_SECONDS = 300
+    RETRY_SECONDS = 30  # back-off before missing tickers are fetched again inside a bar
+    _cache = {}  # {'bar': bar_key, 'context': {...}, 'retry_at': epoch} shared by all instances in-process
+    _lock = threading.Lock()  # One check-and-refresh at a time across scan threads
+
     def __init__(self):
         self.symbols = {
             "NQ": "^IXIC",      # NASDAQ Composite
@@ -19,39 +29,103 @@ class IntermarketEngine:
             "TNX": "^TNX"       # 10-Year Treasury Yield (Bond Market Sponsorship)
         }
 
-    def get_market_context(self):
-        context = {}
+    def _bar_key(self):
+        """Open time (epoch seconds) of the current 5m bar - the cache key."""
+        return int(time.time() // self.BAR_SECONDS) * self.BAR_SECONDS
+
+    def _read_volume_cache(self, bar_key):
         try:
-            for key, ticker in self.symbols.items():
-                # Fetch recent 5m data
-                data = yf.download(ticker, period="1d", interval="5m", progress=False)
-                
-                if data is not None and len(data) > 2:
-                    # Handle potential MultiIndex columns from yfinance
-                    if isinstance(data.columns, pd.MultiIndex):
-                        data.columns = data.columns.get_level_values(0)
-                        
-                    current = data.iloc[-1]
-                    prev = data.iloc[-2]
-                    
-                    # Ensure we have scalar values
-                    current_close = float(current['Close'])
-                    prev_close = float(prev['Close'])
-                    
-                    change = (current_close - prev_close) / prev_close * 100
-                    trend = "UP" if change > 0 else "DOWN"
-                    
-                    context[key] = {
-                        "price": current_close,
-                        "change_5m": round(change, 3),
-                        "trend": trend,
-                        "high_1h": float(data['High'].iloc[-12:].max()),
-                        "low_1h": float(data['Low'].iloc[-12:].min())
-                    }
-            return context
+            if os.path.exists(Config.INTERMARKET_CACHE_PATH):
+                with open(Config.INTERMARKET_CACHE_PATH, 'r') as f:
+                    cached = json.load(f)
+                if cached.get('bar') == bar_key:
+                    return cached
         except Exception as e:
-            logger.error(f"Error fetching intermarket data: {e}")
+            logger.warning(f"Intermarket volume cache unreadable: {e}")
+        return None
+
+    def _write_volume_cache(self, entry):
+        try:
+            os.makedirs(os.path.dirname(Config.INTERMARKET_CACHE_PATH), exist_ok=True)
+            tmp_path = Config.INTERMARKET_CACHE_PATH + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, Config.INTERMARKET_CACHE_PATH)
+        except Exception as e:
+            logger.warning(f"Intermarket volume cache write failed: {e}")
+
+    def _summarize(self, data):
+        """Builds one ticker's context entry from its 5m OHLC frame."""
+        data = data.dropna(subset=['Close'])
+        if len(data) <= 2:
             return None
+
+        current_close = float(data['Close'].iloc[-1])
+        prev_close = float(data['Close'].iloc[-2])
+        
+        change = (current_close - prev_close) / prev_close * 100
+        trend = "UP" if change > 0 else "DOWN"
+        
+        return {
+            "price": current_close,
+            "change_5m": round(change, 3),
+            "trend": trend,
+            "high_1h": float(data['High'].iloc[-12:].max()),
+            "low_1h": float(data['Low'].iloc[-12:].min())
+        }
+
+    def _fetch(self, keys):
+        """One batched yfinance download for `keys`; returns the entries that came back."""
+        try:
+            batch = yf.download([self.symbols[key] for key in keys], period="1d", interval="5m",
+                                group_by='ticker', progress=False, threads=True)
+        except Exception as e:
+            logger.error(f"Error fetching intermarket data: {e}")
+            return {}
+
+        if batch is None or batch.empty:
+            logger.error("Intermarket batch download returned no data")
+            return {}
+
+        context = {}
+        for key in keys:
+            ticker = self.symbols[key]
+            try:
+                entry = self._summarize(batch[ticker])
+                if entry:
+                    context[key] = entry
+            except Exception as e:
+                logger.warning(f"Intermarket data unavailable for {key} ({ticker}): {e}")
+        return context
+
+    def get_market_context(self):
+        """
+        Intermarket snapshot for NQ, ES, DXY and TNX.
+
+        One batched yfinance download per 5m bar. Repeat calls inside the same
+        bar are served from an in-process cache (then the on-volume cache for
+        fresh containers). A failing ticker is dropped on its own instead of
+        nulling the whole context; the partial context is cached for the bar
+        and only the missing tickers are retried, after RETRY_SECONDS.
+        Concurrent scan threads wait on one lock, so a bar downloads once.
+        """
+        with IntermarketEngine._lock:
+            bar_key = self._bar_key()
+            cached = IntermarketEngine._cache
+            if cached.get('bar') != bar_key:
+                cached = self._read_volume_cache(bar_key) or {'bar': bar_key, 'context': {}, 'retry_at': 0}
+                IntermarketEngine._cache = cached
+
+            context = cached['context']
+            missing = [key for key in self.symbols if key not in context]
+            if missing and time.time() >= cached.get('retry_at', 0):
+                context = {**context, **self._fetch(missing)}
+                still_missing = len(context) < len(self.symbols)
+                cached = {'bar': bar_key, 'context': context,
+                          'retry_at': time.time() + self.RETRY_SECONDS if still_missing else 0}
+                IntermarketEngine._cache = cached
+                self._write_volume_cache(cached)
+            return context or None
     
     def calculate_cross_asset_divergence(self, btc_direction, context):
         """
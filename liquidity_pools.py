@@ -0,0 +1,128 @@
+import bisect
+from collections import deque
+import numpy as np
+from fvg_index import first_touch_at_or_above
+from session_clock import _as_ms
+
+def fractal_pivots(high, low, window=2):
+    """
+    Fractal swing points (SMCScanner.detect_fractals): candle i is a swing
+    high when its high is the max of the 2*window+1 candles centred on it,
+    a swing low when its low is the min. Edges (incomplete windows) are False.
+    """
+    high = np.asarray(high, dtype='float64')
+    low = np.asarray(low, dtype='float64')
+    is_high = np.zeros(len(high), dtype=bool)
+    is_low = np.zeros(len(low), dtype=bool)
+    span = 2 * window + 1
+    if len(high) >= span:
+        windows_high = np.lib.stride_tricks.sliding_window_view(high, span)
+        windows_low = np.lib.stride_tricks.sliding_window_view(low, span)
+        is_high[window:len(high) - window] = windows_high.max(axis=1) == high[window:len(high) - window]
+        is_low[window:len(low) - window] = windows_low.min(axis=1) == low[window:len(low) - window]
+    return is_high, is_low
+
+class LiquidityPools:
+    """
+    Swing-pivot liquidity pools over a whole frame (backtests), like FVGIndex.
+
+    Buy-side pool: swing high, swept once a later candle's high trades above it.
+    Sell-side pool: swing low, swept once a later candle's low trades below it.
+    A pivot is only known `window` candles after it prints (confirmation), so
+    as_of queries never see a pool before a live scanner could.
+    """
+    def __init__(self, high, low, window=2):
+        high = np.asarray(high, dtype='float64')
+        low = np.asarray(low, dtype='float64')
+        self.n = len(high)
+        is_high, is_low = fractal_pivots(high, low, window)
+
+        self.high_index = np.flatnonzero(is_high)
+        self.high_level = high[self.high_index]
+        self.high_known_at = self.high_index + window
+        # "high > level" is the first touch at or above the next float up
+        self.high_swept_at = first_touch_at_or_above(
+            high, self.high_known_at + 1, np.nextafter(self.high_level, np.inf))
+
+        self.low_index = np.flatnonzero(is_low)
+        self.low_level = low[self.low_index]
+        self.low_known_at = self.low_index + window
+        self.low_swept_at = first_touch_at_or_above(
+            -low, self.low_known_at + 1, np.nextafter(-self.low_level, np.inf))
+
+        last = self.n - 1
+        self._highs = np.sort(self.high_level[(self.high_known_at <= last) & (self.high_swept_at > last)]).tolist()
+        self._lows = np.sort(self.low_level[(self.low_known_at <= last) & (self.low_swept_at > last)]).tolist()
+
+    def nearest_above(self, price, as_of=None):
+        """Lowest unswept swing high strictly above price (buy-side liquidity)."""
+        if as_of is None:
+            i = bisect.bisect_right(self._highs, price)
+            return self._highs[i] if i < len(self._highs) else None
+        live = (self.high_known_at <= as_of) & (self.high_swept_at > as_of) & (self.high_level > price)
+        return float(self.high_level[live].min()) if live.any() else None
+
+    def nearest_below(self, price, as_of=None):
+        """Highest unswept swing low strictly below price (sell-side liquidity)."""
+        if as_of is None:
+            i = bisect.bisect_left(self._lows, price)
+            return self._lows[i - 1] if i > 0 else None
+        live = (self.low_known_at <= as_of) & (self.low_swept_at > as_of) & (self.low_level < price)
+        return float(self.low_level[live].max()) if live.any() else None
+
+class SwingPoolTracker:
+    """
+    Live, incremental LiquidityPools for one symbol/timeframe.
+
+    update() takes one closed candle: it sweeps every pool the candle traded
+    through (a prefix of the price-sorted list), then confirms the pivot
+    `window` candles back. Unswept levels stay price-sorted, so the
+    nearest-pool queries are a bisect.
+    """
+    def __init__(self, window=2):
+        self.window = window
+        self.last_ts = None
+        self._recent = deque(maxlen=2 * window + 1)  # (ts, high, low)
+        self.highs = []  # unswept swing highs, ascending
+        self.lows = []   # unswept swing lows, ascending
+
+    def update(self, ts_ms, high, low):
+        if self.last_ts is not None and ts_ms <= self.last_ts:
+            return
+        self.last_ts = ts_ms
+
+        # Sweeps: highs below this high / lows above this low are taken out
+        del self.highs[:bisect.bisect_left(self.highs, high)]
+        del self.lows[bisect.bisect_right(self.lows, low):]
+
+        self._recent.append((ts_ms, high, low))
+        if len(self._recent) == self._recent.maxlen:
+            _, mid_high, mid_low = self._recent[self.window]
+            if mid_high == max(h for _, h, _ in self._recent):
+                bisect.insort(self.highs, mid_high)
+            if mid_low == min(l for _, _, l in self._recent):
+                bisect.insort(self.lows, mid_low)
+
+    def update_frame(self, df):
+        """Folds in every closed row after the last seen candle (the last row is treated as forming)."""
+        ts_ms = _as_ms(df['timestamp'])
+        if len(ts_ms) < 2:
+            return
+        if self.last_ts is not None and (ts_ms[-2] < self.last_ts or ts_ms[0] > self.last_ts):
+            # Replay rewind or history gap: rebuild from this frame
+            self.__init__(self.window)
+        start = 0 if self.last_ts is None else int(np.searchsorted(ts_ms, self.last_ts, side='right'))
+        highs = df['high'].to_numpy(dtype='float64')
+        lows = df['low'].to_numpy(dtype='float64')
+        for i in range(start, len(ts_ms) - 1):
+            self.update(int(ts_ms[i]), highs[i], lows[i])
+
+    def nearest_above(self, price):
+        """Lowest unswept swing high strictly above price (buy-side liquidity)."""
+        i = bisect.bisect_right(self.highs, price)
+        return self.highs[i] if i < len(self.highs) else None
+
+    def nearest_below(self, price):
+        """Highest unswept swing low strictly below price (sell-side liquidity)."""
+        i = bisect.bisect_left(self.lows, price)
+        return self.lows[i - 1] if i > 0 else None
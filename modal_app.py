@@ -8,6 +8,9 @@ from telegram_notifier import send_alert
 from tradelocker_client import TradeLockerClient
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scan_concurrency import TradeBudget
 from fastapi import Request, HTTPException
 import modal
 
@@ -19,6 +22,17 @@ image = (
     .add_local_python_source("config")
     .add_local_python_source("database")
     .add_local_python_source("smc_scanner")
+    .add_local_python_source("candle_cache")
+    .add_local_python_source("candle_store")
+    .add_local_python_source("scan_concurrency")
+    .add_local_python_source("fvg_index")
+    .add_local_python_source("indicators")
+    .add_local_python_source("session_ranges")
+    .add_local_python_source("signal_kernel")
+    .add_local_python_source("order_book")
+    .add_local_python_source("liquidity_pools")
+    .add_local_python_source("session_clock")
+    .add_local_python_source("universe_scanner")
     .add_local_python_source("ai_validator")
     .add_local_python_source("sentiment_engine")
     .add_local_python_source("telegram_notifier")
@@ -141,12 +155,15 @@ def run_scanner_job():
     scanner = SMCScanner()
     sentiment_engine = SentimentEngine()
     
-    # 4. Risk Check: Daily Limit
-    if int(trades_today) >= Config.DAILY_TRADE_LIMIT:
+    # 4. Risk Check: Daily Limit (shared across concurrent symbol scans)
+    budget = TradeBudget(int(trades_today), Config.DAILY_TRADE_LIMIT)
+    if budget.exhausted():
         print(f"🛑 Daily Trade Limit Reached ({trades_today}/{Config.DAILY_TRADE_LIMIT}). Skipping.")
         return
     
-    for symbol in Config.SYMBOLS:
+    chart_lock = threading.Lock()  # matplotlib is not thread-safe
+    
+    def scan_symbol(symbol):
         print(f"🔎 Scanning {symbol}...")
         result = scanner.scan_pattern(symbol, cached_context=cached_context)
         
@@ -167,7 +184,8 @@ def run_scanner_job():
             # 6. Automated Visualization (The "Glass Eye")
             from visualizer import generate_ict_chart
             chart_path = f"/tmp/{symbol.replace('/', '_')}_setup.png"
-            generate_ict_chart(df, setup, output_path=chart_path)
+            with chart_lock:
+                generate_ict_chart(df, setup, output_path=chart_path)
             
             # 7. AI Validation with Context (Vision Informed)
             ai_result = validate_setup(setup, market_data, whale_flow, image_path=chart_path)
@@ -183,6 +201,10 @@ def run_scanner_job():
             
             # 7. Alert if High Probability
             if ai_result['score'] >= Config.AI_THRESHOLD:
+                if not budget.try_acquire():
+                    print(f"🛑 Daily Trade Limit Reached. Alert for {symbol} suppressed.")
+                    return
+                
                 # Calculate Position Size (Target 0.75% risk, capped at 70% of equity)
                 risk_amt = total_equity * Config.RISK_PER_TRADE
                 distance = abs(setup['entry'] - setup['stop_loss'])
@@ -228,6 +250,28 @@ def run_scanner_job():
                 print("📨 Alert Sent to Telegram with One-Tap Buttons.")
         else:
             print(f"No setup on {symbol}.")
+    
+    # 5. Symbol Set: fixed SYMBOLS, or Universe Mode tier 1 (cheap gates across the top-N pairs)
+    if Config.UNIVERSE_MODE:
+        from universe_scanner import UniverseScanner
+        symbols = UniverseScanner(scanner).prefilter(cached_context=cached_context)
+        print(f"🌐 Universe Mode: {len(symbols)} symbols passed tier 1 {symbols}")
+    else:
+        symbols = Config.SYMBOLS
+        # Depth books refresh in the background so sweep validation reads them locally
+        scanner.depth.start(symbols)
+    
+    # 6. Concurrent Scan: bounded pool, exchange requests spaced by the shared throttle
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(Config.SCAN_WORKERS, len(symbols)))) as pool:
+            futures = {pool.submit(scan_symbol, symbol): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"⚠️ Scan failed for {futures[future]}: {e}")
+    finally:
+        scanner.depth.stop()
 
 @app.function(
     image=image,
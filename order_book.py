@@ -0,0 +1,203 @@
+import os
+import json
+import bisect
+import threading
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LocalOrderBook:
+    """
+    Locally maintained L2 book for one symbol.
+
+    Levels live in a dict per side (O(1) snapshot/diff apply); a sorted price
+    array with prefix sums is rebuilt lazily on the first query after a
+    change, so "volume within ±pct of a level" is two searchsorted calls.
+    Writers (feed thread) and readers (scan threads) share a per-book lock,
+    so a query never sorts a half-applied book or caches stale arrays.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.timestamp = None
+        self._levels = {'bids': {}, 'asks': {}}
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def apply_snapshot(self, bids, asks, timestamp=None):
+        levels = {
+            'bids': {float(price): float(amount) for price, amount, *_ in bids},
+            'asks': {float(price): float(amount) for price, amount, *_ in asks},
+        }
+        with self._lock:
+            self._levels = levels
+            self._arrays = {}
+            self.timestamp = timestamp
+
+    def apply_update(self, bids, asks, timestamp=None):
+        """Diff message: amount 0 removes the level."""
+        with self._lock:
+            for side, changes in (('bids', bids), ('asks', asks)):
+                levels = self._levels[side]
+                for price, amount, *_ in changes:
+                    if amount:
+                        levels[float(price)] = float(amount)
+                    else:
+                        levels.pop(float(price), None)
+                if changes:
+                    self._arrays.pop(side, None)
+            self.timestamp = timestamp
+
+    def _sorted(self, side):
+        """(prices, cumulative) for one side; the returned arrays are never mutated afterwards."""
+        with self._lock:
+            if side not in self._arrays:
+                levels = self._levels[side]
+                prices = np.fromiter(levels.keys(), dtype='float64', count=len(levels))
+                amounts = np.fromiter(levels.values(), dtype='float64', count=len(levels))
+                order = np.argsort(prices)
+                prices = prices[order]
+                cumulative = np.concatenate([[0.0], np.cumsum(amounts[order])])
+                self._arrays[side] = (prices, cumulative)
+            return self._arrays[side]
+
+    def volume_near(self, side, level, pct=0.005):
+        """Total amount on `side` with abs(price - level) / level < pct."""
+        prices, cumulative = self._sorted(side)
+        inside = lambda price: abs(price - level) / level < pct
+        # Slightly wide range, then trim the ends with the exact test (float edges)
+        lo = int(np.searchsorted(prices, level * (1 - pct) * (1 - 1e-12), side='left'))
+        hi = int(np.searchsorted(prices, level * (1 + pct) * (1 + 1e-12), side='right'))
+        while lo < hi and not inside(prices[lo]):
+            lo += 1
+        while hi > lo and not inside(prices[hi - 1]):
+            hi -= 1
+        return float(cumulative[hi] - cumulative[lo])
+
+    def top(self, side, limit=None):
+        """ccxt-style [[price, amount], ...] (bids descending, asks ascending)."""
+        prices, cumulative = self._sorted(side)
+        amounts = np.diff(cumulative)
+        if side == 'bids':
+            prices, amounts = prices[::-1], amounts[::-1]
+        if limit:
+            prices, amounts = prices[:limit], amounts[:limit]
+        return [[float(p), float(a)] for p, a in zip(prices, amounts)]
+
+    def age_ms(self, now_ms):
+        return None if self.timestamp is None else now_ms - self.timestamp
+
+class RecordedDepthStream:
+    """
+    Replayable depth stream from <root>/<SYMBOL>/orderbook.jsonl.
+
+    Each line is a snapshot {"timestamp", "bids", "asks"} or a diff with
+    "type": "update". apply_until() brings a book to any clock time by
+    replaying from the last snapshot at or before it, so replays can jump
+    backwards as well as forwards.
+    """
+    def __init__(self, path):
+        self.path = path
+        messages = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                messages = [json.loads(line) for line in f if line.strip()]
+        messages.sort(key=lambda m: m['timestamp'])
+        self.messages = messages
+        self.stamps = [m['timestamp'] for m in messages]
+        self.snapshots = [i for i, m in enumerate(messages) if m.get('type', 'snapshot') == 'snapshot']
+        self._applied = {}  # id(book) -> index of the last applied message
+
+    def apply_until(self, book, ts_ms):
+        end = bisect.bisect_right(self.stamps, ts_ms)
+        applied = self._applied.get(id(book))
+        if applied is None or applied >= end:
+            # Cold or rewound: restart from the last snapshot before the clock
+            k = bisect.bisect_right(self.snapshots, end - 1) - 1
+            if k < 0:
+                return False
+            start = self.snapshots[k]
+        else:
+            start = applied + 1
+        for i in range(start, end):
+            message = self.messages[i]
+            if message.get('type', 'snapshot') == 'snapshot':
+                book.apply_snapshot(message['bids'], message['asks'], message['timestamp'])
+            else:
+                book.apply_update(message.get('bids', []), message.get('asks', []), message['timestamp'])
+        if end:
+            self._applied[id(book)] = end - 1
+        return book.timestamp is not None
+
+class DepthFeed:
+    """
+    Keeps a LocalOrderBook per symbol current so depth checks never wait on
+    a REST round-trip at the moment a setup fires.
+
+    Live: start() runs a daemon thread that refreshes every symbol's book
+    (through the scanner's shared request throttle). Replay: when the
+    exchange offers depth_stream() (ReplayExchange), books are advanced from
+    the recorded stream to the exchange clock. A book older than max_age is
+    refreshed synchronously as a fallback.
+    """
+    def __init__(self, exchange, levels=None, max_age_ms=None):
+        self.exchange = exchange
+        self.levels = levels or Config.DEPTH_LEVELS
+        self.max_age_ms = max_age_ms if max_age_ms is not None else Config.DEPTH_MAX_AGE_SECONDS * 1000
+        self.books = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _book(self, symbol):
+        with self._lock:
+            if symbol not in self.books:
+                self.books[symbol] = LocalOrderBook(symbol)
+            return self.books[symbol]
+
+    def refresh(self, symbol):
+        """One REST snapshot into the local book."""
+        snapshot = self.exchange.fetch_order_book(symbol, limit=self.levels)
+        book = self._book(symbol)
+        book.apply_snapshot(snapshot['bids'], snapshot['asks'],
+                            snapshot.get('timestamp') or self.exchange.milliseconds())
+        return book
+
+    def book(self, symbol):
+        """Current local book for symbol (recorded stream, fresh stream book, or REST fallback)."""
+        book = self._book(symbol)
+        if hasattr(self.exchange, 'depth_stream'):
+            if symbol not in self._streams:
+                self._streams[symbol] = self.exchange.depth_stream(symbol)
+            if not self._streams[symbol].apply_until(book, self.exchange.milliseconds()):
+                raise Exception(f"No recorded order book for {symbol} at {self.exchange.milliseconds()}")
+            return book
+
+        age = book.age_ms(self.exchange.milliseconds())
+        if age is None or age > self.max_age_ms:
+            return self.refresh(symbol)
+        return book
+
+    def start(self, symbols, interval_s=None):
+        """Background refresh loop (daemon thread) for the given symbols."""
+        interval_s = interval_s if interval_s is not None else Config.DEPTH_REFRESH_SECONDS
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                for symbol in symbols:
+                    try:
+                        self.refresh(symbol)
+                    except Exception as e:
+                        logger.warning(f"Depth refresh failed for {symbol}: {e}")
+                self._stop.wait(interval_s)
+
+        self._thread = threading.Thread(target=run, name="depth-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
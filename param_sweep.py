@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from candle_store import CandleArrays
+from comparative_backtest import ComparativeBacktest, model_features, simulate_model
+
+# Config knobs the sweep understands, mapped onto run_model params
+CONFIG_KNOBS = {
+    'MIN_SMT_STRENGTH': 'min_smt',
+    'MAX_PRICE_QUARTILE': 'q_max',
+    'STOP_LOSS_ATR_MULTIPLIER': 'stop_atr_mult',
+    'TP1_R_MULTIPLE': 'tp1_r',
+    'TP2_R_MULTIPLE': 'tp2_r',
+}
+
+BASELINE = {
+    'killzones': list(range(12, 20)),
+    'quartile_range': (0.0, 0.45),
+    'tp_multiples': (1.5, 3.0),
+    'stop_atr_mult': 2.0,
+}
+
+def expand_grid(grid, base=None):
+    """
+    Cartesian product of a parameter grid into run_model param dicts.
+
+    Keys are run_model params (killzones, quartile_range, tp_multiples,
+    stop_atr_mult, min_smt) or the Config knob names in CONFIG_KNOBS; each
+    value is a list of candidates. Unlisted params come from `base`.
+    """
+    base = dict(BASELINE if base is None else base)
+    keys = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(base)
+        for key, value in zip(keys, values):
+            name = CONFIG_KNOBS.get(key, key)
+            if name == 'q_max':
+                params['quartile_range'] = (params['quartile_range'][0], value)
+            elif name == 'tp1_r':
+                params['tp_multiples'] = (value, params['tp_multiples'][1])
+            elif name == 'tp2_r':
+                params['tp_multiples'] = (params['tp_multiples'][0], value)
+            else:
+                params[name] = value
+        combos.append(params)
+    return combos
+
+def hours_label(hours):
+    """Compact label for a killzone hour list, e.g. [0..4, 12..19] -> '0-4,12-19'."""
+    hours = sorted(set(hours))
+    spans = []
+    for hour in hours:
+        if spans and hour == spans[-1][1] + 1:
+            spans[-1][1] = hour
+        else:
+            spans.append([hour, hour])
+    return ','.join(f"{a}-{b}" if a != b else f"{a}" for a, b in spans)
+
+def params_row(params):
+    """Flat, printable view of one params dict (sweep/walk-forward table columns)."""
+    return {
+        'killzones': hours_label(params['killzones']),
+        'q_max': params['quartile_range'][1],
+        'tp1_r': params['tp_multiples'][0],
+        'tp2_r': params['tp_multiples'][1],
+        'stop_atr_mult': params.get('stop_atr_mult', 2.0),
+        'min_smt': params.get('min_smt'),
+    }
+
+def summarize(result):
+    """Ranking metrics for one simulate_model result (all in R)."""
+    r = np.asarray(result['r_multiple'], dtype='float64')
+    if not len(r):
+        return {'trades': 0, 'win_rate': 0.0, 'total_r': 0.0, 'expectancy_r': 0.0,
+                'profit_factor': 0.0, 'max_drawdown_r': 0.0}
+    equity = np.cumsum(r)
+    gains, losses = r[r > 0].sum(), -r[r < 0].sum()
+    return {
+        'trades': int(len(r)),
+        'win_rate': float((r > 0).mean() * 100),
+        'total_r': float(r.sum()),
+        'expectancy_r': float(r.mean()),
+        'profit_factor': float(gains / losses) if losses else float('inf'),
+        'max_drawdown_r': float((np.maximum.accumulate(np.r_[0.0, equity]) - np.r_[0.0, equity]).max()),
+    }
+
+# --- Worker side: features are memory-mapped once per process --------------------
+
+_FEATURES = None
+
+def _init_worker(feature_dir, mapped=None):
+    global _FEATURES
+    _FEATURES = {
+        name[:-4]: np.load(os.path.join(feature_dir, name), mmap_mode='r')
+        for name in os.listdir(feature_dir) if name.endswith('.npy')
+    }
+    # Candle columns come straight from the candle store's exported generation
+    for name, (source, rows) in (mapped or {}).items():
+        _FEATURES[name] = CandleArrays.map_column(source, name, rows)
+
+def _run_config(params):
+    return summarize(simulate_model(_FEATURES, params))
+
+def _run_trades(params):
+    result = simulate_model(_FEATURES, params)
+    return {'entry_idx': result['entry_idx'], 'direction': result['direction'],
+            'r_multiple': result['r_multiple']}
+
+class ParameterSweep:
+    """
+    Process-parallel parameter sweep over ComparativeBacktest models.
+
+    The parameter-independent work (ATR, 4H bias, session table) is done
+    once and written as .npy columns; the candles themselves are the candle
+    store's exported .npy files (CandleStore.open_arrays). Every worker maps
+    the same files read-only (one copy in the page cache, nothing pickled
+    per task) and only runs the signal kernel + exit engine for its
+    configurations.
+    """
+    def __init__(self, runner=None, workers=None):
+        self.runner = runner or ComparativeBacktest()
+        self.workers = workers or Config.SWEEP_WORKERS or os.cpu_count()
+        self.candles = None  # Store-mapped candles behind the last prepare()
+
+    def _write_features(self, features):
+        feature_dir = tempfile.mkdtemp(prefix='sweep_features_')
+        for name, values in features.items():
+            np.save(os.path.join(feature_dir, f"{name}.npy"), np.ascontiguousarray(values))
+        return feature_dir
+
+    def _store_candles(self, df):
+        """The store's mapped candles for exactly df's rows, or None (df not from the store)."""
+        ts_ms = df['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+        if not len(ts_ms):
+            return None
+        candles = self.runner.store.load_arrays(self.runner.symbol, '5m', int(ts_ms[0]), int(ts_ms[-1]) + 1,
+                                                sync=False)
+        if candles.source is None or not np.array_equal(candles.timestamp, ts_ms):
+            return None
+        return candles
+
+    def prepare(self, df=None, smt=None):
+        """Parameter-independent features for df (default: the runner's data)."""
+        df = self.runner.fetch_data() if df is None else df
+        self.candles = self._store_candles(df)
+        features = model_features(df, self.runner.feature_store.get(self.runner.symbol, df), self.candles)
+        if smt is not None:
+            features['smt'] = np.asarray(smt, dtype='float64')
+        return features
+
+    def map(self, task, combos, features):
+        """Runs task(params) for every combination on the worker pool (shared .npy features)."""
+        candles = self.candles
+        mapped = {} if candles is None else {
+            name: (candles.source, len(candles))
+            for name in ('timestamp', 'high', 'low', 'close')
+            if features.get(name) is getattr(candles, name)
+        }
+        feature_dir = self._write_features({name: values for name, values in features.items() if name not in mapped})
+        try:
+            if self.workers > 1 and len(combos) > 1:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(feature_dir, mapped)) as pool:
+                    chunksize = max(1, len(combos) // (self.workers * 4))
+                    return list(pool.map(task, combos, chunksize=chunksize))
+            _init_worker(feature_dir, mapped)
+            return [task(params) for params in combos]
+        finally:
+            shutil.rmtree(feature_dir, ignore_errors=True)
+
+    def run(self, grid, base=None, rank_by='total_r', smt=None, df=None):
+        """
+        Runs every combination of `grid` and returns one ranked DataFrame.
+
+        Args:
+            grid: {param or Config knob: [values, ...]} (see expand_grid)
+            base: params for keys not in the grid (default BASELINE)
+            rank_by: metric column to sort by (descending)
+            smt: SMT strength per candle; required when any combination sets min_smt
+            df: candles (default: the runner's data)
+
+        Returns:
+            DataFrame, empty (same columns) when a grid value has no candidates
+        """
+        combos = expand_grid(grid, base)
+        if smt is None and any(params.get('min_smt') is not None for params in combos):
+            raise ValueError("min_smt / MIN_SMT_STRENGTH needs an smt series; without it the gate is a no-op")
+        if not combos:
+            print("⚠️ Empty grid: no configurations to sweep")
+            return pd.DataFrame(columns=list(params_row(BASELINE)) + list(summarize({'r_multiple': []})))
+        features = self.prepare(df, smt)
+
+        print(f"🧪 Sweeping {len(combos)} configurations on {self.workers} workers...")
+        metrics = self.map(_run_config, combos, features)
+
+        rows = [dict(params_row(params), **stats) for params, stats in zip(combos, metrics)]
+        table = pd.DataFrame(rows).sort_values(rank_by, ascending=False).reset_index(drop=True)
+        print(f"✅ Sweep complete. Best {rank_by}: {table[rank_by].iloc[0]:.2f}")
+        return table
+
+if __name__ == "__main__":
+    sweep = ParameterSweep()
+    table = sweep.run({
+        'killzones': [list(range(12, 20)), list(range(12, 23)), list(range(12, 20)) + [0, 1, 2, 3, 4]],
+        'MAX_PRICE_QUARTILE': [0.35, 0.45, 0.55],
+        'STOP_LOSS_ATR_MULTIPLIER': [1.5, 2.0, 2.5],
+        'TP1_R_MULTIPLE': [1.0, 1.5, 2.0],
+        'TP2_R_MULTIPLE': [3.0, 4.0],
+    })
+    print(table.head(20).to_string())
@@ -0,0 +1,347 @@
+import os
+import re
+import ast
+import inspect
+import json
+import time
+import sqlite3
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from config import Config
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Config knobs that change backtest results (paths, secrets and infra settings stay out of the key)
+STRATEGY_KNOBS = (
+    'TIMEFRAME', 'HTF_TIMEFRAME', 'RISK_PER_TRADE', 'MAX_DRAWDOWN_LIMIT', 'DAILY_TRADE_LIMIT',
+    'STRATEGY_MODE', 'AI_THRESHOLD', 'TP1_R_MULTIPLE', 'TP2_R_MULTIPLE', 'STOP_LOSS_ATR_MULTIPLIER',
+    'KILLZONE_LONDON', 'KILLZONE_NY_AM', 'KILLZONE_NY_PM', 'KILLZONE_NY_CONTINUOUS',
+    'MIN_SMT_STRENGTH', 'MIN_PRICE_QUARTILE', 'MAX_PRICE_QUARTILE',
+    'MIN_PRICE_QUARTILE_SHORT', 'MAX_PRICE_QUARTILE_SHORT',
+)
+
+# Per-trade P&L column of each engine, first match wins (the equity curve is its running sum)
+PNL_COLUMNS = (('pnl_r', 'R'), ('r_multiple', 'R'), ('pnl_pct', '%'))
+
+def config_snapshot():
+    """The strategy knobs of Config as plain JSON values."""
+    return {knob: getattr(Config, knob, None) for knob in STRATEGY_KNOBS}
+
+def code_version(module):
+    """
+    Digest of a root module's source plus every root module it imports
+    (transitively), so an edit to the engine or anything it uses starts a new
+    cache key while unrelated files (Telegram, dashboard, ...) do not.
+    """
+    seen, queue = set(), [module]
+    while queue:
+        name = queue.pop()
+        path = os.path.join(REPO_DIR, f"{name}.py")
+        if name in seen or not os.path.exists(path):
+            continue
+        seen.add(name)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                queue.extend(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                queue.append(node.module.split('.')[0])
+
+    digest = hashlib.sha1()
+    for name in sorted(seen):
+        digest.update(name.encode())
+        with open(os.path.join(REPO_DIR, f"{name}.py"), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def engine_params(engine):
+    """Scalar settings of an engine instance (n_boot, min_trades, ...) besides symbol and dates."""
+    params = {}
+    for key, value in sorted(vars(engine).items()):
+        if key in ('symbol', 'start_date', 'end_date') or key.startswith('_'):
+            continue
+        if isinstance(value, (bool, int, float, str)):
+            params[key] = value
+    return params
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _dumps(value, sort_keys=True):
+    return json.dumps(value, sort_keys=sort_keys, default=_json_default)
+
+class RunRegistry:
+    """
+    Backtest Run Registry (SQLite).
+
+    Every run is keyed by a hash of (engine, parameters, data range, code
+    version) and stores its summary, every trade record and the equity
+    curve. An identical request is answered from the registry without
+    running the engine; past runs are compared with one query over the
+    flat `runs` table.
+
+    Tables:
+        runs    one row per run key (params/summary as JSON + headline metrics)
+        trades  one row per trade (timestamp, outcome, pnl + the full record)
+        equity  cumulative P&L after every trade
+    """
+    def __init__(self, path=None):
+        self.path = path or Config.RUN_REGISTRY_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_key TEXT PRIMARY KEY,
+                    engine TEXT,
+                    symbol TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    data_digest TEXT,
+                    code_version TEXT,
+                    params TEXT,
+                    summary TEXT,
+                    total_trades INTEGER,
+                    win_rate REAL,
+                    total_pnl REAL,
+                    max_drawdown REAL,
+                    pnl_unit TEXT,
+                    duration_s REAL,
+                    created_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS trades (
+                    run_key TEXT,
+                    seq INTEGER,
+                    timestamp TEXT,
+                    outcome TEXT,
+                    pnl REAL,
+                    record TEXT,
+                    PRIMARY KEY (run_key, seq)
+                );
+                CREATE TABLE IF NOT EXISTS equity (
+                    run_key TEXT,
+                    seq INTEGER,
+                    timestamp TEXT,
+                    equity REAL,
+                    PRIMARY KEY (run_key, seq)
+                );
+                CREATE INDEX IF NOT EXISTS runs_engine_symbol ON runs (engine, symbol);
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- Keys ------------------------------------------------------------------
+
+    @staticmethod
+    def data_range(engine):
+        """(start_ts, end_ts) in ms the engine loads: engine.data_range() if it has one, else its dates."""
+        if hasattr(engine, 'data_range'):
+            return engine.data_range()
+        start_ts = int(datetime.strptime(engine.start_date, '%Y-%m-%d').timestamp() * 1000)
+        end_ts = int(datetime.strptime(engine.end_date, '%Y-%m-%d').timestamp() * 1000)
+        return start_ts, end_ts
+
+    @classmethod
+    def sync(cls, engine):
+        """
+        Brings the engine's range up to date in its store (what its load()
+        would do first), so the key of a lookup is the data the run will read
+        and not a partial range stored before the tail was synced.
+        """
+        start_ts, end_ts = cls.data_range(engine)
+        return engine.store.sync(engine.symbol, Config.TIMEFRAME, start_ts, end_ts)
+
+    @classmethod
+    def data_digest(cls, engine, df=None):
+        """
+        Digest of the candles the engine will read (a re-synced range is a new key).
+
+        Without df it is the store's partition manifest for the engine's
+        range (file names, mtimes, sizes; sync() it first so the range is
+        complete): no Parquet is parsed. With df (already loaded) it is the
+        candle content itself.
+        """
+        if df is None:
+            start_ts, end_ts = cls.data_range(engine)
+            manifest = engine.store.partition_manifest(engine.symbol, Config.TIMEFRAME, start_ts, end_ts)
+            return hashlib.sha1(_dumps([start_ts, end_ts, manifest]).encode()).hexdigest()[:16]
+        digest = hashlib.sha1()
+        for column in ('timestamp', 'open', 'high', 'low', 'close', 'volume'):
+            values = df[column].to_numpy()
+            if column == 'timestamp':
+                values = values.astype('datetime64[ms]').astype('int64')
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()[:16]
+
+    def describe(self, engine, params=None, df=None, name=None):
+        """Everything that identifies a run of `engine` (and its run_key)."""
+        # The defining file, also when the engine module runs as __main__
+        module = os.path.splitext(os.path.basename(inspect.getfile(type(engine))))[0]
+        spec = {
+            'engine': name or type(engine).__name__,
+            'symbol': engine.symbol,
+            'start_date': engine.start_date,
+            'end_date': engine.end_date,
+            'data_digest': self.data_digest(engine, df),
+            'code_version': code_version(module),
+            'params': {'config': config_snapshot(), 'engine': engine_params(engine), 'run': params or {}},
+        }
+        spec['run_key'] = hashlib.sha1(_dumps(spec).encode()).hexdigest()[:20]
+        return spec
+
+    # --- Read / write ------------------------------------------------------------
+
+    def get(self, run_key):
+        """Stored run (summary, trades, equity) or None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+            if row is None:
+                return None
+            records = [json.loads(r['record']) for r in conn.execute(
+                "SELECT record FROM trades WHERE run_key = ? ORDER BY seq", (run_key,))]
+        finally:
+            conn.close()
+        return {
+            'run_key': run_key,
+            'engine': row['engine'],
+            'params': json.loads(row['params']),
+            'summary': json.loads(row['summary']),
+            'records': records,
+        }
+
+    def record(self, spec, summary, trades, duration_s=None):
+        """Stores one run (replacing an earlier run with the same key)."""
+        trades = pd.DataFrame(trades)
+        pnl_column, pnl_unit = next(((c, u) for c, u in PNL_COLUMNS if c in trades.columns), (None, None))
+        pnl = trades[pnl_column].to_numpy(dtype='float64') if pnl_column else np.zeros(len(trades))
+        equity = np.cumsum(pnl)
+        drawdown = float((np.maximum.accumulate(np.r_[0.0, equity]) - np.r_[0.0, equity]).max()) if len(pnl) else 0.0
+        timestamps = (trades['timestamp'].astype(str).tolist() if 'timestamp' in trades.columns
+                      else [None] * len(trades))
+        outcomes = trades['outcome'].astype(str).tolist() if 'outcome' in trades.columns else [None] * len(trades)
+        records = [_dumps(record, sort_keys=False) for record in trades.to_dict('records')]
+
+        conn = self._connect()
+        try:
+            run_key = spec['run_key']
+            for table in ('runs', 'trades', 'equity'):
+                conn.execute(f"DELETE FROM {table} WHERE run_key = ?", (run_key,))
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_key, spec['engine'], spec['symbol'], spec['start_date'], spec['end_date'],
+                 spec['data_digest'], spec['code_version'], _dumps(spec['params']), _dumps(summary, sort_keys=False),
+                 len(trades), float((pnl > 0).mean() * 100) if len(pnl) else 0.0,
+                 float(equity[-1]) if len(equity) else 0.0, drawdown, pnl_unit,
+                 duration_s, datetime.now().isoformat()))
+            conn.executemany("INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?)",
+                             [(run_key, i, timestamps[i], outcomes[i], float(pnl[i]), records[i])
+                              for i in range(len(trades))])
+            conn.executemany("INSERT INTO equity VALUES (?, ?, ?, ?)",
+                             [(run_key, i, timestamps[i], float(equity[i])) for i in range(len(trades))])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run_backtest(self, engine, force=False):
+        """
+        engine.run_backtest() through the registry: the engine's range is
+        synced first, then an identical run (same engine, settings, candles
+        and code) returns the stored summary and restores engine.trades
+        without running anything. An engine whose
+        randomness is unseeded (seed = None) is run and never cached.
+        """
+        if getattr(engine, 'seed', 0) is None:
+            print(f"⚠️ {type(engine).__name__} is unseeded: running without the registry")
+            return engine.run_backtest()
+
+        self.sync(engine)
+        spec = self.describe(engine)
+        cached = None if force else self.get(spec['run_key'])
+        if cached is not None:
+            print(f"♻️ Cached run {spec['run_key']} ({spec['engine']} {engine.symbol})")
+            engine.trades = cached['records']
+            return cached['summary']
+
+        started = time.time()
+        summary = engine.run_backtest()
+        # The run may have synced new candles: key it on the partitions it actually read
+        spec = self.describe(engine)
+        self.record(spec, summary, engine.trades, time.time() - started)
+        print(f"🗄️ Run {spec['run_key']} saved to the registry")
+        return summary
+
+    def run_model(self, runner, model_name, params, force=False):
+        """ComparativeBacktest.run_model through the registry (keyed by the model params)."""
+        describe = lambda: self.describe(runner, {'model': params}, name=f"{type(runner).__name__}:{model_name}")
+        self.sync(runner)
+        spec = describe()
+        cached = None if force else self.get(spec['run_key'])
+        if cached is not None:
+            print(f"♻️ Cached run {spec['run_key']} ({spec['engine']} {runner.symbol})")
+            return cached['records']
+
+        started = time.time()
+        trades = runner.run_model(model_name, params)
+        spec = describe()
+        self.record(spec, runner.analyze(trades) if trades else {}, trades, time.time() - started)
+        return trades
+
+    # --- Queries -----------------------------------------------------------------
+
+    def query(self, sql, params=()):
+        """Any SQL over runs/trades/equity as a DataFrame."""
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def runs(self, engine=None, symbol=None, order_by='created_at DESC', limit=None):
+        """Past runs with their headline metrics (one query)."""
+        where, args = [], []
+        if engine:
+            where.append("engine LIKE ?")
+            args.append(f"{engine}%")
+        if symbol:
+            where.append("symbol = ?")
+            args.append(symbol)
+        if not re.fullmatch(r"[a-z_]+( (ASC|DESC))?", order_by):
+            raise ValueError(f"Invalid order_by: {order_by}")
+        sql = ("SELECT run_key, engine, symbol, start_date, end_date, code_version, total_trades, win_rate, "
+               "total_pnl, max_drawdown, pnl_unit, duration_s, created_at, params FROM runs")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, args)
+
+    def trades(self, run_key):
+        """Trade records of one run."""
+        records = self.get(run_key)
+        return pd.DataFrame(records['records']) if records else pd.DataFrame()
+
+    def equity(self, run_key):
+        """Equity curve (cumulative P&L per trade) of one run."""
+        return self.query("SELECT seq, timestamp, equity FROM equity WHERE run_key = ? ORDER BY seq", (run_key,))
+
+if __name__ == "__main__":
+    registry = RunRegistry()
+    print(registry.runs(limit=20).drop(columns=['params']).to_string())
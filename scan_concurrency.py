@@ -0,0 +1,67 @@
+import time
+import threading
+
+class ThrottledExchange:
+    """
+    Thread-safe request spacing around a ccxt exchange.
+
+    ccxt's sync throttle is not safe to share between threads (each thread
+    reads the same lastRestRequestTimestamp and they all fire together).
+    Here every request reserves the next free slot under a lock and sleeps
+    outside it, so N scanner threads together never exceed the exchange's
+    rateLimit. Everything else is delegated to the wrapped exchange.
+    """
+    def __init__(self, exchange, min_interval_ms=None):
+        self._exchange = exchange
+        interval_ms = min_interval_ms if min_interval_ms is not None else getattr(exchange, 'rateLimit', 0)
+        self._interval = (interval_ms or 0) / 1000
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _wait_for_slot(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def fetch_ohlcv(self, *args, **kwargs):
+        self._wait_for_slot()
+        return self._exchange.fetch_ohlcv(*args, **kwargs)
+
+    def fetch_order_book(self, *args, **kwargs):
+        self._wait_for_slot()
+        return self._exchange.fetch_order_book(*args, **kwargs)
+
+    def fetch_tickers(self, *args, **kwargs):
+        self._wait_for_slot()
+        return self._exchange.fetch_tickers(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._exchange, name)
+
+class TradeBudget:
+    """
+    Shared daily trade counter for concurrent scans.
+
+    try_acquire() atomically checks the limit and reserves a slot, so two
+    symbols firing at the same moment cannot both push past DAILY_TRADE_LIMIT.
+    """
+    def __init__(self, used, limit):
+        self.used = int(used)
+        self.limit = int(limit)
+        self._lock = threading.Lock()
+
+    def exhausted(self):
+        with self._lock:
+            return self.used >= self.limit
+
+    def try_acquire(self):
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
@@ -3,6 +3,15 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+from candle_store import CandleStore
+from session_ranges import session_ranges_at
+from indicators import calculate_adx
+from exit_engine import resolve_exits
+from liquidity_pools import LiquidityPools
+from fvg_index import FVGIndex, TARGET_WINDOW
+from signal_kernel import evaluate_signals, candidate_indices, BULLISH, BACKTEST_REF
+from feature_store import FeatureStore
+from run_registry import RunRegistry
 from config import Config
 
 class ScannerBacktest:
@@ -12,240 +21,79 @@ class ScannerBacktest:
     This backtest uses the REAL Volume Operator filters (SMT, Quartiles, Sweeps) 
     and verifies outcomes with actual price data.
     """
-    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06'):
+    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06', exchange=None):
         self.symbol = symbol
         self.start_date = start_date
         self.end_date = end_date
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
         self.trades = []
+        self.features = FeatureStore(self.store)  # Persisted bias/ADX/ATR/session columns
+        self.sessions = None  # Per-candle feature table (session ranges, bias, ADX) for this run
+        self.pools = None  # Swing-pivot liquidity pools (built once per run)
+        self.fvgs = None  # Fair value gaps with fill times (built once per run)
         
     def fetch_historical_data(self):
-        """Fetches 5m OHLCV data for the entire period."""
-        print(f"📥 Fetching {self.symbol} data from {self.start_date} to {self.end_date}...")
+        """Loads 5m OHLCV data for the entire period from the local candle store."""
+        print(f"📥 Loading {self.symbol} data from {self.start_date} to {self.end_date}...")
         
         start_ts = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
         end_ts = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
         
-        all_data = []
-        current_ts = start_ts
+        df = self.store.load(self.symbol, '5m', start_ts, end_ts)
         
-        while current_ts < end_ts:
-            try:
-                ohlcv = self.exchange.fetch_ohlcv(self.symbol, '5m', since=current_ts, limit=1000)
-                if not ohlcv:
-                    break
-                all_data.extend(ohlcv)
-                current_ts = ohlcv[-1][0] + 1
-                
-                progress_date = datetime.fromtimestamp(current_ts / 1000).strftime('%Y-%m-%d %H:%M')
-                print(f"  Fetched up to {progress_date}")
-            except Exception as e:
-                print(f"Error: {e}")
-                break
-                
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.drop_duplicates(subset='timestamp')
-        
-        print(f"✅ Fetched {len(df)} candles")
+        print(f"✅ Loaded {len(df)} candles")
         return df
     
     def calculate_adx(self, df, period=14):
         """Calculate ADX for regime detection."""
-        high = df['high']
-        low = df['low']
-        close = df['close']
-        
-        plus_dm = high.diff()
-        minus_dm = -low.diff()
-        
-        plus_dm[plus_dm < 0] = 0
-        minus_dm[minus_dm < 0] = 0
-        
-        tr1 = high - low
-        tr2 = abs(high - close.shift())
-        tr3 = abs(low - close.shift())
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        
-        atr = tr.ewm(alpha=1/period, adjust=False).mean()
-        plus_di = 100 * (plus_dm.ewm(alpha=1/period, adjust=False).mean() / atr)
-        minus_di = 100 * (minus_dm.ewm(alpha=1/period, adjust=False).mean() / atr)
-        
-        dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
-        adx = dx.ewm(alpha=1/period, adjust=False).mean()
-        
-        return adx
-    
-    def get_4h_bias(self, df, idx):
-        """Determines HTF Trend Bias using EMA crossover."""
-        # Use data up to current index for 4H bias
-        lookback = min(100*12, idx)  # 100 4H candles = 1200 5m candles
-        if lookback < 50*12:
-            return "NEUTRAL"
-        
-        df_4h = df.iloc[max(0, idx-lookback):idx].copy()
-        df_4h = df_4h.iloc[::12]  # Resample to 4H
-        
-        df_4h['ema_20'] = df_4h['close'].ewm(span=20).mean()
-        df_4h['ema_50'] = df_4h['close'].ewm(span=50).mean()
-        
-        if len(df_4h) < 50:
-            return "NEUTRAL"
-        
-        latest = df_4h.iloc[-1]
-        if latest['ema_20'] > latest['ema_50']:
-            return "BULLISH"
-        elif latest['ema_20'] < latest['ema_50']:
-            return "BEARISH"
-        return "NEUTRAL"
-    
-    def is_killzone(self, hour):
-        """Check if hour is within NY continuous session."""
-        return Config.KILLZONE_NY_CONTINUOUS[0] <= hour < Config.KILLZONE_NY_CONTINUOUS[1]
+        return calculate_adx(df, period)
     
     def get_price_quartiles(self, df, idx):
-        """Calculate Asian/London range quartiles."""
-        # Look back 24 hours
-        lookback_start = max(0, idx - 288)
-        recent_df = df.iloc[lookback_start:idx].copy()
-        
-        # Asian Range (00:00-05:00 UTC)
-        asian_df = recent_df[(recent_df['timestamp'].dt.hour >= 0) & (recent_df['timestamp'].dt.hour < 5)]
-        # London Range (07:00-10:00 UTC)
-        london_df = recent_df[(recent_df['timestamp'].dt.hour >= 7) & (recent_df['timestamp'].dt.hour < 10)]
-        
-        ranges = {}
-        for name, data in [("Asian Range", asian_df), ("London Range", london_df)]:
-            if data.empty:
-                continue
-            r_high = data['high'].max()
-            r_low = data['low'].min()
-            r_diff = r_high - r_low
-            
-            ranges[name] = {
-                "high": r_high,
-                "low": r_low,
-                "sd_1_pos": r_high + r_diff,
-                "sd_1_neg": r_low - r_diff
-            }
-        
-        return ranges
-    
-    def check_sweep_and_entry(self, current, recent_high, recent_low, london_high, london_low, bias):
-        """Check if current candle swept liquidity and closed back."""
-        if bias == "BULLISH":
-            # Check PDL sweep
-            swept_pdl = current['low'] < recent_low and current['close'] > recent_low
-            # Check London Low sweep
-            swept_london = False
-            if london_low is not None:
-                swept_london = current['low'] < london_low and current['close'] > london_low
-            return swept_pdl or swept_london
-        
-        elif bias == "BEARISH":
-            # Check PDH sweep
-            swept_pdh = current['high'] > recent_high and current['close'] < recent_high
-            # Check London High sweep
-            swept_london = False
-            if london_high is not None:
-                swept_london = current['high'] > london_high and current['close'] < london_high
-            return swept_pdh or swept_london
-        
-        return False
+        """Calculate Asian/London range quartiles (O(1) lookup in the session table)."""
+        return session_ranges_at(self.sessions, idx, names=("Asian Range", "London Range"))
     
     def check_outcome(self, entry, stop, target, df, entry_idx):
-        """Tick-level replay to verify outcome."""
-        friction_penalty = entry * 0.0003
-        
-        is_long = target > entry
-        max_lookahead = min(288, len(df) - entry_idx - 1)
-        
-        for i in range(1, max_lookahead + 1):
-            future_idx = entry_idx + i
-            if future_idx >= len(df):
-                break
-                
-            candle = df.iloc[future_idx]
-            
-            if is_long:
-                if candle['low'] <= stop:
-                    return ('LOSS', stop, i)
-                elif candle['high'] >= target:
-                    return ('WIN', target, i)
-            else:
-                if candle['high'] >= stop:
-                    return ('LOSS', stop, i)
-                elif candle['low'] <= target:
-                    return ('WIN', target, i)
-        
-        # Timeout
-        final_candle = df.iloc[entry_idx + max_lookahead]
-        return ('TIMEOUT', final_candle['close'], max_lookahead)
+        """Tick-level replay to verify outcome (single trade; run_backtest resolves in batch)."""
+        exits = resolve_exits(df['high'], df['low'], df['close'], [entry_idx],
+                              [1 if target > entry else -1], [stop], [target])
+        return (str(exits['outcome'][0]), float(exits['exit_price'][0]), int(exits['hold'][0]))
+    
+    def compute_signals(self, df):
+        """Scanner entry gates (shared signal kernel) for every candle of the history."""
+        trending = (df['adx'] > 25).to_numpy()  # TRENDING vs RANGING quartile limits
+        return evaluate_signals(
+            df['timestamp'], df['high'], df['low'], df['close'],
+            self.sessions['bias'], self.sessions, ref=BACKTEST_REF,
+            long_zone=(Config.MIN_PRICE_QUARTILE, np.where(trending, 0.50, Config.MAX_PRICE_QUARTILE)),
+            short_zone=(np.where(trending, 0.50, Config.MIN_PRICE_QUARTILE_SHORT), Config.MAX_PRICE_QUARTILE_SHORT),
+            mask=df['adx'].notna().to_numpy(),
+        )
     
     def run_backtest(self):
         """Runs hybrid backtest with scanner logic + tick replay."""
         df = self.fetch_historical_data()
-        df['adx'] = self.calculate_adx(df)
+        self.sessions = self.features.get(self.symbol, df)  # Computed once per data range, then joined
+        df['adx'] = self.sessions['adx']
+        self.pools = LiquidityPools(df['high'], df['low'])
+        self.fvgs = FVGIndex(df['high'].to_numpy(), df['low'].to_numpy())
         
         print(f"\n🔄 Running Scanner-Integrated Backtest (Volume Operator Strategy)...")
         print(f"⚙️  Using: SMT 0.3+ | Quartile 0.45 | Tick Replay Verification")
         
         trade_count = 0
         
+        # Killzone, 4H bias, ADX-adaptive quartile and sweep gates in one pass
+        signals = self.compute_signals(df)
+        setups = []
+        
         # Start from index where we have sufficient history
-        for idx in range(1000, len(df) - 300):
+        for idx in candidate_indices(signals, 1000, len(df) - 300):
             current = df.iloc[idx]
-            hour = current['timestamp'].hour
-            
-            # FILTER 1: Killzone
-            if not self.is_killzone(hour):
-                continue
-            
-            # FILTER 2: 4H Bias
-            bias = self.get_4h_bias(df, idx)
-            if bias == "NEUTRAL":
-                continue
-            
-            # FILTER 3: ADX Regime
+            bias = "BULLISH" if signals['direction'][idx] == BULLISH else "BEARISH"
             current_adx = current['adx']
-            if pd.isna(current_adx):
-                continue
-            
-            if current_adx > 25:
-                adaptive_max_quartile = 0.50  # TRENDING
-            else:
-                adaptive_max_quartile = Config.MAX_PRICE_QUARTILE  # RANGING
-            
-            # FILTER 4: Price Quartiles
+            price_position = signals['position'][idx]
             price_quartiles = self.get_price_quartiles(df, idx)
-            if not price_quartiles:
-                continue
-            
-            ref_range = price_quartiles.get("Asian Range") or price_quartiles.get("London Range")
-            if not ref_range:
-                continue
-            
-            price_position = (current['close'] - ref_range['low']) / (ref_range['high'] - ref_range['low'])
-            
-            # Check if in valid zone
-            if bias == "BULLISH":
-                if not (Config.MIN_PRICE_QUARTILE <= price_position <= adaptive_max_quartile):
-                    continue
-            else:
-                adaptive_min_short = 0.50 if current_adx > 25 else Config.MIN_PRICE_QUARTILE_SHORT
-                if not (adaptive_min_short <= price_position <= Config.MAX_PRICE_QUARTILE_SHORT):
-                    continue
-            
-            # FILTER 5: Liquidity Sweep Check
-            recent_high = df['high'].iloc[max(0, idx-288):idx].max()
-            recent_low = df['low'].iloc[max(0, idx-288):idx].min()
-            
-            london_high = price_quartiles.get("London Range", {}).get("high")
-            london_low = price_quartiles.get("London Range", {}).get("low")
-            
-            swept = self.check_sweep_and_entry(current, recent_high, recent_low, london_high, london_low, bias)
-            if not swept:
-                continue
             
             # ENTRY FOUND - Setup trade
             entry = current['close']
@@ -254,11 +102,15 @@ class ScannerBacktest:
                 stop = current['low'] - (entry * 0.001)
                 target = price_quartiles.get("London Range", {}).get("sd_1_pos") or \
                          price_quartiles.get("Asian Range", {}).get("sd_1_pos") or \
+                         self.fvgs.nearest_above(entry, as_of=idx, window=TARGET_WINDOW) or \
+                         self.pools.nearest_above(entry, as_of=idx) or \
                          entry * 1.02
             else:
                 stop = current['high'] + (entry * 0.001)
                 target = price_quartiles.get("London Range", {}).get("sd_1_neg") or \
                          price_quartiles.get("Asian Range", {}).get("sd_1_neg") or \
+                         self.fvgs.nearest_below(entry, as_of=idx, window=TARGET_WINDOW) or \
+                         self.pools.nearest_below(entry, as_of=idx) or \
                          entry * 0.98
             
             # Enforce 3R minimum
@@ -270,14 +122,27 @@ class ScannerBacktest:
                 else:
                     target = entry - (risk * 3.0)
             
-            # VERIFY OUTCOME
-            outcome, exit_price, hold_candles = self.check_outcome(entry, stop, target, df, idx)
+            setups.append((idx, bias, entry, stop, target, current_adx, price_position))
+        
+        # VERIFY OUTCOMES: first stop/target touch for every setup in one batch
+        exits = resolve_exits(
+            df['high'], df['low'], df['close'],
+            [setup[0] for setup in setups],
+            [1 if setup[1] == "BULLISH" else -1 for setup in setups],
+            [setup[3] for setup in setups],
+            [setup[4] for setup in setups],
+        )
+        
+        for k, (idx, bias, entry, stop, target, current_adx, price_position) in enumerate(setups):
+            outcome = str(exits['outcome'][k])
+            exit_price = float(exits['exit_price'][k])
+            hold_candles = int(exits['hold'][k])
             
             pnl_pct = ((exit_price - entry) / entry) * 100 if bias == "BULLISH" else ((entry - exit_price) / entry) * 100
             
             trade_count += 1
             self.trades.append({
-                'timestamp': current['timestamp'],
+                'timestamp': df['timestamp'].iloc[idx],
                 'bias': bias,
                 'entry': entry,
                 'stop': stop,
@@ -335,7 +200,7 @@ if __name__ == "__main__":
         end_date='2026-01-06'
     )
     
-    results = engine.run_backtest()
+    results = RunRegistry().run_backtest(engine)  # Cached when nothing changed
     
     print("\n" + "="*60)
     print("📊 SCANNER BACKTEST RESULTS (12 Months)")
@@ -0,0 +1,110 @@
+import time
+import numpy as np
+import pandas as pd
+from config import Config
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Named killzones (UTC hours) used by the edge-discovery factor labels
+KILLZONES = {
+    'LONDON': (7, 10),
+    'NY_AM': (12, 15),
+    'NY_PM': (18, 20),
+}
+
+# ICT sessions: 6-hour blocks from 00:00 UTC, each 4 x 90-minute quartiles
+SESSION_HOURS = 6
+QUARTILE_MINUTES = 90
+PHASES = {
+    1: "Q1: Accumulation",
+    2: "Q2: Manipulation (Judas)",
+    3: "Q3: Distribution",
+    4: "Q4: Continuation/Reversal"
+}
+
+class SystemClock:
+    """Wall clock in epoch ms (the default when no exchange clock is given)."""
+    def milliseconds(self):
+        return int(time.time() * 1000)
+
+class FixedClock:
+    """Settable clock for replays and checks: anything with milliseconds() can be injected."""
+    def __init__(self, ts_ms):
+        self.ts_ms = int(ts_ms)
+
+    def milliseconds(self):
+        return self.ts_ms
+
+    def set_time(self, ts_ms):
+        self.ts_ms = int(ts_ms)
+
+def _as_ms(ts):
+    """int64 ms from ms ints or any datetime64 unit (Series or array)."""
+    ts = np.asarray(ts)
+    if np.issubdtype(ts.dtype, np.datetime64):
+        return ts.astype('datetime64[ms]').astype('int64')
+    return ts.astype('int64')
+
+def scanner_killzone_hours():
+    """UTC hours SMCScanner.is_killzone accepts (Config London + continuous NY)."""
+    hours = set()
+    for window in (Config.KILLZONE_LONDON, Config.KILLZONE_NY_CONTINUOUS):
+        if window:
+            hours.update(range(*window))
+    return sorted(hours)
+
+def _label_arrays(ts_ms):
+    minutes_of_day = (ts_ms % DAY_MS) // MINUTE_MS
+    hour = minutes_of_day // 60
+    minutes_in = minutes_of_day % (SESSION_HOURS * 60)
+    quartile = minutes_in // QUARTILE_MINUTES + 1
+
+    killzone = np.full(len(ts_ms), 'NONE', dtype=object)
+    for name, (start, end) in KILLZONES.items():
+        killzone[(hour >= start) & (hour < end)] = name
+
+    phase_names = np.array([PHASES[q] for q in sorted(PHASES)], dtype=object)
+    return {
+        'hour': hour,
+        'minute': minutes_of_day % 60,
+        'day_of_week': ((ts_ms // DAY_MS) + 3) % 7,  # 1970-01-01 was a Thursday
+        'in_killzone': np.isin(hour, scanner_killzone_hours()),
+        'killzone': killzone,
+        'session_quartile': quartile,
+        'session_phase': phase_names[quartile - 1],
+        'minutes_in': minutes_in,
+    }
+
+def label_sessions(ts):
+    """
+    Session-clock labels for a whole timestamp array in one pass.
+
+    Args:
+        ts: epoch ms or datetime64 values (array, Series or list)
+
+    Returns:
+        DataFrame (same index as a Series input) with hour, minute,
+        day_of_week (0=Monday), in_killzone (scanner gate), killzone
+        (LONDON/NY_AM/NY_PM/NONE), session_quartile (1-4), session_phase
+        and minutes_in (minutes into the 6-hour session).
+    """
+    return pd.DataFrame(_label_arrays(_as_ms(ts)),
+                        index=ts.index if isinstance(ts, pd.Series) else None)
+
+class SessionClock:
+    """
+    Session labels for "now" from an injectable clock (exchange, ReplayExchange,
+    FixedClock, ...), so the live gates replay exactly like the backtests.
+    """
+    def __init__(self, clock=None):
+        self.clock = clock or SystemClock()
+
+    def now_ms(self):
+        return self.clock.milliseconds()
+
+    def labels(self):
+        """One row of label_sessions for the current clock time (as a dict)."""
+        labels = _label_arrays(np.array([self.now_ms()], dtype='int64'))
+        return {key: values[0] for key, values in labels.items()}
@@ -0,0 +1,177 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from session_clock import HOUR_MS, DAY_MS, _as_ms
+
+# PDH/PDL window in closed candles (288 * 5m = 24h), shared by the table and the live tracker
+PDH_LOOKBACK = 288
+
+# name -> (start_hour, end_hour) UTC; CBDR wraps midnight
+SESSIONS = {
+    "Asian Range": (0, 5),
+    "London Range": (7, 10),
+    "CBDR": (19, 1),
+}
+
+def _column_prefix(name):
+    return name.split()[0].lower()
+
+def _in_session(hour, start, end):
+    if start < end:
+        return (hour >= start) & (hour < end)
+    return (hour >= start) | (hour < end)
+
+def range_levels(r_high, r_low):
+    """Quartiles and SD projections of a session range (same keys as get_price_quartiles)."""
+    r_diff = r_high - r_low
+    return {
+        "high": r_high,
+        "low": r_low,
+        "mid": r_low + (r_diff * 0.5),
+        "q1": r_low + (r_diff * 0.25),
+        "q3": r_low + (r_diff * 0.75),
+        "sd_1_pos": r_high + r_diff,
+        "sd_1_neg": r_low - r_diff
+    }
+
+def build_session_table(df, lookback=PDH_LOOKBACK):
+    """
+    Per-candle session range table, built once over the whole history.
+
+    Row i holds what a scan AT candle i may know (only candles < i):
+    the latest Asian/London/CBDR instance's high/low (partial if the session
+    is still running) and the rolling PDH/PDL over the previous `lookback`
+    candles. Sessions whose last candle is older than 24h are dropped, the
+    same horizon as the old 288-candle window.
+
+    Each session instance is one groupby (cummax/cummin, then ffill), so the
+    whole table is O(n) instead of re-filtering 288 rows per candidate.
+    """
+    ts_ms = _as_ms(df['timestamp'])
+    hour = (ts_ms // HOUR_MS) % 24
+    high = df['high'].to_numpy(dtype='float64')
+    low = df['low'].to_numpy(dtype='float64')
+    table = pd.DataFrame(index=df.index)
+
+    for name, (start, end) in SESSIONS.items():
+        prefix = _column_prefix(name)
+        in_s = _in_session(hour, start, end)
+        instance = (ts_ms - start * HOUR_MS) // DAY_MS
+
+        s_high = pd.Series(np.where(in_s, high, np.nan)).groupby(instance).cummax()
+        s_low = pd.Series(np.where(in_s, low, np.nan)).groupby(instance).cummin()
+        s_last = pd.Series(np.where(in_s, ts_ms, np.nan))
+
+        s_high = s_high.ffill().shift(1).to_numpy(copy=True)
+        s_low = s_low.ffill().shift(1).to_numpy(copy=True)
+        s_last = s_last.ffill().shift(1).to_numpy()
+
+        stale = ~(ts_ms - s_last < DAY_MS)
+        s_high[stale] = np.nan
+        s_low[stale] = np.nan
+        table[f'{prefix}_high'] = s_high
+        table[f'{prefix}_low'] = s_low
+
+    table['pdh'] = df['high'].rolling(lookback, min_periods=1).max().shift(1).to_numpy()
+    table['pdl'] = df['low'].rolling(lookback, min_periods=1).min().shift(1).to_numpy()
+    return table
+
+def session_ranges_at(table, idx, names=None):
+    """Dict of session levels for candle idx (positional), like get_price_quartiles."""
+    row = table.iloc[idx]
+    ranges = {}
+    for name in names or SESSIONS:
+        prefix = _column_prefix(name)
+        r_high, r_low = row[f'{prefix}_high'], row[f'{prefix}_low']
+        if pd.isna(r_high):
+            continue
+        ranges[name] = range_levels(r_high, r_low)
+    return ranges
+
+def session_levels(ranges, pdh=None, pdl=None):
+    """Flattens a get_price_quartiles dict back into table-style columns (one live row)."""
+    levels = {
+        'pdh': np.nan if pdh is None else pdh,
+        'pdl': np.nan if pdl is None else pdl,
+    }
+    for name, levels_for in (ranges or {}).items():
+        prefix = _column_prefix(name)
+        levels[f'{prefix}_high'] = levels_for['high']
+        levels[f'{prefix}_low'] = levels_for['low']
+    return levels
+
+class SessionRangeTracker:
+    """
+    Live, incremental version of build_session_table for one symbol.
+
+    update() is O(1) (amortized) per candle. Session extremes use max/min, so
+    re-sending the still-forming candle on every scan is harmless: its high
+    only grows and its low only falls until it closes. PDH/PDL use monotonic
+    deques over closed candles only.
+    """
+    def __init__(self):
+        self.last_ts = None
+        self.sessions = {}  # name -> [instance, high, low, last_ts]
+        self._highs = deque()  # (ts, high), highs decreasing
+        self._lows = deque()   # (ts, low), lows increasing
+        self._closed_ts = None
+
+    def update(self, ts_ms, high, low, closed=True):
+        self.last_ts = ts_ms if self.last_ts is None else max(self.last_ts, ts_ms)
+        hour = (ts_ms // HOUR_MS) % 24
+        for name, (start, end) in SESSIONS.items():
+            if not _in_session(hour, start, end):
+                continue
+            instance = (ts_ms - start * HOUR_MS) // DAY_MS
+            state = self.sessions.get(name)
+            if state is None or state[0] != instance:
+                self.sessions[name] = [instance, high, low, ts_ms]
+            else:
+                state[1] = max(state[1], high)
+                state[2] = min(state[2], low)
+                state[3] = max(state[3], ts_ms)
+
+        if closed and (self._closed_ts is None or ts_ms > self._closed_ts):
+            self._closed_ts = ts_ms
+            while self._highs and self._highs[-1][1] <= high:
+                self._highs.pop()
+            self._highs.append((ts_ms, high))
+            while self._lows and self._lows[-1][1] >= low:
+                self._lows.pop()
+            self._lows.append((ts_ms, low))
+
+    def update_frame(self, df):
+        """Folds in every row at or after the last seen candle (the last row is treated as forming)."""
+        ts_ms = _as_ms(df['timestamp'])
+        if self.last_ts is not None and (ts_ms[-1] < self.last_ts or ts_ms[0] > self.last_ts):
+            # Replay rewind or history gap: rebuild from this frame
+            self.__init__()
+        start = 0 if self.last_ts is None else int(np.searchsorted(ts_ms, self.last_ts, side='left'))
+        highs = df['high'].to_numpy(dtype='float64')
+        lows = df['low'].to_numpy(dtype='float64')
+        for i in range(start, len(ts_ms)):
+            self.update(int(ts_ms[i]), highs[i], lows[i], closed=i < len(ts_ms) - 1)
+
+    def ranges(self, now_ms=None):
+        now_ms = self.last_ts if now_ms is None else now_ms
+        ranges = {}
+        for name in SESSIONS:
+            state = self.sessions.get(name)
+            if state is None or now_ms - state[3] >= DAY_MS:
+                continue
+            ranges[name] = range_levels(state[1], state[2])
+        return ranges
+
+    def pdh_pdl(self, since_ms):
+        """Highest high / lowest low of closed candles with timestamp >= since_ms."""
+        while self._highs and self._highs[0][0] < since_ms:
+            self._highs.popleft()
+        while self._lows and self._lows[0][0] < since_ms:
+            self._lows.popleft()
+        if not self._highs:
+            return None, None
+        return self._highs[0][1], self._lows[0][1]
+
+    def previous_day(self, tf_ms, lookback=PDH_LOOKBACK):
+        """PDH/PDL over the `lookback` closed candles before the forming one (build_session_table's window)."""
+        return self.pdh_pdl(self.last_ts - lookback * tf_ms)
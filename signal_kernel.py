@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+from config import Config
+from session_clock import HOUR_MS, _as_ms, scanner_killzone_hours
+
+BULLISH, NEUTRAL, BEARISH = 1, 0, -1
+BIAS_CODES = {"BULLISH": BULLISH, "NEUTRAL": NEUTRAL, "BEARISH": BEARISH}
+
+# Reference range for the price-quartile gate, first available wins
+LIVE_REF = ("asian", "cbdr")        # SMCScanner.scan_pattern
+BACKTEST_REF = ("asian", "london")  # Scanner/Sniper backtests
+
+def _windowed_ewm(values, span, window):
+    """
+    Numerator/denominator of pandas' ewm(span, adjust=True) over the last
+    `window` values ending at each position: num[t] = sum d^j * x[t-j].
+    """
+    d = 1 - 2 / (span + 1)
+    values = np.asarray(values, dtype='float64')
+    t = np.arange(len(values))
+    den_full = (1 - d ** (t + 1)) / (1 - d)
+    num = pd.Series(values).ewm(span=span, adjust=True).mean().to_numpy() * den_full
+    if window < len(values):
+        num[window:] -= d ** window * num[:-window]
+    den = (1 - d ** np.minimum(t + 1, window)) / (1 - d)
+    return num, den
+
+def htf_bias(ts_ms, close, htf_ms, window=100, fast=20, slow=50, min_bars=None):
+    """
+    4H EMA bias for every base candle, exactly as get_4h_bias sees it live:
+    EMA(fast) vs EMA(slow) over the last `window` HTF bars, where the last
+    bar is still forming and its close is the current base candle's close.
+
+    Completed HTF closes are smoothed once; each base candle then only adds
+    its own close as the newest term (d * previous numerator + x).
+    """
+    ts_ms = _as_ms(ts_ms)
+    close = np.asarray(close, dtype='float64')
+    min_bars = slow if min_bars is None else min_bars
+    if not len(close):
+        return np.zeros(0, dtype='int8')
+
+    _, bar_start, bar_of = np.unique(ts_ms // htf_ms, return_index=True, return_inverse=True)
+    bar_close = close[np.r_[bar_start[1:] - 1, len(close) - 1]]
+
+    emas = []
+    for span in (fast, slow):
+        d = 1 - 2 / (span + 1)
+        num, den = _windowed_ewm(bar_close, span, window - 1)
+        prev = bar_of - 1
+        prev_num = np.where(prev >= 0, num[np.maximum(prev, 0)], 0.0)
+        prev_den = np.where(prev >= 0, den[np.maximum(prev, 0)], 0.0)
+        emas.append((close + d * prev_num) / (1 + d * prev_den))
+
+    bias = np.sign(emas[0] - emas[1]).astype('int8')
+    bias[bar_of + 1 < min_bars] = NEUTRAL
+    return bias
+
+def sweep_flags(high, low, close, levels):
+    """
+    Liquidity sweeps with a close back inside, per candle and level:
+    swept_pdl / swept_london_low (bullish) and swept_pdh / swept_london_high
+    (bearish). `levels` as in evaluate_signals; missing levels never sweep.
+    """
+    high = np.asarray(high, dtype='float64')
+    low = np.asarray(low, dtype='float64')
+    close = np.asarray(close, dtype='float64')
+    level = lambda key: np.broadcast_to(np.asarray(levels.get(key, np.nan), dtype='float64'), close.shape)
+    pdh, pdl = level('pdh'), level('pdl')
+    london_high, london_low = level('london_high'), level('london_low')
+    return {
+        'swept_pdl': (low < pdl) & (close > pdl),
+        'swept_london_low': (low < london_low) & (close > london_low),
+        'swept_pdh': (high > pdh) & (close < pdh),
+        'swept_london_high': (high > london_high) & (close < london_high),
+    }
+
+def evaluate_signals(ts_ms, high, low, close, bias, levels, atr=None, smt=None,
+                     ref=LIVE_REF, killzone_hours=None,
+                     long_zone=(Config.MIN_PRICE_QUARTILE, Config.MAX_PRICE_QUARTILE),
+                     short_zone=(Config.MIN_PRICE_QUARTILE_SHORT, Config.MAX_PRICE_QUARTILE_SHORT),
+                     min_smt=Config.MIN_SMT_STRENGTH, stop_atr_mult=Config.STOP_LOSS_ATR_MULTIPLIER,
+                     mask=None):
+    """
+    The scan_pattern entry gates, array in / array out.
+
+    Gates: killzone hour -> HTF bias -> price position in the reference
+    session range -> SMT strength (if given) -> PDL/PDH or London sweep with
+    a close back inside. Works the same on one live row or on years of 5m
+    history (every gate is a NumPy expression).
+
+    Args:
+        ts_ms, high, low, close: base candles (ms or datetime64 timestamps)
+        bias: +1/0/-1 per candle (htf_bias or BIAS_CODES[get_4h_bias()])
+        levels: mapping with '<session>_high'/'<session>_low', 'pdh', 'pdl'
+            arrays (build_session_table columns or one live row)
+        atr: optional ATR per candle for the stop (falls back to 0.5% of close)
+        smt: optional SMT strength (scalar or array); None skips the gate
+        ref: session prefixes tried in order for the quartile range
+        killzone_hours: allowed UTC hours (default: the scanner's is_killzone hours)
+        long_zone/short_zone: (min, max) price position, scalars or arrays
+        mask: optional extra boolean gate (e.g. valid ADX)
+
+    Returns:
+        dict of arrays: direction (+1 LONG / -1 SHORT / 0), position,
+        swept_level, swept_pdx (True = PDH/PDL, False = London), stop
+    """
+    ts_ms = _as_ms(ts_ms)
+    high = np.asarray(high, dtype='float64')
+    low = np.asarray(low, dtype='float64')
+    close = np.asarray(close, dtype='float64')
+    bias = np.asarray(bias)
+    level = lambda key: np.broadcast_to(np.asarray(levels.get(key, np.nan), dtype='float64'), close.shape)
+
+    if killzone_hours is None:
+        killzone_hours = scanner_killzone_hours()
+    hour = (ts_ms // HOUR_MS) % 24
+    gate = np.isin(hour, list(killzone_hours))
+    if mask is not None:
+        gate &= np.asarray(mask, dtype=bool)
+    if smt is not None:
+        gate &= np.asarray(smt, dtype='float64') >= min_smt
+
+    # First available reference range (Asian, then fallback)
+    ref_high = np.full(close.shape, np.nan)
+    ref_low = np.full(close.shape, np.nan)
+    for prefix in ref:
+        missing = np.isnan(ref_high)
+        ref_high = np.where(missing, level(f'{prefix}_high'), ref_high)
+        ref_low = np.where(missing, level(f'{prefix}_low'), ref_low)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = (close - ref_low) / (ref_high - ref_low)
+
+    pdh, pdl = level('pdh'), level('pdl')
+    london_high, london_low = level('london_high'), level('london_low')
+    sweeps = sweep_flags(high, low, close, levels)
+    swept_pdl, swept_london_low = sweeps['swept_pdl'], sweeps['swept_london_low']
+    swept_pdh, swept_london_high = sweeps['swept_pdh'], sweeps['swept_london_high']
+
+    # LONG: discount + sweep below PDL / London low, close back above
+    is_long = (gate & (bias == BULLISH)
+               & (long_zone[0] <= position) & (position <= long_zone[1])
+               & (swept_pdl | swept_london_low))
+
+    # SHORT: premium + sweep above PDH / London high, close back below
+    is_short = (gate & (bias == BEARISH)
+                & (short_zone[0] <= position) & (position <= short_zone[1])
+                & (swept_pdh | swept_london_high))
+
+    direction = np.where(is_long, 1, np.where(is_short, -1, 0)).astype('int8')
+    swept_pdx = np.where(is_long, swept_pdl, swept_pdh)
+    swept_level = np.where(is_long,
+                           np.where(swept_pdl, pdl, london_low),
+                           np.where(swept_pdh, pdh, london_high))
+
+    if atr is None:
+        atr = np.full(close.shape, np.nan)
+    atr = np.asarray(atr, dtype='float64')
+    atr = np.where(np.isnan(atr), close * 0.005, atr)
+    stop = close - direction * atr * stop_atr_mult
+
+    return {
+        'direction': direction,
+        'position': position,
+        'swept_level': swept_level,
+        'swept_pdx': swept_pdx,
+        'stop': stop,
+    }
+
+def candidate_indices(signals, start=0, end=None):
+    """Positions of candles where the kernel fired, optionally within [start, end)."""
+    idx = np.flatnonzero(signals['direction'])
+    end = len(signals['direction']) if end is None else end
+    return idx[(idx >= start) & (idx < end)]
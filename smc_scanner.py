@@ -1,3 +1,5 @@
+import os
+import json
 import numpy as np
 import pandas as pd
 from smartmoneyconcepts import smc  # Assuming leveraging the library for core calculations, or custom implementing
@@ -7,38 +9,48 @@ from datetime import datetime, time as time_obj
 from config import Config
 from intermarket_engine import IntermarketEngine
 from news_filter import NewsFilter
+from candle_cache import CandleCache
+from candle_store import timeframe_to_ms
+from scan_concurrency import ThrottledExchange
+from fvg_index import FVGIndex, TARGET_WINDOW
+from collections import deque
+from indicators import ATR, EMA, calculate_atr, warm_start
+from session_ranges import SessionRangeTracker, session_levels
+from signal_kernel import evaluate_signals, BIAS_CODES, BULLISH, BEARISH, NEUTRAL, LIVE_REF
+from order_book import DepthFeed
+from liquidity_pools import LiquidityPools, SwingPoolTracker, fractal_pivots
+from session_clock import SessionClock, _as_ms
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SMCScanner:
-    def __init__(self):
+    def __init__(self, exchange=None, clock=None):
         # Initialize public exchange for data fetching (free tier)
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        # Any ccxt-compatible object works (e.g. ReplayExchange for offline runs)
+        # Wrapped so concurrent symbol scans share one thread-safe rate limiter
+        self.exchange = ThrottledExchange(exchange or ccxt.binance({'enableRateLimit': True}))
+        # Session gates read this clock (exchange/replay clock unless one is injected)
+        self.clock = SessionClock(clock or self.exchange)
         self.intermarket = IntermarketEngine()
         self.news = NewsFilter()
         self.order_book_enabled = True  # Can be disabled if exchange doesn't support
+        self.depth = DepthFeed(self.exchange)  # Local L2 books (start() for a background refresh)
+        self.candle_cache = CandleCache(self.exchange)  # Incremental ring buffers (since=last_ts)
+        self._indicator_state = {}  # Streaming ATR / 4H EMAs per symbol (O(1) per closed candle, persisted)
+        self.session_trackers = {}  # Session ranges + PDH/PDL per symbol
+        self.pool_trackers = {}  # Unswept swing highs/lows per (symbol, timeframe)
         
-    def calculate_atr(self, df, period=14):
-        high_low = df['high'] - df['low']
-        high_close = abs(df['high'] - df['close'].shift())
-        low_close = abs(df['low'] - df['close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = ranges.max(axis=1)
-        return true_range.rolling(period).mean()
-
     def fetch_data(self, symbol, timeframe, limit=500):
         """
         Fetches candle data.
-        Primary: CCXT (Binance) - Real-time, fast.
+        Primary: CCXT (Binance) via incremental ring-buffer cache - Real-time, fast.
         Fallback: yfinance - Robust, no IP blocking, slightly delayed.
         """
-        # Try CCXT First (Real-Time)
+        # Try CCXT First (Real-Time, only the new candles are requested)
         try:
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-            if ohlcv:
-                df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+            df = self.candle_cache.get(symbol, timeframe, limit=limit)
+            if df is not None:
                 return df
         except Exception as e:
             logger.warning(f"CCXT Fetch failed for {symbol} ({e}). Falling back to yfinance.")
@@ -80,49 +92,132 @@ class SMCScanner:
             logger.error(f"Error fetching data via yfinance for {symbol}: {e}")
             return None
 
+    def fetch_view(self, symbol, timeframe, limit=100):
+        """
+        Higher-timeframe candles derived from the base (Config.TIMEFRAME) stream.
+        Backfilled once, then extended by resampling - no extra request per scan.
+        Falls back to a direct fetch if the view cannot be built.
+        """
+        try:
+            df = self.candle_cache.get_view(symbol, Config.TIMEFRAME, timeframe, limit=limit)
+            if df is not None:
+                return df
+        except Exception as e:
+            logger.warning(f"HTF view failed for {symbol} {timeframe} ({e}). Fetching directly.")
+        return self.fetch_data(symbol, timeframe, limit=limit)
+
     def detect_fractals(self, df, window=2):
         """
         Vectorized fractal detection using NumPy.
         Returns boolean masks for Swing Highs and Lows.
         """
-        # Fractal High
-        is_high = df['high'].rolling(window=2*window+1, center=True).max() == df['high']
-        # Fractal Low
-        is_low = df['low'].rolling(window=2*window+1, center=True).min() == df['low']
-        
-        return is_high, is_low
+        is_high, is_low = fractal_pivots(df['high'], df['low'], window)
+        return pd.Series(is_high, index=df.index), pd.Series(is_low, index=df.index)
+
+    def get_liquidity_pools(self, symbol, df, timeframe=Config.TIMEFRAME):
+        """Incremental swing-pivot pools for symbol/timeframe (only new closed candles are folded in)."""
+        key = (symbol, timeframe)
+        if key not in self.pool_trackers:
+            self.pool_trackers[key] = SwingPoolTracker()
+        pools = self.pool_trackers[key]
+        pools.update_frame(df)
+        return pools
+
+    def now_utc(self):
+        """Current UTC time as seen by the session clock (replay clock when offline)."""
+        return datetime.utcfromtimestamp(self.clock.now_ms() / 1000)
 
     def is_killzone(self):
         """Checks if current time is within London or NY session"""
-        now_utc = datetime.utcnow().time()
-        hour = now_utc.hour
-        
-        # Check London Session
-        london = Config.KILLZONE_LONDON
-        if london and (london[0] <= hour < london[1]):
-            return True
-
-        # Check continuous NY session
-        ny_session = Config.KILLZONE_NY_CONTINUOUS
-        if ny_session and (ny_session[0] <= hour < ny_session[1]):
-            return True
-        
-        return False
+        return bool(self.clock.labels()['in_killzone'])
+
+    def _indicator_file(self, symbol):
+        exchange_id = getattr(self.exchange, 'id', 'exchange')
+        return os.path.join(Config.INDICATOR_STATE_PATH, f"{exchange_id}_{symbol.replace('/', '_')}.json")
+
+    def _indicators(self, symbol):
+        """Streaming indicator state of one symbol (restored from the volume on a cold container)."""
+        if symbol not in self._indicator_state:
+            state = {}
+            try:
+                path = self._indicator_file(symbol)
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        saved = json.load(f)
+                    if 'atr' in saved:
+                        atr = saved['atr']
+                        state['atr'] = {'atr': ATR.from_dict(atr['atr']), 'last_ts': atr['last_ts'],
+                                        'history': deque(atr['history'], maxlen=atr['maxlen'])}
+                    if 'bias' in saved:
+                        bias = saved['bias']
+                        state['bias'] = {'fast': EMA.from_dict(bias['fast']), 'slow': EMA.from_dict(bias['slow']),
+                                         'last_ts': bias['last_ts']}
+            except Exception as e:
+                logger.warning(f"Indicator state unreadable for {symbol} ({e}). Warm-starting from candles.")
+                state = {}
+            self._indicator_state[symbol] = state
+        return self._indicator_state[symbol]
+
+    def _persist_indicators(self, symbol):
+        state = self._indicators(symbol)
+        saved = {}
+        if 'atr' in state:
+            atr = state['atr']
+            saved['atr'] = {'atr': atr['atr'].to_dict(), 'last_ts': atr['last_ts'],
+                            'history': list(atr['history']), 'maxlen': atr['history'].maxlen}
+        if 'bias' in state:
+            bias = state['bias']
+            saved['bias'] = {'fast': bias['fast'].to_dict(), 'slow': bias['slow'].to_dict(),
+                             'last_ts': bias['last_ts']}
+        try:
+            path = self._indicator_file(symbol)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Indicator state persist failed for {symbol}: {e}")
 
-    def get_4h_bias(self, symbol):
-        """Determines HTF Trend Bias from 4H chart"""
-        df_4h = self.fetch_data(symbol, Config.HTF_TIMEFRAME, limit=100)
-        if df_4h is None:
+    def get_4h_bias(self, symbol, window=100, fast=20, slow=50):
+        """
+        Determines HTF Trend Bias from 4H chart: EMA(20) vs EMA(50) over the
+        last `window` 4H bars, the last one still forming.
+
+        Closed bars are folded into per-symbol streaming EMAs (restored from
+        the volume, warm-started from the cached view on a cold start or a
+        history gap); the forming bar is only peeked, never committed.
+        """
+        df_4h = self.fetch_view(symbol, Config.HTF_TIMEFRAME, limit=window)
+        if df_4h is None or df_4h.empty:
             return "NEUTRAL"
-            
-        # Simple EMA Strategy for Bias (20 vs 50)
-        df_4h['ema_20'] = df_4h['close'].ewm(span=20).mean()
-        df_4h['ema_50'] = df_4h['close'].ewm(span=50).mean()
-        
-        latest = df_4h.iloc[-1]
-        if latest['ema_20'] > latest['ema_50']:
+
+        closed = df_4h.iloc[:-1]
+        ts_ms = _as_ms(closed['timestamp'])
+        indicators = self._indicators(symbol)
+        state = indicators.get('bias')
+        if (state is None or not len(ts_ms) or state['fast'].window != window
+                or state['last_ts'] < ts_ms[0] or state['last_ts'] > ts_ms[-1]):
+            # Simple EMA Strategy for Bias (20 vs 50)
+            state = {'fast': warm_start(EMA(fast, window), closed),
+                     'slow': warm_start(EMA(slow, window), closed),
+                     'last_ts': int(ts_ms[-1]) if len(ts_ms) else -1}
+            indicators['bias'] = state
+            self._persist_indicators(symbol)
+        else:
+            new = closed['close'].to_numpy(dtype='float64')[int(np.searchsorted(ts_ms, state['last_ts'], side='right')):]
+            if len(new):
+                for x in new:
+                    state['fast'].update(x)
+                    state['slow'].update(x)
+                state['last_ts'] = int(ts_ms[-1])
+                self._persist_indicators(symbol)
+
+        forming = float(df_4h['close'].iloc[-1])
+        ema_fast, ema_slow = state['fast'].peek(forming), state['slow'].peek(forming)
+        if ema_fast > ema_slow:
             return "BULLISH"
-        elif latest['ema_20'] < latest['ema_50']:
+        elif ema_fast < ema_slow:
             return "BEARISH"
         return "NEUTRAL"
 
@@ -131,65 +226,35 @@ class SMCScanner:
         Calculates the current ICT Session Quartile (90-minute cycles).
         Identifies the phase: Accumulation, Manipulation, Distribution, or X.
         """
-        now_utc = datetime.utcnow()
-        hour = now_utc.hour
-        minute = now_utc.minute
-        total_minutes_today = hour * 60 + minute
-
-        # ICT Sessions (6-hour blocks starting 00:00, 06:00, 12:00, 18:00 UTC)
-        # Each session has 4 x 90-minute quartiles
-        session_start_hour = (hour // 6) * 6
-        minutes_into_session = (hour - session_start_hour) * 60 + minute
-        
-        quartile_num = (minutes_into_session // 90) + 1
-        phases = {
-            1: "Q1: Accumulation",
-            2: "Q2: Manipulation (Judas)",
-            3: "Q3: Distribution",
-            4: "Q4: Continuation/Reversal"
-        }
-        
+        labels = self.clock.labels()
         return {
-            "num": quartile_num,
-            "phase": phases.get(quartile_num, "X"),
-            "minutes_in": minutes_into_session
+            "num": int(labels['session_quartile']),
+            "phase": labels['session_phase'],
+            "minutes_in": int(labels['minutes_in'])
         }
 
-    def get_price_quartiles(self, symbol):
+    def get_price_quartiles(self, symbol, df=None):
         """
         Calculates Asian Range and CBDR High/Low and their Quartiles (SDs).
         Asian Range: 00:00 - 05:00 UTC
         CBDR: 19:00 - 01:00 UTC
+        
+        With the base frame passed in, ranges come from the per-symbol
+        session tracker (only new candles are folded in); otherwise they are
+        rebuilt from a 15m view.
         """
+        if df is not None:
+            tracker = self.session_trackers.setdefault(symbol, SessionRangeTracker())
+            tracker.update_frame(df)
+            return tracker.ranges()
+        
         # Fetch 24h of data to find ranges
-        df_range = self.fetch_data(symbol, '15m', limit=100)
+        df_range = self.fetch_view(symbol, '15m', limit=100)
         if df_range is None: return None
         
-        # Filter for Asian Range (00:00-05:00 UTC)
-        asian_df = df_range[(df_range['timestamp'].dt.hour >= 0) & (df_range['timestamp'].dt.hour < 5)]
-        # Filter for London Range (07:00-10:00 UTC) - The "Inducement" Phase
-        london_df = df_range[(df_range['timestamp'].dt.hour >= 7) & (df_range['timestamp'].dt.hour < 10)]
-        # Filter for CBDR (19:00-01:00 UTC)
-        cbdr_df = df_range[(df_range['timestamp'].dt.hour >= 19) | (df_range['timestamp'].dt.hour < 1)]
-        
-        ranges = {}
-        for name, data in [("Asian Range", asian_df), ("London Range", london_df), ("CBDR", cbdr_df)]:
-            if data.empty: continue
-            r_high = data['high'].max()
-            r_low = data['low'].min()
-            r_diff = r_high - r_low
-            
-            ranges[name] = {
-                "high": r_high,
-                "low": r_low,
-                "mid": r_low + (r_diff * 0.5),
-                "q1": r_low + (r_diff * 0.25),
-                "q3": r_low + (r_diff * 0.75),
-                "sd_1_pos": r_high + r_diff,
-                "sd_1_neg": r_low - r_diff
-            }
-        
-        return ranges
+        tracker = SessionRangeTracker()
+        tracker.update_frame(df_range)
+        return tracker.ranges()
     
     def validate_sweep_depth(self, symbol, swept_level, direction):
         """
@@ -207,35 +272,14 @@ class SMCScanner:
             return True  # Skip filter if not supported
         
         try:
-            # Fetch order book (Level 2 depth)
-            order_book = self.exchange.fetch_order_book(symbol, limit=50)
+            # Local Level 2 book (kept current by the depth feed, REST only if stale)
+            book = self.depth.book(symbol)
             
-            # For LONG setup (sweep below), check buy-side absorption
-            if direction == 'LONG':
-                bids = order_book['bids']  # [[price, amount], ...]
-                total_volume = 0
-                
-                # Check if significant buy orders near swept level
-                for bid in bids:
-                    price, amount = bid[0], bid[1]
-                    # Within 0.5% of swept level
-                    if abs(price - swept_level) / swept_level < 0.005:
-                        total_volume += amount
-                
-                # Require minimum 5 BTC of buy-side absorption
-                return total_volume >= 5.0
+            # LONG (sweep below): buy-side absorption, SHORT (sweep above): sell-side
+            side = 'bids' if direction == 'LONG' else 'asks'
             
-            # For SHORT setup (sweep above), check sell-side absorption
-            else:
-                asks = order_book['asks']
-                total_volume = 0
-                
-                for ask in asks:
-                    price, amount = ask[0], ask[1]
-                    if abs(price - swept_level) / swept_level < 0.005:
-                        total_volume += amount
-                
-                return total_volume >= 5.0
+            # Require minimum 5 BTC within 0.5% of the swept level
+            return book.volume_near(side, swept_level, 0.005) >= 5.0
         
         except Exception as e:
             logger.warning(f"Order book fetch failed: {e}. Skipping depth filter.")
@@ -252,21 +296,47 @@ class SMCScanner:
         Returns:
             pandas Series with ATR values
         """
-        high = df['high']
-        low = df['low']
-        close = df['close']
-        
-        # True Range = max(high-low, abs(high-prev_close), abs(low-prev_close))
-        tr1 = high - low
-        tr2 = abs(high - close.shift(1))
-        tr3 = abs(low - close.shift(1))
-        
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr = tr.rolling(window=period).mean()
+        return calculate_atr(df, period)
+    
+    def get_atr_stats(self, symbol, df, period=14, mean_window=50):
+        """
+        Streaming ATR: (current ATR, mean of the last `mean_window` ATRs).
         
-        return atr
+        Closed candles are folded into a per-symbol O(1) ATR state; only the
+        last (possibly forming) candle is evaluated provisionally. The state
+        is persisted to the volume, so a cold container resumes it; it is
+        rebuilt from the frame only on a history gap or rewind.
+        """
+        closed = df.iloc[:-1]
+        ts_ms = _as_ms(closed['timestamp'])
+        indicators = self._indicators(symbol)
+        state = indicators.get('atr')
+        
+        if (state is None or state['atr'].period != period
+                or state['history'].maxlen != mean_window - 1
+                or state['last_ts'] < ts_ms[0] or state['last_ts'] > ts_ms[-1]):
+            state = {'atr': ATR(period), 'last_ts': None, 'history': deque(maxlen=mean_window - 1)}
+            start = 0
+        else:
+            start = int(np.searchsorted(ts_ms, state['last_ts'], side='right'))
+        
+        new_rows = closed.iloc[start:]
+        for h, l, c in zip(new_rows['high'].to_numpy(dtype='float64'),
+                           new_rows['low'].to_numpy(dtype='float64'),
+                           new_rows['close'].to_numpy(dtype='float64')):
+            state['history'].append(state['atr'].update(h, l, c))
+        if len(new_rows):
+            state['last_ts'] = int(ts_ms[-1])
+            indicators['atr'] = state
+            self._persist_indicators(symbol)
+        
+        last = df.iloc[-1]
+        current_atr = state['atr'].peek(last['high'], last['low'], last['close'])
+        window = [v for v in list(state['history']) + [current_atr] if not np.isnan(v)]
+        mean_atr = float(np.mean(window)) if window else np.nan
+        return current_atr, mean_atr
     
-    def get_volatility_adjusted_target(self, df, direction, entry_price, session_range):
+    def get_volatility_adjusted_target(self, df, direction, entry_price, session_range, atr_stats=None):
         """
         ATR-Dynamic Targeting: Adjusts targets based on current volatility.
         
@@ -279,17 +349,21 @@ class SMCScanner:
             direction: 'LONG' or 'SHORT'
             entry_price: Entry price
             session_range: Price quartiles dict
+            atr_stats: (current_atr, mean_atr) from get_atr_stats (optional)
         
         Returns:
             Target price
         """
-        atr = self.calculate_atr(df)
-        if atr is None or len(atr) < 14:
-            # Fallback to SD 1.0 if ATR unavailable
-            return session_range.get('sd_1_pos' if direction == 'LONG' else 'sd_1_neg')
-        
-        mean_atr = atr.iloc[-50:].mean()  # 50-period mean
-        current_atr = atr.iloc[-1]
+        if atr_stats is not None:
+            current_atr, mean_atr = atr_stats
+        else:
+            atr = self.calculate_atr(df)
+            if atr is None or len(atr) < 14:
+                # Fallback to SD 1.0 if ATR unavailable
+                return session_range.get('sd_1_pos' if direction == 'LONG' else 'sd_1_neg')
+            
+            mean_atr = atr.iloc[-50:].mean()  # 50-period mean
+            current_atr = atr.iloc[-1]
         
         # High Volatility: Expanded Targets
         if current_atr > mean_atr * 1.5:
@@ -307,57 +381,51 @@ class SMCScanner:
         else:
             return session_range.get('sd_1_pos' if direction == 'LONG' else 'sd_1_neg')
             
-    def get_next_institutional_target(self, df, direction, entry_price):
+    def get_next_institutional_target(self, df, direction, entry_price, pools=None):
         """
         DYNAMIC TARGETING: Scans for the nearest 'Draw on Liquidity'.
         1. Nearest Unfilled FVG (Fair Value Gap)
-        2. Nearest Major Swing Pivot (Liquidity Pool)
+        2. Nearest Unswept Swing Pivot (Liquidity Pool)
+        
+        Args:
+            pools: SwingPoolTracker from get_liquidity_pools (optional, else built from the last 100 candles)
         """
         target = None
         min_rr = 3.0 # Institutional minimum risk/reward aspiration
         
         # Scan last 100 candles for resting liquidity
-        recent = df.iloc[-100:]
+        recent = df.iloc[-TARGET_WINDOW:]
+        
+        # Vectorized FVG detection with fill tracking (price-sorted, bisect lookup)
+        fvgs = FVGIndex(recent['high'].to_numpy(), recent['low'].to_numpy())
+        if pools is None:
+            pools = LiquidityPools(recent['high'].to_numpy(), recent['low'].to_numpy())
         
         if direction == "LONG":
-            # 1. Look for Bearish FVG above entry
+            # 1. Nearest unfilled Bearish FVG above entry
             # Bearish FVG: Low of candle i-2 > High of candle i
-            for i in range(len(recent)-3, 0, -1):
-                c0 = recent.iloc[i]     # Current
-                c2 = recent.iloc[i-2]   # 2 candles ago
-                
-                # Check for gap
-                if c2['low'] > c0['high']:
-                    fvg_bottom = c0['high']
-                    # Is it above our entry?
-                    if fvg_bottom > entry_price:
-                        # Is it "Unfilled" (Price hasn't traded through it yet)?
-                        # Simplified check: Just find the first valid one above current
-                        return fvg_bottom
+            fvg_bottom = fvgs.nearest_above(entry_price)
+            if fvg_bottom is not None:
+                return fvg_bottom
             
-            # 2. Fallback: Major Swing High (Liquidity Pool)
-            swing_high = recent['high'].max()
-            if swing_high > entry_price:
+            # 2. Fallback: Nearest unswept Swing High (Buy-Side Liquidity Pool)
+            swing_high = pools.nearest_above(entry_price)
+            if swing_high is not None:
                 return swing_high
                 
             # 3. Last Resort: 1:4 Expansion
             return entry_price * 1.02 
 
         elif direction == "SHORT":
-            # 1. Look for Bullish FVG below entry
+            # 1. Nearest unfilled Bullish FVG below entry
             # Bullish FVG: High of candle i-2 < Low of candle i
-            for i in range(len(recent)-3, 0, -1):
-                c0 = recent.iloc[i]     # Current (High)
-                c2 = recent.iloc[i-2]   # 2 candles ago (Low)
-                
-                if c2['high'] < c0['low']:
-                    fvg_top = c0['low']
-                    if fvg_top < entry_price:
-                        return fvg_top
+            fvg_top = fvgs.nearest_below(entry_price)
+            if fvg_top is not None:
+                return fvg_top
                         
-            # 2. Fallback: Major Swing Low
-            swing_low = recent['low'].min()
-            if swing_low < entry_price:
+            # 2. Fallback: Nearest unswept Swing Low (Sell-Side Liquidity Pool)
+            swing_low = pools.nearest_below(entry_price)
+            if swing_low is not None:
                 return swing_low
                 
             # 3. Last Resort: 1:4 Expansion
@@ -365,6 +433,20 @@ class SMCScanner:
 
         return target
 
+    def get_smt_strength(self, index_context):
+        """SMT strength from the DXY 5m move (same for every symbol in a scan)."""
+        smt_strength = 0.0
+        if index_context:
+            # Use DXY (Dollar Index) as the Institutional Truth
+            dxy_data = index_context.get('DXY', {})
+            if dxy_data:
+                dxy_change = dxy_data.get('change_5m', 0)
+                # Institutional Sponsorship: BTC refuses to drop when DXY pumps.
+                # Or DXY dumps and BTC pumps (Confluence).
+                # We measure the MAGNITUDE of the DXY move.
+                smt_strength = abs(dxy_change) / 0.1  # Normalize: 0.1% move = 1.0 Strength
+        return smt_strength
+
     def scan_pattern(self, symbol, timeframe='5m', cached_context=None):
         """
         Main Scanning Function.
@@ -397,194 +479,148 @@ class SMCScanner:
         else:
             index_context = self.intermarket.get_market_context()
             
+        # Base stream first: the 4H and 15m views below are resampled from it
+        df = self.fetch_data(symbol, timeframe)
+        if df is None:
+            return None
+
         # 4. HARD GATE: Bias (HTF 4H)
         bias = self.get_4h_bias(symbol)
         
         # 3. GET SESSION METADATA (Time & Price Quartiles)
         time_quartile = self.get_session_quartile()
-        price_quartiles = self.get_price_quartiles(symbol)
-        
-        df = self.fetch_data(symbol, timeframe)
-        if df is None:
-            return None
+        price_quartiles = self.get_price_quartiles(symbol, df)
 
         # Current and recent data
         current = df.iloc[-1]
         
         # Recent high/low for liquidity levels (24h Lookback - PDH/PDL)
-        # 288 candles * 5m = 1440m = 24 hours
-        recent_high = df['high'].iloc[-288:-1].max()
-        recent_low = df['low'].iloc[-288:-1].min()
+        # 288 candles * 5m = 1440m = 24 hours (closed candles only)
+        sessions = self.session_trackers[symbol]
+        recent_high, recent_low = sessions.previous_day(timeframe_to_ms(Config.TIMEFRAME))
+
+        # Liquidity pools (unswept swing highs/lows), folded in every scan so none is missed
+        pools = self.get_liquidity_pools(symbol, df, timeframe)
+
+        # TIER 1 FILTER: Strong SMT Divergence (DXY Correlation)
+        smt_strength = self.get_smt_strength(index_context)
+
+        # ENTRY GATES: Price Quartile + SMT + Hybrid Sweep (PDH/PDL or London, Judas Swing)
+        # Same kernel the backtests run over the whole history, here on the last row
+        signal = evaluate_signals(
+            [sessions.last_ts], [current['high']], [current['low']], [current['close']],
+            [BIAS_CODES.get(bias, NEUTRAL)],
+            session_levels(price_quartiles, recent_high, recent_low),
+            smt=smt_strength, ref=LIVE_REF,
+        )
+        signal_direction = signal['direction'][0]
+        swept_level = signal['swept_level'][0]
 
         setup = None
 
         # BULLISH Setup: Manipulation (Sweep) below Recent Low
-        if bias == "BULLISH":
-            # TIER 1 FILTER: Deep Discount Price Quartile (0.00-0.25)
-            in_deep_discount = False
-            if price_quartiles:
-                ref_range = price_quartiles.get("Asian Range") or price_quartiles.get("CBDR")
-                if ref_range:
-                    price_position = (current['close'] - ref_range['low']) / (ref_range['high'] - ref_range['low'])
-                    # Must be in 0.00-0.25 range (Deep Discount)
-                    if Config.MIN_PRICE_QUARTILE <= price_position <= Config.MAX_PRICE_QUARTILE:
-                        in_deep_discount = True
+        if signal_direction == BULLISH:
+            # LEVEL 2 DEPTH FILTER: Validate sweep had institutional absorption
+            has_depth = self.validate_sweep_depth(symbol, swept_level, 'LONG')
+            
+            if not has_depth:
+                logger.info(f"❌ Rejected: Sweep lacks depth (Retail Dust). Swept level: ${swept_level:,.2f}")
+                return None
             
-            # TIER 1 FILTER: Strong SMT Divergence (DXY Correlation)
-            smt_strength = 0.0
-            if index_context:
-                # Use DXY (Dollar Index) as the Institutional Truth
-                dxy_data = index_context.get('DXY', {})
-                if dxy_data:
-                    dxy_change = dxy_data.get('change_5m', 0)
-                    # Institutional Sponsorship: BTC refuses to drop when DXY pumps.
-                    # Or DXY dumps and BTC pumps (Confluence).
-                    # We measure the MAGNITUDE of the DXY move.
-                    smt_strength = abs(dxy_change) / 0.1  # Normalize: 0.1% move = 1.0 Strength
+            # ATR-DYNAMIC TARGETING: Adjust for volatility
+            london_range = price_quartiles.get("London Range") or price_quartiles.get("Asian Range")
+            atr_stats = self.get_atr_stats(symbol, df)
+            target = self.get_volatility_adjusted_target(df, 'LONG', current['close'], london_range, atr_stats=atr_stats)
             
-            has_strong_smt = smt_strength >= Config.MIN_SMT_STRENGTH
+            if not target:
+                target = self.get_next_institutional_target(df, "LONG", current['close'], pools=pools)
+
+            # STRATEGY: WIDE NET (ATR-Based Stops & Split Targets)
+            # Calculate ATR for dynamic stop loss (streaming state, no recompute)
+            atr = atr_stats[0]
+            if pd.isna(atr):
+                atr = current['close'] * 0.005 # Fallback
             
-            # HYBRID SWEEP: Check 24h Low (PDL) OR London Low (Session Inducement)
-            # Must sweep BELOW the low, but Close ABOVE it (Judas Swing)
-            swept_pdl = current['low'] < recent_low and current['close'] > recent_low
+            stop_buffer = atr * Config.STOP_LOSS_ATR_MULTIPLIER
             
-            swept_london = False
-            if price_quartiles and "London Range" in price_quartiles:
-                london_low = price_quartiles["London Range"]["low"]
-                swept_london = current['low'] < london_low and current['close'] > london_low
-
-            if in_deep_discount and has_strong_smt and (swept_pdl or swept_london):
-                # LEVEL 2 DEPTH FILTER: Validate sweep had institutional absorption
-                swept_level = recent_low if swept_pdl else (price_quartiles["London Range"]["low"] if swept_london else recent_low)
-                has_depth = self.validate_sweep_depth(symbol, swept_level, 'LONG')
-                
-                if not has_depth:
-                    logger.info(f"❌ Rejected: Sweep lacks depth (Retail Dust). Swept level: ${swept_level:,.2f}")
-                    return None
-                
-                # ATR-DYNAMIC TARGETING: Adjust for volatility
-                london_range = price_quartiles.get("London Range") or price_quartiles.get("Asian Range")
-                target = self.get_volatility_adjusted_target(df, 'LONG', current['close'], london_range)
-                
-                if not target:
-                    target = self.get_next_institutional_target(df, "LONG", current['close'])
-
-                # STRATEGY: WIDE NET (ATR-Based Stops & Split Targets)
-                # Calculate ATR for dynamic stop loss
-                atr = self.calculate_atr(df).iloc[-1]
-                if pd.isna(atr):
-                    atr = current['close'] * 0.005 # Fallback
-                
-                stop_buffer = atr * Config.STOP_LOSS_ATR_MULTIPLIER
-                
-                direction = 'LONG'
-                stop_loss = current['close'] - stop_buffer
-                risk = current['close'] - stop_loss
-                target = current['close'] + (risk * Config.TP2_R_MULTIPLE) # We target TP2 for the main signal
-
-                # TRINITY OF SPONSORSHIP: Cross-Asset Divergence
-                cross_asset_div = self.intermarket.calculate_cross_asset_divergence('LONG', index_context)
-
-                setup = {
-                    "timestamp": current['timestamp'].isoformat() if hasattr(current['timestamp'], 'isoformat') else str(current['timestamp']),
-                    "symbol": symbol,
-                    "pattern": "Bullish PO3 (Judas Swing)",
-                    "bias": bias,
-                    "entry": current['close'],
-                    "stop_loss": stop_loss,
-                    "target": target, # Original target logic
-                    'tp1': current['close'] + (risk * Config.TP1_R_MULTIPLE),
-                    'direction': direction,
-                    "time_quartile": time_quartile,
-                    "price_quartiles": price_quartiles,
-                    "index_context": index_context,
-                    "smt_strength": round(smt_strength, 2),
-                    "cross_asset_divergence": round(cross_asset_div, 2),
-                    "news_context": news_context,
-                    "is_discount": True,
-                    'risk_reward': Config.TP2_R_MULTIPLE # Fixed at 3R for Runner
-                }
+            direction = 'LONG'
+            stop_loss = current['close'] - stop_buffer
+            risk = current['close'] - stop_loss
+            target = current['close'] + (risk * Config.TP2_R_MULTIPLE) # We target TP2 for the main signal
+
+            # TRINITY OF SPONSORSHIP: Cross-Asset Divergence
+            cross_asset_div = self.intermarket.calculate_cross_asset_divergence('LONG', index_context)
+
+            setup = {
+                "timestamp": current['timestamp'].isoformat() if hasattr(current['timestamp'], 'isoformat') else str(current['timestamp']),
+                "symbol": symbol,
+                "pattern": "Bullish PO3 (Judas Swing)",
+                "bias": bias,
+                "entry": current['close'],
+                "stop_loss": stop_loss,
+                "target": target, # Original target logic
+                'tp1': current['close'] + (risk * Config.TP1_R_MULTIPLE),
+                'direction': direction,
+                "time_quartile": time_quartile,
+                "price_quartiles": price_quartiles,
+                "index_context": index_context,
+                "smt_strength": round(smt_strength, 2),
+                "cross_asset_divergence": round(cross_asset_div, 2),
+                "news_context": news_context,
+                "is_discount": True,
+                'risk_reward': Config.TP2_R_MULTIPLE # Fixed at 3R for Runner
+            }
 
         # BEARISH Setup: Manipulation (Sweep) above Recent High
-        elif bias == "BEARISH":
-            # TIER 1 FILTER: Premium Price Quartile (0.65-1.00)
-            in_premium = False
-            if price_quartiles:
-                ref_range = price_quartiles.get("Asian Range") or price_quartiles.get("CBDR")
-                if ref_range:
-                    price_position = (current['close'] - ref_range['low']) / (ref_range['high'] - ref_range['low'])
-                    # Must be in premium range
-                    if Config.MIN_PRICE_QUARTILE_SHORT <= price_position <= Config.MAX_PRICE_QUARTILE_SHORT:
-                        in_premium = True
+        elif signal_direction == BEARISH:
+            # LEVEL 2 DEPTH FILTER: Validate sweep had institutional absorption
+            has_depth = self.validate_sweep_depth(symbol, swept_level, 'SHORT')
+            
+            if not has_depth:
+                logger.info(f"❌ Rejected: Sweep lacks depth (Retail Dust). Swept level: ${swept_level:,.2f}")
+                return None
             
-            # TIER 1 FILTER: Strong SMT Divergence (DXY Correlation)
-            smt_strength = 0.0
-            if index_context:
-                dxy_data = index_context.get('DXY', {})
-                if dxy_data:
-                    dxy_change = dxy_data.get('change_5m', 0)
-                    smt_strength = abs(dxy_change) / 0.1
+            # ATR-DYNAMIC TARGETING: Adjust for volatility
+            london_range = price_quartiles.get("London Range") or price_quartiles.get("Asian Range")
+            atr_stats = self.get_atr_stats(symbol, df)
+            target = self.get_volatility_adjusted_target(df, 'SHORT', current['close'], london_range, atr_stats=atr_stats)
             
-            has_strong_smt = smt_strength >= Config.MIN_SMT_STRENGTH
+            if not target:
+                target = self.get_next_institutional_target(df, "SHORT", current['close'], pools=pools)
             
-            # HYBRID SWEEP: Check 24h High (PDH) OR London High (Session Inducement)
-            # Must sweep ABOVE the high, but Close BELOW it (Judas Swing)
-            swept_pdh = current['high'] > recent_high and current['close'] < recent_high
+            # STRATEGY: WIDE NET (ATR-Based Stops & Split Targets)
+            atr = atr_stats[0]
+            if pd.isna(atr):
+                atr = current['close'] * 0.005
             
-            swept_london = False
-            if price_quartiles and "London Range" in price_quartiles:
-                london_high = price_quartiles["London Range"]["high"]
-                swept_london = current['high'] > london_high and current['close'] < london_high
-
-            if in_premium and has_strong_smt and (swept_pdh or swept_london):
-                # LEVEL 2 DEPTH FILTER: Validate sweep had institutional absorption
-                swept_level = recent_high if swept_pdh else (price_quartiles["London Range"]["high"] if swept_london else recent_high)
-                has_depth = self.validate_sweep_depth(symbol, swept_level, 'SHORT')
-                
-                if not has_depth:
-                    logger.info(f"❌ Rejected: Sweep lacks depth (Retail Dust). Swept level: ${swept_level:,.2f}")
-                    return None
-                
-                # ATR-DYNAMIC TARGETING: Adjust for volatility
-                london_range = price_quartiles.get("London Range") or price_quartiles.get("Asian Range")
-                target = self.get_volatility_adjusted_target(df, 'SHORT', current['close'], london_range)
-                
-                if not target:
-                    target = self.get_next_institutional_target(df, "SHORT", current['close'])
-                
-                # STRATEGY: WIDE NET (ATR-Based Stops & Split Targets)
-                atr = self.calculate_atr(df).iloc[-1]
-                if pd.isna(atr):
-                    atr = current['close'] * 0.005
-                
-                stop_buffer = atr * Config.STOP_LOSS_ATR_MULTIPLIER
-                
-                direction = 'SHORT'
-                stop_loss = current['close'] + stop_buffer
-                risk = stop_loss - current['close']
-                target = current['close'] - (risk * Config.TP2_R_MULTIPLE)
+            stop_buffer = atr * Config.STOP_LOSS_ATR_MULTIPLIER
+            
+            direction = 'SHORT'
+            stop_loss = current['close'] + stop_buffer
+            risk = stop_loss - current['close']
+            target = current['close'] - (risk * Config.TP2_R_MULTIPLE)
 
-                # TRINITY OF SPONSORSHIP: Cross-Asset Divergence
-                cross_asset_div = self.intermarket.calculate_cross_asset_divergence('SHORT', index_context)
-                
-                setup = {
-                    "symbol": symbol,
-                    "pattern": "Bearish PO3 (Judas Swing)",
-                    "bias": bias,
-                    "entry": current['close'],
-                    "stop_loss": stop_loss,
-                    "target": target,
-                    'tp1': current['close'] - (risk * Config.TP1_R_MULTIPLE),
-                    'direction': direction,
-                    "time_quartile": time_quartile,
-                    "price_quartiles": price_quartiles,
-                    "index_context": index_context,
-                    "smt_strength": round(smt_strength, 2),
-                    "cross_asset_divergence": round(cross_asset_div, 2),
-                    "news_context": news_context,
-                    "is_premium": True,
-                    'risk_reward': Config.TP2_R_MULTIPLE
-                }
+            # TRINITY OF SPONSORSHIP: Cross-Asset Divergence
+            cross_asset_div = self.intermarket.calculate_cross_asset_divergence('SHORT', index_context)
+            
+            setup = {
+                "symbol": symbol,
+                "pattern": "Bearish PO3 (Judas Swing)",
+                "bias": bias,
+                "entry": current['close'],
+                "stop_loss": stop_loss,
+                "target": target,
+                'tp1': current['close'] - (risk * Config.TP1_R_MULTIPLE),
+                'direction': direction,
+                "time_quartile": time_quartile,
+                "price_quartiles": price_quartiles,
+                "index_context": index_context,
+                "smt_strength": round(smt_strength, 2),
+                "cross_asset_divergence": round(cross_asset_div, 2),
+                "news_context": news_context,
+                "is_premium": True,
+                'risk_reward': Config.TP2_R_MULTIPLE
+            }
 
 
 
@@ -3,6 +3,14 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import copy
+import random
+from candle_store import CandleStore
+from indicators import calculate_atr
+from exit_engine import ExitPolicy, resolve_policy
+from signal_kernel import evaluate_signals, candidate_indices, BULLISH, BACKTEST_REF
+from feature_store import FeatureStore
+from run_registry import RunRegistry
 from config import Config
 
 class SniperBacktest:
@@ -12,51 +20,39 @@ class SniperBacktest:
     Ultra-strict filters for high-expectancy precision trades.
     Target: 3-4% monthly with minimal drawdown.
     """
-    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06'):
+    # 50% @ 1.5R, 50% @ 3R, stop to breakeven after TP1, targets checked first,
+    # one TP leg per candle (the TP1 candle never also fills TP2 or stops out)
+    EXIT_POLICY = ExitPolicy(((1.5, 0.5), (3.0, 0.5)), breakeven_after=0,
+                             timeout=288, timeout_exit='flat', stop_first=False,
+                             one_leg_per_candle=True)
+    
+    def __init__(self, symbol='BTC/USDT', start_date='2025-01-06', end_date='2026-01-06', exchange=None, seed=42):
         self.symbol = symbol
         self.start_date = start_date
         self.end_date = end_date
-        self.exchange = ccxt.binance({'enableRateLimit': True})
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
         self.trades = []
+        self.features = FeatureStore(self.store)  # Persisted bias/ADX/ATR/session columns
+        self.sessions = None  # Per-candle feature table (session ranges, bias, ATR) for this run
         self.equity_curve = [100.0]  # Start with $100
+        self.seed = seed  # Human-factor RNG seed (None = fresh randomness every run, never cached)
         
     def fetch_historical_data(self):
-        """Fetches 5m OHLCV data for the entire period."""
-        print(f"📥 Fetching {self.symbol} data from {self.start_date} to {self.end_date}...")
+        """Loads 5m OHLCV data for the entire period from the local candle store."""
+        print(f"📥 Loading {self.symbol} data from {self.start_date} to {self.end_date}...")
         
         start_ts = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
         end_ts = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
         
-        all_data = []
-        current_ts = start_ts
-        
-        while current_ts < end_ts:
-            try:
-                ohlcv = self.exchange.fetch_ohlcv(self.symbol, '5m', since=current_ts, limit=1000)
-                if not ohlcv:
-                    break
-                all_data.extend(ohlcv)
-                current_ts = ohlcv[-1][0] + 1
-            except Exception as e:
-                print(f"Error: {e}")
-                break
-                
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df = df.drop_duplicates(subset='timestamp')
+        df = self.store.load(self.symbol, '5m', start_ts, end_ts)
         
-        print(f"✅ Fetched {len(df)} candles")
+        print(f"✅ Loaded {len(df)} candles")
         return df
     
     def calculate_atr(self, df, period=14):
         """Calculate ATR for volatility."""
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = np.max(ranges, axis=1)
-        return true_range.rolling(period).mean()
+        return calculate_atr(df, period)
     
     def get_1h_trend(self, df, idx):
         """Determines 1H trend using EMA crossover."""
@@ -80,287 +76,122 @@ class SniperBacktest:
             return "BEARISH"
         return "NEUTRAL"
     
-    def get_4h_bias(self, df, idx):
-        """Determines HTF Trend Bias using EMA crossover."""
-        # Need 50 4H candles for EMA50. 50 * 48 = 2400 5m candles.
-        lookback = min(6000, idx)
-        if lookback < 2500:
-            return "NEUTRAL"
-        
-        df_4h = df.iloc[max(0, idx-lookback):idx].copy()
-        df_4h = df_4h.iloc[::48]  # Resample to 4H
-        
-        df_4h['ema_20'] = df_4h['close'].ewm(span=20).mean()
-        df_4h['ema_50'] = df_4h['close'].ewm(span=50).mean()
-        
-        if len(df_4h) < 50:
-            return "NEUTRAL"
-        
-        latest = df_4h.iloc[-1]
-        if latest['ema_20'] > latest['ema_50']:
-            return "BULLISH"
-        elif latest['ema_20'] < latest['ema_50']:
-            return "BEARISH"
-        return "NEUTRAL"
-    
-    def is_killzone(self, hour):
-        """Check if hour is within NY continuous session."""
-        return Config.KILLZONE_NY_CONTINUOUS[0] <= hour < Config.KILLZONE_NY_CONTINUOUS[1]
-    
-    def get_price_quartiles(self, df, idx):
-        """Calculate Asian/London range quartiles."""
-        lookback_start = max(0, idx - 288)
-        recent_df = df.iloc[lookback_start:idx].copy()
-        
-        asian_df = recent_df[(recent_df['timestamp'].dt.hour >= 0) & (recent_df['timestamp'].dt.hour < 5)]
-        london_df = recent_df[(recent_df['timestamp'].dt.hour >= 7) & (recent_df['timestamp'].dt.hour < 10)]
-        
-        ranges = {}
-        for name, data in [("Asian Range", asian_df), ("London Range", london_df)]:
-            if data.empty:
-                continue
-            r_high = data['high'].max()
-            r_low = data['low'].min()
-            r_diff = r_high - r_low
-            
-            ranges[name] = {
-                "high": r_high,
-                "low": r_low,
-                "sd_1_pos": r_high + r_diff,
-                "sd_1_neg": r_low - r_diff
-            }
-        
-        return ranges
-    
-    def check_sweep_and_entry(self, current, recent_high, recent_low, london_high, london_low, bias):
-        """Check if current candle swept liquidity and closed back."""
-        if bias == "BULLISH":
-            swept_pdl = current['low'] < recent_low and current['close'] > recent_low
-            swept_london = False
-            if london_low is not None:
-                swept_london = current['low'] < london_low and current['close'] > london_low
-            return swept_pdl or swept_london
-        
-        elif bias == "BEARISH":
-            swept_pdh = current['high'] > recent_high and current['close'] < recent_high
-            swept_london = False
-            if london_high is not None:
-                swept_london = current['high'] > london_high and current['close'] < london_high
-            return swept_pdh or swept_london
-        
-        return False
-    
     def check_outcome_partial_exits(self, entry, stop, target_2r, target_4r, df, entry_idx, bias):
         """
-        SNIPER EXIT LOGIC:
-        - Close 50% at 2R
-        - Close 50% at 4R
-        - Move stop to breakeven after 2R hit
-        """
-        is_long = bias == "BULLISH"
-        max_lookahead = min(288, len(df) - entry_idx - 1)
-        
-        tp1_hit = False
-        tp1_idx = None
-        breakeven_stop = entry
+        SNIPER EXIT LOGIC (single trade; run_backtest resolves in batch):
+        - Close 50% at TP1
+        - Close 50% at TP2
+        - Move stop to breakeven after TP1 hit
         
-        total_pnl = 0.0
-        
-        for i in range(1, max_lookahead + 1):
-            future_idx = entry_idx + i
-            if future_idx >= len(df):
-                break
-                
-            candle = df.iloc[future_idx]
-            
-            # Check TP1 (2R) first
-            if not tp1_hit:
-                if is_long:
-                    if candle['high'] >= target_2r:
-                        # TP1 hit - close 50% at 2R
-                        tp1_hit = True
-                        tp1_idx = i
-                        risk = entry - stop
-                        tp1_pnl = (2 * risk) * 0.5  # 50% of position at 2R
-                        total_pnl += tp1_pnl
-                        # Move stop to breakeven
-                        breakeven_stop = entry
-                        continue
-                    elif candle['low'] <= stop:
-                        # Stop hit before TP1
-                        risk = entry - stop
-                        return ('LOSS', -risk, i, total_pnl)
-                else:
-                    if candle['low'] <= target_2r:
-                        tp1_hit = True
-                        tp1_idx = i
-                        risk = stop - entry
-                        tp1_pnl = (2 * risk) * 0.5
-                        total_pnl += tp1_pnl
-                        breakeven_stop = entry
-                        continue
-                    elif candle['high'] >= stop:
-                        risk = stop - entry
-                        return ('LOSS', -risk, i, total_pnl)
-            
-            # After TP1 hit, check TP2 (4R) or breakeven stop
-            else:
-                if is_long:
-                    if candle['high'] >= target_4r:
-                        # TP2 hit - close remaining 50% at 4R
-                        risk = entry - stop
-                        tp2_pnl = (4 * risk) * 0.5
-                        total_pnl += tp2_pnl
-                        return ('FULL_WIN', total_pnl, i, total_pnl)
-                    elif candle['low'] <= breakeven_stop:
-                        # Breakeven stop hit - remaining 50% exits at breakeven
-                        return ('PARTIAL_WIN', total_pnl, i, total_pnl)
-                else:
-                    if candle['low'] <= target_4r:
-                        risk = stop - entry
-                        tp2_pnl = (4 * risk) * 0.5
-                        total_pnl += tp2_pnl
-                        return ('FULL_WIN', total_pnl, i, total_pnl)
-                    elif candle['high'] >= breakeven_stop:
-                        return ('PARTIAL_WIN', total_pnl, i, total_pnl)
-        
-        # Timeout
-        if tp1_hit:
-            return ('TIMEOUT_PARTIAL', total_pnl, max_lookahead, total_pnl)
-        else:
-            return ('TIMEOUT', 0, max_lookahead, 0)
+        Returns (outcome, pnl in price units, hold candles, pnl in price units).
+        """
+        risk = abs(entry - stop)
+        policy = copy.copy(self.EXIT_POLICY)
+        policy.tp_ladder = ((abs(target_2r - entry) / risk, 0.5), (abs(target_4r - entry) / risk, 0.5))
+        exits = resolve_policy(df['high'], df['low'], df['close'], [entry_idx],
+                               [1 if bias == "BULLISH" else -1], [entry], [stop], policy)
+        pnl = float(exits['r_multiple'][0]) * risk
+        return (str(exits['outcome'][0]), pnl, int(exits['hold'][0]), pnl)
+    
+    def compute_signals(self, df):
+        """Sniper entry gates (shared signal kernel) for every candle of the history."""
+        return evaluate_signals(
+            df['timestamp'], df['high'], df['low'], df['close'],
+            self.sessions['bias'], self.sessions, ref=BACKTEST_REF,
+            long_zone=(0.0, 0.55),   # Slightly relaxed
+            short_zone=(0.45, 1.0),  # Slightly relaxed
+            mask=df['atr'].notna().to_numpy(),  # SNIPER FILTER 5: ATR available
+        )
     
     def run_backtest(self):
         """Runs SNIPER backtest with Survivor Protocol filters."""
         df = self.fetch_historical_data()
-        df['atr'] = self.calculate_atr(df)
+        self.sessions = self.features.get(self.symbol, df)  # Computed once per data range, then joined
+        df['atr'] = self.sessions['atr']
         
         print(f"\n🎯 Running SNIPER BOT Backtest (Survivor Protocol)...")
         print(f"⚙️  Filters: SMT >0.75 | High Vol | Mon/Wed/Sun | 1H Trend Aligned")
-        print(f"⚙️  Exits: 50% @ 2R | 50% @ 4R | Breakeven after TP1")
+        print(f"⚙️  Exits: 50% @ 1.5R | 50% @ 3R | Breakeven after TP1")
         
         trade_count = 0
         current_equity = 100.0  # Starting capital
         
-        # Allowed days: Monday=0, Wednesday=2, Sunday=6
-        allowed_days = [0, 2, 6]
+        # SNIPER FILTERS 1, 2, 4, 8: Killzone, 4H Bias, Quartiles, Sweep (one vectorized pass)
+        signals = self.compute_signals(df)
         
-        for idx in range(1000, len(df) - 300):
+        rng = random.Random(self.seed)
+        risk_pct = 0.01  # 1% risk
+        setups = []
+        
+        for idx in candidate_indices(signals, 1000, len(df) - 300):
             current = df.iloc[idx]
-            hour = current['timestamp'].hour
-            day_of_week = current['timestamp'].dayofweek
-            
-            # SNIPER FILTER 1: Killzone
-            if not self.is_killzone(hour):
-                continue
-            
-            # SNIPER FILTER 5: High Volatility Only (REMOVED - Too strict)
-            current_atr = current['atr']
-            if pd.isna(current_atr):
-                continue
-            # if current_atr <= df['atr'].median():
-            #     continue
-            
-            # SNIPER FILTER 2: 4H Bias
-            bias_4h = self.get_4h_bias(df, idx)
-            if bias_4h == "NEUTRAL":
-                continue
+            bias_4h = "BULLISH" if signals['direction'][idx] == BULLISH else "BEARISH"
             
             # SNIPER FILTER 3: 1H Trend Alignment (REMOVED - Blocks reversals)
             # trend_1h = self.get_1h_trend(df, idx)
             # if trend_1h != bias_4h:
             #    continue
             
-            # SNIPER FILTER 4: Price Quartiles
-            price_quartiles = self.get_price_quartiles(df, idx)
-            if not price_quartiles:
-                continue
-            
-            ref_range = price_quartiles.get("Asian Range") or price_quartiles.get("London Range")
-            if not ref_range:
-                continue
-            
-            price_position = (current['close'] - ref_range['low']) / (ref_range['high'] - ref_range['low'])
-            
-            # Check if in valid zone
-            if bias_4h == "BULLISH":
-                if not (0.0 <= price_position <= 0.55): # Slightly relaxed
-                    continue
-            else:
-                if not (0.45 <= price_position <= 1.0): # Slightly relaxed
-                    continue
-            
-            # SNIPER FILTER 8: Liquidity Sweep Check
-            recent_high = df['high'].iloc[max(0, idx-288):idx].max()
-            recent_low = df['low'].iloc[max(0, idx-288):idx].min()
-            
-            london_high = price_quartiles.get("London Range", {}).get("high")
-            london_low = price_quartiles.get("London Range", {}).get("low")
-            
-            swept = self.check_sweep_and_entry(current, recent_high, recent_low, london_high, london_low, bias_4h)
-            if not swept:
-                continue
-            
             # ENTRY FOUND - Setup trade
             entry = current['close']
             
             # --- HUMAN FACTOR SIMULATION (REALITY CHECK) ---
-            import random
             
             # 1. THE "LIFE HAPPENS" FILTER (Missing Alerts / Sleep / Driving)
-            if random.random() < 0.25: # 25% of alerts are missed
+            if rng.random() < 0.25: # 25% of alerts are missed
                 continue
-                
-            risk_pct = 0.01  # 1% risk
             
             # 2. THE "FAT FINGER" ERROR (Execution Error / Slippage)
-            is_execution_error = False
-            if random.random() < 0.05: # 5% of trades are botched entries
-                is_execution_error = True
+            is_execution_error = rng.random() < 0.05 # 5% of trades are botched entries
                 
             # WIDE NET STRATEGY: Use ATR for Stop Loss (Breathing Room)
             atr = current['atr'] if not pd.isna(current['atr']) else entry * 0.005
             stop_buffer = atr * 2.0  # 2x ATR Buffer to avoid wick-outs
             
-            if bias_4h == "BULLISH":
-                stop = entry - stop_buffer
-                risk_dollars = entry - stop
-                target_1_5r = entry + (risk_dollars * 1.5) # Lower TP1 to bag wins
-                target_3r = entry + (risk_dollars * 3.0)
-            else:
-                stop = entry + stop_buffer
-                risk_dollars = stop - entry
-                target_1_5r = entry - (risk_dollars * 1.5)
-                target_3r = entry - (risk_dollars * 3.0)
+            # Edge case: no risk distance
+            if stop_buffer == 0:
+                continue
+            
+            stop = entry - stop_buffer if bias_4h == "BULLISH" else entry + stop_buffer
+            setups.append((idx, bias_4h, entry, stop, is_execution_error))
+        
+        # VERIFY OUTCOMES with partial exits (TP ladder + breakeven), all trades in one batch
+        exits = resolve_policy(
+            df['high'], df['low'], df['close'],
+            [setup[0] for setup in setups],
+            [1 if setup[1] == "BULLISH" else -1 for setup in setups],
+            [setup[2] for setup in setups],
+            [setup[3] for setup in setups],
+            self.EXIT_POLICY,
+        )
+        
+        for k, (idx, bias_4h, entry, stop, is_execution_error) in enumerate(setups):
+            risk_distance = abs(entry - stop)
+            sign = 1 if bias_4h == "BULLISH" else -1
+            target_1_5r = entry + sign * risk_distance * 1.5 # Lower TP1 to bag wins
+            target_3r = entry + sign * risk_distance * 3.0
             
-            # VERIFY OUTCOME with partial exits
-            outcome, pnl_dollars, hold_candles, net_pnl = self.check_outcome_partial_exits(
-                entry, stop, target_1_5r, target_3r, df, idx, bias_4h
-            )
+            outcome = str(exits['outcome'][k])
+            r_multiple = float(exits['r_multiple'][k])
+            hold_candles = int(exits['hold'][k])
             
             # 3. THE "WEAK HANDS" PSYCHOLOGY (Cutting Winners Early)
             # If it was a WIN, 15% chance we panicked and closed at 0.5R
             if 'WIN' in outcome:
-                 if random.random() < 0.15:
-                     risk_amt = abs(entry - stop)
-                     net_pnl = risk_amt * 0.5 # Manually override gain to small 0.5R
+                 if rng.random() < 0.15:
+                     r_multiple = 0.5 # Manually override gain to small 0.5R
                      outcome = "WEAK_HAND_EXIT"
             
             # Apply Execution Error (Botched Trade)
             if is_execution_error:
                 outcome = "EXECUTION_ERROR"
-                net_pnl = -abs(entry - stop) # Full 1R Loss
+                r_multiple = -1.0 # Full 1R Loss
             
             # Calculate PnL based on Risk-Based Sizing (SMC Standard)
             # We risk 1% of Equity per trade.
             # Position Size = (Equity * 0.01) / Risk_Distance
             # Gain = R_Multiple * 1%
-            
-            risk_distance = abs(entry - stop)
-            if risk_distance == 0:
-                continue # Edge case
-                
-            r_multiple = net_pnl / risk_distance
+            net_pnl = r_multiple * risk_distance
             equity_change_pct = r_multiple * (risk_pct * 100)
             
             current_equity *= (1 + equity_change_pct / 100)
@@ -368,7 +199,7 @@ class SniperBacktest:
             
             trade_count += 1
             self.trades.append({
-                'timestamp': current['timestamp'],
+                'timestamp': df['timestamp'].iloc[idx],
                 'bias': bias_4h,
                 'entry': entry,
                 'stop': stop,
@@ -437,7 +268,7 @@ if __name__ == "__main__":
         end_date='2026-01-06'
     )
     
-    results = engine.run_backtest()
+    results = RunRegistry().run_backtest(engine)  # Cached when nothing changed
     
     print("\n" + "="*60)
     print("🎯 SNIPER BOT RESULTS (Survivor Protocol)")
@@ -0,0 +1,126 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from candle_store import timeframe_to_ms
+from session_ranges import session_levels
+from signal_kernel import evaluate_signals, BIAS_CODES, NEUTRAL, LIVE_REF
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Quote-pegged bases never produce setups
+STABLE_BASES = {'USDC', 'FDUSD', 'TUSD', 'BUSD', 'USDP', 'DAI', 'USDE', 'EUR', 'AEUR', 'EURI'}
+
+def top_symbols_by_volume(tickers, size=None, quote='USDT'):
+    """Top `size` (default: all) spot <BASE>/<quote> symbols by 24h quote volume from a fetch_tickers() dict."""
+    ranked = []
+    for symbol, ticker in tickers.items():
+        base, _, symbol_quote = symbol.partition('/')
+        if symbol_quote != quote or base in STABLE_BASES:
+            continue
+        ranked.append((ticker.get('quoteVolume') or 0.0, symbol))
+    ranked.sort(reverse=True)
+    return [symbol for _, symbol in ranked[:size]]
+
+class UniverseScanner:
+    """
+    Universe Mode: scans the top-N USDT pairs in two tiers.
+
+    Tier 1 (every symbol): killzone and SMT are checked once for the whole
+    universe, then the latest candles come from the incremental candle cache
+    (one since=last_ts request per symbol, concurrently through the shared
+    throttle), HTF bias from the resampled 4H view (no extra request) and
+    session levels from the per-symbol trackers. The entry gates then run as
+    ONE evaluate_signals call over all symbols.
+
+    Tier 2 (survivors only): the caller runs scan_pattern (order book,
+    targeting) and the chart/AI steps for the few symbols left.
+    """
+    _ranking = {}  # (exchange id, quote) -> (fetched_at_ms, full ranking), shared on a warm container
+
+    def __init__(self, scanner, size=None, quote=None, workers=None):
+        self.scanner = scanner
+        self.size = size or Config.UNIVERSE_SIZE
+        self.quote = quote or Config.UNIVERSE_QUOTE
+        self.workers = workers or Config.SCAN_WORKERS
+
+    def universe(self):
+        """Top-N symbols by 24h quote volume (one fetch_tickers call per refresh window)."""
+        exchange = self.scanner.exchange
+        key = (getattr(exchange, 'id', 'exchange'), self.quote)
+        now_ms = exchange.milliseconds()
+        fetched_at, symbols = self._ranking.get(key, (None, None))
+        if (fetched_at is None or now_ms < fetched_at
+                or now_ms - fetched_at >= Config.UNIVERSE_REFRESH_MINUTES * 60 * 1000):
+            symbols = top_symbols_by_volume(exchange.fetch_tickers(), quote=self.quote)
+            self._ranking[key] = (now_ms, symbols)
+            logger.info(f"🌐 Universe refreshed: {len(symbols)} {self.quote} pairs")
+        return symbols[:self.size]
+
+    def _snapshot(self, symbol, timeframe):
+        """Latest candle, HTF bias and session levels for one symbol (cache-backed)."""
+        scanner = self.scanner
+        df = scanner.fetch_data(symbol, timeframe)
+        if df is None or df.empty:
+            return None
+        price_quartiles = scanner.get_price_quartiles(symbol, df)
+        sessions = scanner.session_trackers[symbol]
+        recent_high, recent_low = sessions.previous_day(timeframe_to_ms(timeframe))
+        current = df.iloc[-1]
+        return {
+            'ts': sessions.last_ts,
+            'high': current['high'],
+            'low': current['low'],
+            'close': current['close'],
+            'bias': BIAS_CODES.get(scanner.get_4h_bias(symbol), NEUTRAL),
+            'levels': session_levels(price_quartiles, recent_high, recent_low),
+        }
+
+    def prefilter(self, cached_context=None, symbols=None, timeframe=None):
+        """
+        Tier 1 for the whole universe.
+
+        Returns:
+            List of symbols whose latest candle passes every cheap entry gate
+        """
+        timeframe = timeframe or Config.TIMEFRAME
+        scanner = self.scanner
+
+        # Universe-wide gates first: nothing is fetched outside the killzone
+        if not scanner.is_killzone():
+            return []
+        if cached_context and 'intermarket' in cached_context:
+            index_context = cached_context['intermarket']
+        else:
+            index_context = scanner.intermarket.get_market_context()
+        smt_strength = scanner.get_smt_strength(index_context)
+        if smt_strength < Config.MIN_SMT_STRENGTH:
+            return []
+
+        symbols = symbols if symbols is not None else self.universe()
+
+        def snapshot(symbol):
+            try:
+                return self._snapshot(symbol, timeframe)
+            except Exception as e:
+                logger.warning(f"Universe snapshot failed for {symbol}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(symbols) or 1))) as pool:
+            snapshots = list(pool.map(snapshot, symbols))
+        rows = [(symbol, snap) for symbol, snap in zip(symbols, snapshots) if snap is not None]
+        if not rows:
+            return []
+
+        # Entry gates for every symbol in one kernel call
+        level_keys = set().union(*(snap['levels'] for _, snap in rows))
+        levels = {key: np.array([snap['levels'].get(key, np.nan) for _, snap in rows], dtype='float64')
+                  for key in level_keys}
+        column = lambda name: np.array([snap[name] for _, snap in rows])
+        signals = evaluate_signals(
+            column('ts'), column('high'), column('low'), column('close'), column('bias'),
+            levels, smt=smt_strength, ref=LIVE_REF,
+        )
+        survivors = [symbol for (symbol, _), direction in zip(rows, signals['direction']) if direction]
+        logger.info(f"🌐 Universe tier 1: {len(survivors)}/{len(symbols)} symbols passed")
+        return survivors
@@ -1,99 +1,114 @@
+import sys
 import ccxt
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from candle_store import CandleStore
+from session_clock import HOUR_MS, _as_ms, label_sessions
+from session_ranges import PDH_LOOKBACK, build_session_table
+from signal_kernel import sweep_flags
+from config import Config
 
-def fetch_data(symbol, days=30):
-    print(f"📥 Fetching {symbol} data for last {days} days...")
-    exchange = ccxt.binance({'enableRateLimit': True})
+def fetch_data(symbol, days=30, exchange=None):
+    print(f"📥 Loading {symbol} data for last {days} days...")
+    exchange = exchange or ccxt.binance({'enableRateLimit': True})
     
-    since = exchange.parse8601((datetime.utcnow() - timedelta(days=days)).isoformat())
-    all_data = []
-    
-    while True:
-        ohlcv = exchange.fetch_ohlcv(symbol, '5m', since=since, limit=1000)
-        if not ohlcv: break
-        since = ohlcv[-1][0] + 1
-        all_data.extend(ohlcv)
-        if since > datetime.utcnow().timestamp() * 1000: break
-        
-    df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    return df
+    end_ts = exchange.milliseconds()
+    start_ts = end_ts - days * 24 * 60 * 60 * 1000
+    return CandleStore(exchange).load(symbol, '5m', start_ts, end_ts)
 
-def scan_hybrid_sweeps(df):
-    setups = 0
-    df = df.copy()
-    
-    # Pre-calculate rolling 24h High/Low (288 periods)
-    df['pdh'] = df['high'].rolling(288).max().shift(1)
-    df['pdl'] = df['low'].rolling(288).min().shift(1)
+def hybrid_sweep_signals(df, session_hours=(12, 20), lookback=PDH_LOOKBACK):
+    """
+    Hybrid sweeps for every candle as boolean arrays (no per-row loop).
+
+    Bearish: high above the PDH (or the London high), close back below.
+    Bullish: low below the PDL (or the London low), close back above.
+    Levels are the backtests' session table (build_session_table: PDH/PDL
+    over the previous `lookback` candles, latest London range known at the
+    candle) and the sweeps are the signal kernel's (sweep_flags), so the
+    count measures exactly what evaluate_signals gates on, before bias and
+    price-quartile filters.
+
+    Versus the old per-row scan: the PDH/PDL window is the `lookback`
+    candles before the candle (the old rolling max read one row back
+    covered [i-289, i-2]), and a day without London candles keeps the
+    previous London range (under 24h old) where the old scan had none.
+    """
+    ts_ms = _as_ms(df['timestamp'])
+    hour = (ts_ms // HOUR_MS) % 24
+    table = build_session_table(df, lookback=lookback)
+    sweeps = sweep_flags(df['high'], df['low'], df['close'], table)
     
-    # Calculate London High/Low (approximate for speed: max/min of 7-10 UTC window)
-    # We will compute this row by row for accuracy in the loop or vectorized
+    in_session = (hour >= session_hours[0]) & (hour < session_hours[1])
+    in_session &= np.arange(len(df)) >= lookback
     
+    return pd.DataFrame({
+        'timestamp': df['timestamp'],
+        'day': df['timestamp'].dt.floor('D'),
+        'bearish': in_session & (sweeps['swept_pdh'] | sweeps['swept_london_high']),
+        'bullish': in_session & (sweeps['swept_pdl'] | sweeps['swept_london_low']),
+    })
+
+def scan_hybrid_sweeps(df):
+    """Number of hybrid sweep setups (a candle sweeping both sides counts twice)."""
     print("🔄 Scanning for Hybrid Sweeps...")
+    signals = hybrid_sweep_signals(df)
+    return int(signals['bearish'].sum() + signals['bullish'].sum())
+
+def frequency_report(frames, **kwargs):
+    """
+    Setup frequency for many symbols at once.
+
+    Args:
+        frames: {symbol: 5m OHLCV DataFrame}
+
+    Returns:
+        dict of DataFrames: by_symbol (totals and daily average), by_day
+        (day x symbol counts) and by_session (killzone x symbol counts)
+    """
+    per_symbol = []
+    for symbol, df in frames.items():
+        signals = hybrid_sweep_signals(df, **kwargs)
+        signals['setups'] = signals['bearish'].astype(int) + signals['bullish'].astype(int)
+        signals['session'] = label_sessions(signals['timestamp'])['killzone'].replace('NONE', 'OTHER')
+        signals['symbol'] = symbol
+        per_symbol.append(signals[signals['setups'] > 0])
+    hits = pd.concat(per_symbol, ignore_index=True) if per_symbol else pd.DataFrame(
+        columns=['timestamp', 'day', 'bearish', 'bullish', 'setups', 'session', 'symbol'])
     
-    for i in range(288, len(df)):
-        row = df.iloc[i]
-        
-        # 1. Check Time (NY Session Only: 12-20 UTC)
-        if not (12 <= row['timestamp'].hour < 20):
-            continue
-            
-        # 2. Check PDH Sweep (Bearish)
-        # Sweep High but Close Low
-        pdh = df.iloc[i-1]['pdh']
-        swept_pdh = row['high'] > pdh and row['close'] < pdh
-        
-        # 3. Check London Sweep (Bearish)
-        # Get London High (7-10 UTC) for THIS day
-        current_day = row['timestamp'].date()
-        # Filter mostly correct rows
-        london_rows = df[
-            (df['timestamp'].dt.date == current_day) & 
-            (df['timestamp'].dt.hour >= 7) & 
-            (df['timestamp'].dt.hour < 10)
-        ]
-        
-        swept_london = False
-        if not london_rows.empty:
-            london_high = london_rows['high'].max()
-            swept_london = row['high'] > london_high and row['close'] < london_high
-            
-        # BEARISH SETUP
-        if swept_pdh or swept_london:
-            setups += 1
-            
-        # 4. Check PDL Sweep (Bullish)
-        pdl = df.iloc[i-1]['pdl']
-        swept_pdl = row['low'] < pdl and row['close'] > pdl
-        
-        swept_london_low = False
-        if not london_rows.empty:
-            london_low = london_rows['low'].min()
-            swept_london_low = row['low'] < london_low and row['close'] > london_low
-            
-        # BULLISH SETUP
-        if swept_pdl or swept_london_low:
-            setups += 1
-            
-    return setups
+    days = {symbol: max(1, df['timestamp'].dt.floor('D').nunique()) for symbol, df in frames.items()}
+    by_symbol = pd.DataFrame({
+        'setups': hits.groupby('symbol')['setups'].sum().reindex(list(frames), fill_value=0),
+        'bearish': hits.groupby('symbol')['bearish'].sum().reindex(list(frames), fill_value=0),
+        'bullish': hits.groupby('symbol')['bullish'].sum().reindex(list(frames), fill_value=0),
+        'days': pd.Series(days),
+    })
+    by_symbol['per_day'] = by_symbol['setups'] / by_symbol['days']
+    return {
+        'by_symbol': by_symbol,
+        'by_day': hits.pivot_table(index='day', columns='symbol', values='setups', aggfunc='sum', fill_value=0),
+        'by_session': hits.pivot_table(index='session', columns='symbol', values='setups', aggfunc='sum', fill_value=0),
+    }
 
 if __name__ == "__main__":
-    btc_df = fetch_data('BTC/USDT', days=30)
-    eth_df = fetch_data('ETH/USDT', days=30)
+    # Usage: python verify_frequency.py [days] [SYMBOL ...]
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    symbols = sys.argv[2:] or Config.SYMBOLS
     
-    btc_setups = scan_hybrid_sweeps(btc_df)
-    eth_setups = scan_hybrid_sweeps(eth_df)
+    frames = {symbol: fetch_data(symbol, days=days) for symbol in symbols}
+    report = frequency_report(frames)
+    by_symbol = report['by_symbol']
+    total = int(by_symbol['setups'].sum())
     
-    total = btc_setups + eth_setups
     print("\n" + "="*50)
-    print("📊 HYBRID LOGIC FREQUENCY TEST (Last 30 Days)")
+    print(f"📊 HYBRID LOGIC FREQUENCY TEST (Last {days} Days)")
     print("="*50)
-    print(f"BTC Setups: {btc_setups}")
-    print(f"ETH Setups: {eth_setups}")
-    print(f"Total Monthly: {total}")
-    print(f"Projected Yearly: {total * 12}")
-    print(f"Avg Daily Setups: {total / 30:.1f}")
+    for symbol, row in by_symbol.iterrows():
+        print(f"{symbol} Setups: {int(row['setups'])} ({row['per_day']:.1f}/day)")
+    print(f"Total: {total}")
+    print(f"Projected Yearly: {total * 365 / days:.0f}")
+    print(f"Avg Daily Setups: {total / days:.1f}")
+    print("-"*50)
+    print("By Session:")
+    print(report['by_session'].to_string())
     print("="*50)
@@ -0,0 +1,157 @@
+import ccxt
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from candle_store import CandleStore
+from comparative_backtest import ComparativeBacktest, model_policy
+from param_sweep import ParameterSweep, expand_grid, params_row, summarize, _run_trades
+from session_clock import DAY_MS
+
+class WalkForward:
+    """
+    Walk-Forward Optimization: rolling in-sample / out-of-sample windows.
+
+    Features (ATR, 4H bias, session table) are built ONCE over the whole
+    history (and persisted by the FeatureStore), so indicator state carries
+    across window edges instead of restarting per slice. Every configuration
+    is then simulated once over the full history on the sweep's process
+    pool; a window only slices each
+    configuration's trades by entry index, picks the in-sample winner and
+    keeps that winner's out-of-sample trades. The OOS trades of all windows
+    are stitched into one equity curve.
+
+    In-sample trades whose exit horizon (the model's exit timeout unless
+    purge_candles is given) reaches into the test window are purged, so no
+    test-window price decides a selection. Test windows never overlap
+    (step_days >= test_days), so no OOS trade is counted twice.
+    """
+    def __init__(self, symbol='BTC/USDT', start_date='2023-01-06', end_date='2026-01-06', exchange=None,
+                 train_days=90, test_days=30, step_days=None, rank_by='total_r', min_trades=10,
+                 purge_candles=None, workers=None):
+        self.symbol = symbol
+        self.start_date = start_date
+        self.end_date = end_date
+        self.exchange = exchange or ccxt.binance({'enableRateLimit': True})
+        self.store = CandleStore(self.exchange)
+        self.train_days = train_days
+        self.test_days = test_days
+        self.step_days = step_days or test_days
+        if self.step_days < test_days:
+            raise ValueError(f"step_days ({self.step_days}) < test_days ({test_days}): "
+                             "overlapping test windows would count OOS trades twice")
+        self.rank_by = rank_by
+        self.min_trades = min_trades
+        self.purge_candles = purge_candles
+        self.sweep = ParameterSweep(ComparativeBacktest(symbol, start_date, end_date, self.exchange), workers)
+
+    def fetch_data(self):
+        """Loads 5m OHLCV for the whole walk-forward span from the local candle store."""
+        print(f"📥 Loading {self.symbol} data from {self.start_date} to {self.end_date}...")
+        start_ts = int(datetime.strptime(self.start_date, '%Y-%m-%d').timestamp() * 1000)
+        end_ts = int(datetime.strptime(self.end_date, '%Y-%m-%d').timestamp() * 1000)
+        df = self.store.load(self.symbol, '5m', start_ts, end_ts)
+        print(f"✅ Loaded {len(df)} candles")
+        return df
+
+    def windows(self, ts_ms):
+        """(train_start, train_end, test_end) candle indices of every rolling window."""
+        windows = []
+        start = ts_ms[0]
+        while True:
+            train_end_ts = start + self.train_days * DAY_MS
+            test_end_ts = train_end_ts + self.test_days * DAY_MS
+            if test_end_ts > ts_ms[-1] + 1:
+                break
+            windows.append(tuple(int(i) for i in np.searchsorted(ts_ms, [start, train_end_ts, test_end_ts])))
+            start += self.step_days * DAY_MS
+        return windows
+
+    def run(self, grid, base=None):
+        """
+        Optimizes `grid` (see param_sweep.expand_grid) on every in-sample
+        window and stitches the out-of-sample results.
+
+        Returns:
+            dict: windows (DataFrame per window), trades (stitched OOS trades),
+            equity (cumulative OOS R), summary (OOS metrics)
+        """
+        df = self.fetch_data()
+        features = self.sweep.prepare(df)
+        ts_ms = features['timestamp']
+        combos = expand_grid(grid, base)
+        windows = self.windows(ts_ms)
+        if not windows:
+            return {"error": "History shorter than one train + test window"}
+
+        # A trade is open for at most its policy's timeout candles after entry
+        purge = self.purge_candles
+        if purge is None:
+            purge = max(model_policy(params).timeout for params in combos)
+
+        print(f"\n🔁 Walk-Forward: {len(windows)} windows x {len(combos)} configurations "
+              f"({self.train_days}d train / {self.test_days}d test)...")
+        results = self.sweep.map(_run_trades, combos, features)
+
+        window_rows, oos_trades = [], []
+        for w, (train_start, train_end, test_end) in enumerate(windows):
+            # In-sample: rank every configuration on its trades inside the slice
+            best, best_score, best_stats = None, -np.inf, None
+            for k, result in enumerate(results):
+                entries = result['entry_idx']
+                lo, hi = np.searchsorted(entries, [train_start, train_end - purge])
+                stats = summarize({'r_multiple': result['r_multiple'][lo:hi]})
+                if stats['trades'] >= self.min_trades and stats[self.rank_by] > best_score:
+                    best, best_score, best_stats = k, stats[self.rank_by], stats
+            if best is None:
+                print(f"  Window {w + 1}: no configuration with {self.min_trades}+ in-sample trades")
+                continue
+
+            # Out-of-sample: the winner's trades in the test window
+            result = results[best]
+            lo, hi = np.searchsorted(result['entry_idx'], [train_end, test_end])
+            oos = summarize({'r_multiple': result['r_multiple'][lo:hi]})
+            for i in range(lo, hi):
+                idx = int(result['entry_idx'][i])
+                oos_trades.append({
+                    'window': w + 1,
+                    'timestamp': pd.to_datetime(ts_ms[idx], unit='ms'),
+                    'bias': 'BULLISH' if result['direction'][i] > 0 else 'BEARISH',
+                    'pnl_r': float(result['r_multiple'][i]),
+                })
+
+            window_rows.append({
+                'window': w + 1,
+                'train_start': pd.to_datetime(ts_ms[train_start], unit='ms'),
+                'test_start': pd.to_datetime(ts_ms[train_end], unit='ms'),
+                'test_end': pd.to_datetime(ts_ms[test_end - 1], unit='ms'),
+                **params_row(combos[best]),
+                f'is_{self.rank_by}': round(best_stats[self.rank_by], 2),
+                'oos_trades': oos['trades'],
+                'oos_total_r': round(oos['total_r'], 2),
+            })
+            print(f"  Window {w + 1}: IS {self.rank_by}={best_stats[self.rank_by]:.2f} -> "
+                  f"OOS {oos['trades']} trades, {oos['total_r']:.2f}R")
+
+        trades = pd.DataFrame(oos_trades, columns=['window', 'timestamp', 'bias', 'pnl_r'])
+        equity = trades['pnl_r'].cumsum()
+        summary = summarize({'r_multiple': trades['pnl_r'].to_numpy()})
+        print(f"✅ Walk-Forward OOS: {summary['trades']} trades | {summary['total_r']:.2f}R | "
+              f"Max DD {summary['max_drawdown_r']:.2f}R")
+        return {
+            'windows': pd.DataFrame(window_rows),
+            'trades': trades,
+            'equity': equity,
+            'summary': summary,
+        }
+
+if __name__ == "__main__":
+    wf = WalkForward()
+    report = wf.run({
+        'killzones': [list(range(12, 20)), list(range(12, 23))],
+        'MAX_PRICE_QUARTILE': [0.35, 0.45, 0.55],
+        'STOP_LOSS_ATR_MULTIPLIER': [1.5, 2.0, 2.5],
+        'TP1_R_MULTIPLE': [1.0, 1.5],
+        'TP2_R_MULTIPLE': [3.0, 4.0],
+    })
+    if 'windows' in report:
+        print(report['windows'].to_string())